@@ -0,0 +1,71 @@
+"""Compare the accuracy and latency of the inference backends
+
+Classifies frames sampled from the fixture videos with every available
+backend, and reports the latency per frame and the agreement with the Keras
+backend (mean absolute error of the scores, same top category).
+
+    python -m benchmarks.backend_benchmark --fixtures VIDEO_FOLDER
+        [--frames 20] [--batch 20] [--threads 0] [--repeat 3]
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+
+from src.analysis.backends import BACKENDS, KERAS
+from src.analysis.convert_tflite import fixture_videos
+from src.analysis.model_collection import ModelCollection
+from src.analysis.model_processor import IMAGE_DIM
+from src.analysis.video_capture import extract_video_frames_array
+
+
+def time_backend(model, images: np.ndarray, batch: int,
+                 repeat: int) -> tuple:
+    """Best total time over repeat runs and the predictions"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        preds = np.concatenate([model.predict(images[i:i + batch])
+                                for i in range(0, len(images), batch)])
+        best = min(best, time.perf_counter() - start)
+    return best, preds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--fixtures', required=True)
+    parser.add_argument('--frames', type=int, default=20)
+    parser.add_argument('--batch', type=int, default=20)
+    parser.add_argument('--threads', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    images = np.concatenate([
+        extract_video_frames_array(video, args.frames, IMAGE_DIM)
+        for video in fixture_videos(args.fixtures)])
+    print(f'{len(images)} frames from {args.fixtures}\n')
+    print(f'{"backend":<16}{"ms/frame":>10}{"mae":>10}{"top-1":>10}')
+
+    model_collection = ModelCollection()
+    reference = None
+    for backend in BACKENDS:
+        if not os.path.exists(model_collection.model_file(backend)):
+            print(f'{backend:<16}{"not converted":>30}')
+            continue
+        model = model_collection.get_model(backend, args.threads)
+        model.predict(images[:args.batch])  # warm up
+        elapsed, preds = time_backend(model, images, args.batch, args.repeat)
+        if backend == KERAS:
+            reference = preds
+        if reference is None:
+            mae = top_1 = float('nan')
+        else:
+            mae = np.abs(preds - reference).mean() * 100
+            top_1 = (preds.argmax(1) == reference.argmax(1)).mean() * 100
+        print(f'{backend:<16}{elapsed / len(images) * 1000:>10.2f}'
+              f'{mae:>9.2f}%{top_1:>9.1f}%')
+
+
+if __name__ == '__main__':
+    main()
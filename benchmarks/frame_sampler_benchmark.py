@@ -0,0 +1,85 @@
+"""Compare frame sampling modes on synthetic clips
+
+Generates clips with ffmpeg (testsrc2) for each container, length and GOP
+size, then times extract_video_frames_array with every SamplingMode and
+Decoder.
+
+    python -m benchmarks.frame_sampler_benchmark [--frames 20] [--repeat 3]
+        [--size 3840x2160] [--decoders opencv,ffmpeg] [--segments 4]
+"""
+import argparse
+import os
+import subprocess
+import tempfile
+import time
+
+from src.analysis.frame_sampler import SamplingMode
+from src.analysis.video_capture import Decoder, extract_video_frames_array
+
+CONTAINERS = {
+    'mp4': ['-c:v', 'libx264', '-preset', 'ultrafast', '-pix_fmt', 'yuv420p'],
+    'webm': ['-c:v', 'libvpx-vp9', '-deadline', 'realtime', '-cpu-used', '8',
+             '-b:v', '1M'],
+}
+
+
+def create_clip(folder: str, container: str, length: int, gop: int,
+                size: str) -> str:
+    filename = os.path.join(folder, f'clip_{length}s_gop{gop}.{container}')
+    subprocess.run(
+        ['ffmpeg', '-v', 'error', '-y',
+         '-f', 'lavfi', '-i', f'testsrc2=size={size}:rate=30',
+         '-t', str(length), '-g', str(gop), *CONTAINERS[container],
+         filename],
+        check=True)
+    return filename
+
+
+def time_mode(filename: str, frames: int, mode: SamplingMode,
+              decoder: Decoder, segments: int, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        extract_video_frames_array(filename, frames, 224, mode, decoder,
+                                   segments)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--frames', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--lengths', default='10,60,300')
+    parser.add_argument('--gops', default='12,250')
+    parser.add_argument('--size', default='1280x720')
+    parser.add_argument('--containers', default=','.join(CONTAINERS))
+    parser.add_argument('--decoders', default=Decoder.OpenCV.value)
+    parser.add_argument('--segments', type=int, default=1)
+    args = parser.parse_args()
+
+    modes = list(SamplingMode)
+    decoders = [Decoder(decoder) for decoder in args.decoders.split(',')]
+    print(f'{"clip":<28}{"decoder":<8}' +
+          ''.join(f'{m.value:>10}' for m in modes) + f'{"fastest":>10}')
+    with tempfile.TemporaryDirectory() as folder:
+        for container in args.containers.split(','):
+            for length in map(int, args.lengths.split(',')):
+                for gop in map(int, args.gops.split(',')):
+                    clip = create_clip(folder, container, length, gop,
+                                       args.size)
+                    for decoder in decoders:
+                        timings = {mode: time_mode(clip, args.frames, mode,
+                                                   decoder, args.segments,
+                                                   args.repeat)
+                                   for mode in modes}
+                        fastest = min(timings, key=timings.get)
+                        print(f'{os.path.basename(clip):<28}'
+                              f'{decoder.value:<8}' +
+                              ''.join(f'{timings[m]:>10.3f}' for m in modes) +
+                              f'{fastest.value:>10}')
+                    os.remove(clip)
+
+
+if __name__ == '__main__':
+    main()
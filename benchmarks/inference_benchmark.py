@@ -0,0 +1,60 @@
+"""Per call latency of keras model.predict against the compiled bucketed
+inference function, with the varying batch sizes of the analysis
+
+Uses the model from src/analysis/models, or an untrained MobileNetV2 of the
+same input size with --synthetic.
+
+    python -m benchmarks.inference_benchmark [--synthetic]
+        [--batches 6,13,20] [--buckets 8,16,32] [--calls 20]
+"""
+import argparse
+import time
+
+import numpy as np
+import tensorflow as tf
+
+from src.analysis.backends import BucketedPredictor
+from src.analysis.model_collection import ModelCollection
+from src.analysis.model_processor import IMAGE_DIM
+
+
+def time_calls(predict, batches: list, calls: int) -> float:
+    """Mean ms per call, cycling through the batches"""
+    start = time.perf_counter()
+    for call in range(calls):
+        predict(batches[call % len(batches)])
+    return (time.perf_counter() - start) / calls * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--synthetic', action='store_true')
+    parser.add_argument('--batches', default='6,13,20')
+    parser.add_argument('--buckets', default='8,16,32')
+    parser.add_argument('--calls', type=int, default=20)
+    args = parser.parse_args()
+
+    if args.synthetic:
+        model = tf.keras.applications.MobileNetV2(
+            input_shape=(IMAGE_DIM, IMAGE_DIM, 3), weights=None, classes=5)
+    else:
+        model = ModelCollection().get_model(buckets=[]).model
+    rng = np.random.default_rng(1)
+    batches = [rng.random((int(size), IMAGE_DIM, IMAGE_DIM, 3),
+                          dtype=np.float32)
+               for size in args.batches.split(',')]
+    predictor = BucketedPredictor(
+        model, [int(size) for size in args.buckets.split(',')])
+
+    print(f'{"":<20}{"first call":>12}{"ms/call":>12}')
+    for name, predict in (
+            ('model.predict', lambda images: model.predict(images, verbose=0)),
+            ('bucketed', predictor)):
+        # first pass over the batch sizes includes the tracing
+        first = time_calls(predict, batches, len(batches))
+        print(f'{name:<20}{first:>12.1f}'
+              f'{time_calls(predict, batches, args.calls):>12.1f}')
+
+
+if __name__ == '__main__':
+    main()
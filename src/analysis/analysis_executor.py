@@ -0,0 +1,218 @@
+"""Video analysis executor backed by a process pool, so decoding and
+inference run outside the scheduler thread and the GIL
+
+The analysis engine is imported lazily: with worker processes, TensorFlow
+is never loaded in the scheduler process. With inference batching the
+workers are threads sharing the process engine instead, so that the
+frames of concurrent analyses meet in its InferenceService."""
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import (Executor, Future, ProcessPoolExecutor,
+                                ThreadPoolExecutor)
+
+from src.config.config import Config
+from src.config.runtime import cpu_affinity
+from src.dto.get_video_response import GetVideoResponse
+
+# seconds for every worker process to load its model
+WORKERS_READY_TIMEOUT = 600
+
+singleton_executor = None
+_worker_config: Config = None
+_ready_workers = None
+
+
+def _init_worker(source: dict, ready_workers):
+    """Pool initializer: loads the model once per worker process, then
+    counts the worker in ready_workers"""
+    global _worker_config, _ready_workers
+    _worker_config = Config(source=source)
+    _ready_workers = ready_workers
+    if _worker_config.analysis_cpus and hasattr(os, 'sched_setaffinity'):
+        # before any thread starts, so that the whole process inherits it
+        os.sched_setaffinity(0, _worker_config.analysis_cpus)
+    from .engine import get_analysis_engine
+    get_analysis_engine(_worker_config).warm_up()
+    with ready_workers.get_lock():
+        ready_workers.value += 1
+
+
+def _wait_workers(workers: int) -> int:
+    """Holds the worker until all the workers are ready, so that none is
+    idle and every warm-up submit starts a worker process"""
+    deadline = time.time() + WORKERS_READY_TIMEOUT
+    while _ready_workers.value < workers and time.time() < deadline:
+        time.sleep(0.05)
+    return _ready_workers.value
+
+
+def analyse_media(media_id: str, filename: str) -> GetVideoResponse:
+    """Analyse the downloaded media on the worker process engine"""
+    from .engine import get_analysis_engine
+    return get_analysis_engine(_worker_config).analyse(media_id, filename)
+
+
+def analyse_media_frames(media_id: str, filename: str,
+                         images) -> GetVideoResponse:
+    from .engine import get_analysis_engine
+    return get_analysis_engine(_worker_config).analyse_frames(
+        media_id, filename, images)
+
+
+class AnalysisExecutor:
+
+    def __init__(self, config: Config, workers: int = 0, engine=None):
+        """workers: analysis processes (threads with inference batching), 0
+        to analyse inline on the caller thread with engine (the process
+        AnalysisEngine when None)"""
+        self.log = logging.getLogger(self.__class__.__name__)
+        self.config = config
+        self.workers = max(workers, 0)
+        self._engine = engine
+        self.threaded = config.inference_batching
+        self._executor: Executor = None
+        self._lock = threading.Lock()
+        # submitted and not done, cancelled on shutdown (cancel_futures of
+        # Executor.shutdown needs Python 3.9)
+        self._futures = set()
+        # spawn: forking a process with TensorFlow threads is unsafe
+        self._context = multiprocessing.get_context('spawn')
+        # worker processes done with their initializer
+        self._ready_workers = self._context.Value('i', 0)
+        self.ready = threading.Event()
+        self.warm_up_error: Exception = None
+        self.warm_up_time: float = None
+
+    def start_warm_up(self):
+        """Load and warm up the model in the background, setting ready when
+        done"""
+        if not self.config.analysis_warmup:
+            self.ready.set()
+            return
+        threading.Thread(target=self.warm_up, name='AnalysisWarmUp',
+                         daemon=True).start()
+
+    def warm_up(self):
+        """Load and warm up the model, in every worker process"""
+        start_time = time.time()
+        try:
+            if not self.workers or self.threaded:
+                with cpu_affinity(self.config.analysis_cpus):
+                    self.engine.warm_up()
+            else:
+                for future in [self._submit(_wait_workers, self.workers)
+                               for _ in range(self.workers)]:
+                    future.result()
+                if self._ready_workers.value < self.workers:
+                    raise RuntimeError(
+                        f'{self._ready_workers.value} of {self.workers} '
+                        'analysis workers ready')
+            self.warm_up_time = time.time() - start_time
+            self.ready.set()
+            self.log.info('Model warmed up in %.1fs (batch sizes %s)',
+                          self.warm_up_time,
+                          self.config.analysis_warmup_batch_sizes)
+        except Exception as exc:
+            self.warm_up_error = exc
+            self.log.error('Model warm-up failed: %s', exc)
+
+    def submit(self, media_id: str, filename: str) -> Future:
+        """Future with the GetVideoResponse of the media"""
+        if not self.workers:
+            future = Future()
+            try:
+                with cpu_affinity(self.config.analysis_cpus):
+                    future.set_result(self.engine.analyse(media_id, filename))
+            except Exception as exc:
+                future.set_exception(exc)
+            return future
+
+        if self.threaded:
+            return self._submit(self._analyse, self.engine.analyse,
+                                media_id, filename)
+        return self._submit(analyse_media, media_id, filename)
+
+    def submit_frames(self, media_id: str, filename: str, images) -> Future:
+        """Future with the GetVideoResponse of frames already decoded from
+        the media"""
+        if not self.workers:
+            future = Future()
+            try:
+                with cpu_affinity(self.config.analysis_cpus):
+                    future.set_result(self.engine.analyse_frames(
+                        media_id, filename, images))
+            except Exception as exc:
+                future.set_exception(exc)
+            return future
+
+        if self.threaded:
+            return self._submit(self._analyse, self.engine.analyse_frames,
+                                media_id, filename, images)
+        return self._submit(analyse_media_frames, media_id, filename, images)
+
+    @property
+    def engine(self):
+        if self._engine is None:
+            from .engine import get_analysis_engine
+            self._engine = get_analysis_engine(self.config)
+        return self._engine
+
+    def _analyse(self, analyse, *args) -> GetVideoResponse:
+        # on a worker thread
+        with cpu_affinity(self.config.analysis_cpus):
+            return analyse(*args)
+
+    def _submit(self, fn, *args) -> Future:
+        future = self._get_executor().submit(fn, *args)
+        with self._lock:
+            self._futures.add(future)
+        future.add_done_callback(self._done)
+        return future
+
+    def _done(self, future: Future):
+        with self._lock:
+            self._futures.discard(future)
+
+    def _get_executor(self) -> Executor:
+        with self._lock:
+            if not self._executor and self.threaded:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers,
+                    thread_name_prefix='AnalysisExecutor')
+                self.log.info('AnalysisExecutor started with %s threads',
+                              self.workers)
+            elif not self._executor:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=self._context,
+                    initializer=_init_worker,
+                    initargs=(dict(self.config._source),
+                              self._ready_workers))
+                self.log.info('AnalysisExecutor started with %s workers',
+                              self.workers)
+            return self._executor
+
+    def shutdown(self, wait: bool = True):
+        # outside the lock: cancelled futures run _done, which takes it
+        with self._lock:
+            executor, self._executor = self._executor, None
+            futures, self._futures = self._futures, set()
+        if executor:
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=wait)
+            self.log.info('AnalysisExecutor stopped')
+        if self.threaded and self._engine is not None:
+            self._engine.stop()
+
+
+def get_analysis_executor(config: Config) -> AnalysisExecutor:
+    global singleton_executor
+    if not singleton_executor:
+        singleton_executor = AnalysisExecutor(
+            config, workers=config.analysis_workers)
+
+    return singleton_executor
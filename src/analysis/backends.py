@@ -0,0 +1,172 @@
+"""Inference backends for the NSFW model"""
+import logging
+import threading
+from typing import Iterable, Protocol
+
+import numpy as np
+import tensorflow as tf
+import tensorflow_hub as hub
+
+KERAS = 'keras'
+TFLITE_FLOAT16 = 'tflite-float16'
+TFLITE_INT8 = 'tflite-int8'
+BACKENDS = [KERAS, TFLITE_FLOAT16, TFLITE_INT8]
+
+TFLITE_SUFFIXES = {TFLITE_FLOAT16: '.float16.tflite',
+                   TFLITE_INT8: '.int8.tflite'}
+
+DEFAULT_BUCKETS = (8, 16, 32)
+
+
+class ModelBackend(Protocol):
+
+    def predict(self, images: np.ndarray) -> np.ndarray:
+        """Predictions (frames, categories) of images (frames, dim, dim, 3)"""
+        ...
+
+
+def warm_up(model: ModelBackend, batch_sizes: Iterable[int],
+            image_dim: int):
+    """Predict a dummy batch of each size, to trace the graph and allocate
+    the tensors before the first real request"""
+    for batch_size in sorted(set(batch_sizes)):
+        model.predict(np.zeros((batch_size, image_dim, image_dim, 3),
+                               dtype=np.float32))
+
+
+def load_keras_model(model_file: str):
+    return tf.keras.models.load_model(
+        model_file,
+        custom_objects={'KerasLayer': hub.KerasLayer},
+        compile=False)
+
+
+class BucketedPredictor:
+    """Keras model inference through a tf.function traced once per fixed
+    batch size (bucket), without the model.predict per call overhead.
+    Batches are zero padded to the next bucket, larger ones are split"""
+
+    def __init__(self, model, buckets: Iterable[int] = DEFAULT_BUCKETS):
+        self.model = model
+        self.buckets = sorted(set(buckets))
+        self._function = tf.function(
+            lambda images: model(images, training=False))
+        self._concrete_functions = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, images: np.ndarray) -> np.ndarray:
+        images = np.asarray(images, dtype=np.float32)
+        if not len(images):
+            return np.empty((0, self.model.output_shape[-1]),
+                            dtype=np.float32)
+        largest = self.buckets[-1]
+        return np.concatenate([
+            self._predict_bucket(images[start:start + largest])
+            for start in range(0, len(images), largest)])
+
+    def _predict_bucket(self, images: np.ndarray) -> np.ndarray:
+        size = len(images)
+        bucket = next(bucket for bucket in self.buckets if bucket >= size)
+        if bucket > size:
+            images = np.concatenate([images, np.zeros(
+                (bucket - size, *images.shape[1:]), dtype=np.float32)])
+        return self._concrete_function(images.shape)(
+            tf.constant(images)).numpy()[:size]
+
+    def _concrete_function(self, shape: tuple):
+        with self._lock:
+            if shape not in self._concrete_functions:
+                self._concrete_functions[shape] = \
+                    self._function.get_concrete_function(
+                        tf.TensorSpec(shape, tf.float32))
+            return self._concrete_functions[shape]
+
+
+class KerasBackend:
+
+    def __init__(self, model_file: str,
+                 buckets: Iterable[int] = DEFAULT_BUCKETS):
+        """buckets: fixed batch sizes of the compiled inference function,
+        empty to use model.predict"""
+        self.log = logging.getLogger(self.__class__.__name__)
+        self.log.info('Loading Keras model: %s (buckets=%s)',
+                      model_file, list(buckets) or 'model.predict')
+        self.model = load_keras_model(model_file)
+        self._predictor = BucketedPredictor(self.model, buckets) \
+            if buckets else None
+
+    def predict(self, images: np.ndarray) -> np.ndarray:
+        if self._predictor:
+            return self._predictor(images)
+        return self.model.predict(images, verbose=0)
+
+
+class TFLiteBackend:
+
+    def __init__(self, model_file: str, threads: int = 0):
+        """threads: interpreter threads, 0 for the TFLite default"""
+        self.log = logging.getLogger(self.__class__.__name__)
+        self.log.info('Loading TFLite model: %s (threads=%s)',
+                      model_file, threads or 'default')
+        self.interpreter = tf.lite.Interpreter(
+            model_path=model_file, num_threads=threads or None)
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+        self._batch_size = 0
+        # the interpreter is not thread safe
+        self._lock = threading.Lock()
+
+    def predict(self, images: np.ndarray) -> np.ndarray:
+        with self._lock:
+            if len(images) != self._batch_size:
+                self.interpreter.resize_tensor_input(
+                    self._input['index'],
+                    [len(images), *self._input['shape'][1:]])
+                self.interpreter.allocate_tensors()
+                self._input = self.interpreter.get_input_details()[0]
+                self._output = self.interpreter.get_output_details()[0]
+                self._batch_size = len(images)
+            self.interpreter.set_tensor(
+                self._input['index'], _quantize(images, self._input))
+            self.interpreter.invoke()
+            return _dequantize(
+                self.interpreter.get_tensor(self._output['index']),
+                self._output)
+
+
+def _quantize(values: np.ndarray, details: dict) -> np.ndarray:
+    scale, zero_point = details['quantization']
+    if scale:
+        values = np.round(values / scale + zero_point)
+    return values.astype(details['dtype'])
+
+
+def _dequantize(values: np.ndarray, details: dict) -> np.ndarray:
+    scale, zero_point = details['quantization']
+    if scale:
+        return (values.astype(np.float32) - zero_point) * scale
+    return values.astype(np.float32)
+
+
+def convert_to_tflite(model, backend: str,
+                      representative_images: Iterable[np.ndarray] = None) -> bytes:
+    """TFLite flatbuffer of a Keras model, quantized for backend
+    representative_images: batches (1, dim, dim, 3) to calibrate the int8
+    activation ranges, required for TFLITE_INT8"""
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if backend == TFLITE_FLOAT16:
+        converter.target_spec.supported_types = [tf.float16]
+    elif backend == TFLITE_INT8:
+        if representative_images is None:
+            raise ValueError('int8 quantization needs representative images')
+        images = list(representative_images)
+        converter.representative_dataset = lambda: (
+            [image.astype(np.float32)] for image in images)
+        # weights and activations in int8, float input and output
+        converter.target_spec.supported_ops = [
+            tf.lite.OpsSet.TFLITE_BUILTINS_INT8,
+            tf.lite.OpsSet.TFLITE_BUILTINS]
+    else:
+        raise ValueError(f'Invalid TFLite backend: {backend}')
+    return converter.convert()
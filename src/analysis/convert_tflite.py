@@ -0,0 +1,64 @@
+"""Convert the Keras model into the TFLite variants used by the tflite-float16
+and tflite-int8 backends, saved next to it in src/analysis/models
+
+    python -m src.analysis.convert_tflite [--fixtures VIDEO_FOLDER]
+
+The int8 variant calibrates its activation ranges with frames sampled from
+the fixture videos, and is skipped without them.
+"""
+import argparse
+import logging
+import os
+from typing import Iterator
+
+import numpy as np
+
+from .backends import TFLITE_FLOAT16, TFLITE_INT8, convert_to_tflite
+from .model_collection import ModelCollection
+from .model_processor import IMAGE_DIM
+from .video_capture import extract_video_frames_array
+
+
+def fixture_videos(folder: str) -> list:
+    return sorted(os.path.join(folder, name) for name in os.listdir(folder)
+                  if os.path.isfile(os.path.join(folder, name)))
+
+
+def representative_images(videos: list, frames: int) -> Iterator[np.ndarray]:
+    """Batches (1, dim, dim, 3) of frames sampled from the videos"""
+    for video in videos:
+        for image in extract_video_frames_array(video, frames, IMAGE_DIM):
+            yield image[np.newaxis]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--fixtures', help='folder with calibration videos')
+    parser.add_argument('--frames', type=int, default=10,
+                        help='calibration frames per video')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    log = logging.getLogger('convert_tflite')
+
+    model_collection = ModelCollection()
+    model = model_collection.get_model().model
+    backends = [TFLITE_FLOAT16]
+    videos = fixture_videos(args.fixtures) if args.fixtures else []
+    if videos:
+        backends.append(TFLITE_INT8)
+    else:
+        log.warning('No fixture videos: skipping the int8 variant')
+
+    for backend in backends:
+        tflite_model = convert_to_tflite(
+            model, backend, representative_images(videos, args.frames)
+            if backend == TFLITE_INT8 else None)
+        model_file = model_collection.model_file(backend)
+        with open(model_file, 'wb') as file:
+            file.write(tflite_model)
+        log.info('Saved %s (%.1f MB)', model_file,
+                 len(tflite_model) / 1024 / 1024)
+
+
+if __name__ == '__main__':
+    main()
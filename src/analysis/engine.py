@@ -0,0 +1,142 @@
+"""Analysis engine: the single model handle of the process, with a thread
+safe predict entry point and the sync and async video analysis API
+
+Samplers (SamplingMode, Decoder) and backends (keras, tflite-*) are picked
+from Config; every caller shares the same loaded model."""
+import asyncio
+import logging
+import threading
+from typing import List
+
+import numpy as np
+from src.config.config import Config
+from src.config.runtime import configure_runtime
+from src.dto.get_video_response import GetVideoResponse
+
+from .backends import DEFAULT_BUCKETS, KERAS, ModelBackend, warm_up
+from .frame_sampler import SamplingMode
+from .inference_service import InferenceService
+from .model_collection import ModelCollection
+from .model_processor import IMAGE_DIM, AdaptiveSampling, VideoAnalyzer
+from .preview import PreviewSettings
+from .video_capture import Decoder
+
+singleton_engine = None
+
+
+class AnalysisEngine:
+
+    def __init__(self, config: Config = None, model: ModelBackend = None):
+        """config: analysis settings, the defaults when None
+        model: preloaded model, loaded from ModelCollection when None"""
+        self.log = logging.getLogger(self.__class__.__name__)
+        self.config = config
+        self.backend = config.analysis_backend if config else KERAS
+        self._model = model
+        self._inference_service: InferenceService = None
+        self._lock = threading.RLock()
+        self._predict_lock = threading.Lock()
+
+    @property
+    def model(self) -> ModelBackend:
+        with self._lock:
+            if self._model is None:
+                if self.config:
+                    configure_runtime(self.config)
+                    self._model = ModelCollection().get_model(
+                        self.backend, self.config.tflite_threads,
+                        self.config.analysis_batch_buckets)
+                else:
+                    self._model = ModelCollection().get_model(
+                        self.backend, buckets=DEFAULT_BUCKETS)
+            return self._model
+
+    def predict(self, images: np.ndarray) -> np.ndarray:
+        """Model predictions (frames, categories) of images (frames, dim,
+        dim, 3), safe to call from any thread"""
+        if self.config and self.config.inference_batching:
+            return self._get_inference_service().predict(images)
+        model = self.model
+        with self._predict_lock:
+            return model.predict(images)
+
+    def _get_inference_service(self) -> InferenceService:
+        with self._lock:
+            if not self._inference_service:
+                self._inference_service = InferenceService(
+                    self.model,
+                    max_batch_size=self.config.inference_max_batch_size,
+                    max_wait=self.config.inference_max_wait_ms / 1000)
+            return self._inference_service
+
+    def stop(self):
+        """Stop the inference service, failing its pending requests"""
+        with self._lock:
+            service, self._inference_service = self._inference_service, None
+        if service:
+            service.stop()
+
+    def warm_up(self, batch_sizes: List[int] = None):
+        """Load the model and predict a dummy batch of each size"""
+        if batch_sizes is None:
+            batch_sizes = self.config.analysis_warmup_batch_sizes \
+                if self.config and self.config.analysis_warmup else []
+        model = self.model
+        with self._predict_lock:
+            warm_up(model, batch_sizes, IMAGE_DIM)
+
+    def analyzer(self, media_id: str, video_filename: str) -> VideoAnalyzer:
+        """VideoAnalyzer with the analysis settings from config"""
+        config = self.config
+        if not config:
+            return VideoAnalyzer(media_id, video_filename, engine=self)
+        adaptive = AdaptiveSampling(
+            first_wave=config.analysis_first_wave,
+            wave_size=config.analysis_wave_size,
+            neutral_exit=config.analysis_neutral_exit,
+            explicit_exit=config.analysis_explicit_exit) \
+            if config.analysis_adaptive else None
+        preview = PreviewSettings(
+            image_format=config.preview_format,
+            tile_width=config.preview_tile_width,
+            columns=config.preview_columns) \
+            if config.analysis_preview else None
+        return VideoAnalyzer(
+            media_id, video_filename,
+            sampling_mode=SamplingMode(config.get_sampling_mode(media_id)),
+            aggregate=config.analysis_aggregate,
+            top_k=config.analysis_top_k,
+            threshold=config.analysis_threshold,
+            n_frames=config.analysis_frames,
+            adaptive=adaptive,
+            decoder=Decoder(config.analysis_decoder),
+            segments=config.analysis_segments,
+            engine=self,
+            preview=preview)
+
+    def analyse(self, media_id: str, video_filename: str) -> GetVideoResponse:
+        return self.analyzer(media_id, video_filename)()
+
+    def analyse_frames(self, media_id: str, video_filename: str,
+                       images: np.ndarray) -> GetVideoResponse:
+        """analyse frames already decoded from the video (tee pipeline)"""
+        return self.analyzer(media_id, video_filename).process_frames(images)
+
+    async def analyse_async(self, media_id: str,
+                            video_filename: str) -> GetVideoResponse:
+        """analyse on the default executor of the running loop"""
+        return await asyncio.get_running_loop().run_in_executor(
+            None, self.analyse, media_id, video_filename)
+
+
+def get_analysis_engine(config: Config = None) -> AnalysisEngine:
+    """The process engine. Callers without a config get the current one; a
+    config replaces an engine created without it (defaults)"""
+    global singleton_engine
+    if singleton_engine and config and singleton_engine.config is None:
+        singleton_engine.stop()
+        singleton_engine = None
+    if not singleton_engine:
+        singleton_engine = AnalysisEngine(config)
+
+    return singleton_engine
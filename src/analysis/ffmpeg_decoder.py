@@ -0,0 +1,44 @@
+"""Reduced resolution frame decoding through an ffmpeg pipe
+
+ffmpeg selects and scales the frames (scale + colour conversion in one
+swscale pass) before they reach Python, so 4K frames are never converted
+to BGR, copied and resized at full resolution."""
+import subprocess
+from typing import List
+
+import numpy as np
+
+
+def ffmpeg_frames(video_file_name: str, positions: List[int],
+                  width: int, height: int, pix_fmt: str = 'rgb24',
+                  keyframes_only: bool = False,
+                  timeout: int = 300) -> np.ndarray:
+    """uint8 array (frames, height, width, 3) of the frames at positions
+    (frame indexes), scaled by nearest neighbour like the OpenCV path
+    keyframes_only: decode only the keyframes (positions are then indexes
+    among the keyframes)"""
+    positions = sorted(set(positions))
+    if not positions:
+        return np.empty((0, height, width, 3), dtype=np.uint8)
+    select = '+'.join(f'eq(n,{position})' for position in positions)
+    command = ['ffmpeg', '-v', 'error', '-nostdin']
+    if keyframes_only:
+        command += ['-skip_frame', 'nokey']
+    command += ['-i', video_file_name, '-an', '-sn', '-dn',
+                '-vf', f"select='{select}',"
+                       f'scale={width}:{height}:flags=neighbor',
+                # -fps_mode needs ffmpeg 5.1, later ones still accept -vsync
+                '-vsync', 'passthrough',
+                '-frames:v', str(len(positions)),
+                '-f', 'rawvideo', '-pix_fmt', pix_fmt, 'pipe:1']
+    result = subprocess.run(command, capture_output=True, timeout=timeout)
+    if result.returncode:
+        raise RuntimeError(
+            f'ffmpeg failed to decode {video_file_name}: '
+            f'{result.stderr.decode(errors="replace").strip()}')
+
+    frame_size = width * height * 3
+    frames = len(result.stdout) // frame_size
+    return np.frombuffer(result.stdout, dtype=np.uint8,
+                         count=frames * frame_size).reshape(
+                             (frames, height, width, 3))
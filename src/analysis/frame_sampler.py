@@ -0,0 +1,206 @@
+"""Frame sampling strategies for video analysis"""
+import logging
+import subprocess
+from enum import Enum
+from typing import Iterable, Iterator, List, Tuple
+
+import cv2
+import numpy as np
+
+
+class SamplingMode(Enum):
+    Seek = 'seek'           # CAP_PROP_POS_FRAMES before every read
+    Grab = 'grab'           # forward-only grab()/retrieve() pass
+    Keyframe = 'keyframe'   # only keyframes, positioned by timestamp
+    Time = 'time'           # CAP_PROP_POS_MSEC before every read
+    Scene = 'scene'         # one frame per scene, up to the frame budget
+
+
+SCENE_PROBES_PER_FRAME = 4  # probed frames per frame of budget
+SCENE_PROBE_SIZE = (64, 36)
+SCENE_THRESHOLD = 0.3       # histogram Bhattacharyya distance
+
+
+def frame_positions(frame_count: int, n_frames: int) -> List[int]:
+    """Evenly spaced frame indexes to sample from a video, the first
+    n_frames when the frame count is unknown (0 or less, as OpenCV reports
+    for streamed WebM/MKV without a duration)"""
+    if n_frames <= 0:
+        return []
+    if frame_count <= 0:
+        return list(range(n_frames))
+    skip = max(int(frame_count / n_frames), 1)
+    return [frame * skip for frame in range(min(n_frames, frame_count))]
+
+
+def progressive_positions(frame_count: int, n_frames: int) -> List[int]:
+    """Same positions as frame_positions, ordered so that any prefix is
+    spread over the whole video (bit-reversal order), for sampling in waves"""
+    positions = frame_positions(frame_count, n_frames)
+    if len(positions) < 3:
+        return positions
+    bits = (len(positions) - 1).bit_length()
+    order = sorted(range(len(positions)),
+                   key=lambda i: int(format(i, f'0{bits}b')[::-1], 2))
+    return [positions[i] for i in order]
+
+
+def scene_positions(vidcap: cv2.VideoCapture, positions: List[int],
+                    threshold: float = SCENE_THRESHOLD) -> List[int]:
+    """Positions of one representative (middle) frame per scene over the
+    range of positions, at most len(positions)
+
+    Scene boundaries are found on a downscaled forward pass over
+    SCENE_PROBES_PER_FRAME probes per frame of budget, where the colour
+    histogram distance between consecutive probes exceeds threshold. When
+    there are more scenes than budget, only the strongest boundaries are kept"""
+    if len(positions) < 2:
+        return list(positions)
+    return select_scenes(_read_grab(vidcap, scene_probes(positions)),
+                         len(positions), threshold)
+
+
+def scene_probes(positions: List[int]) -> List[int]:
+    """Positions probed for scene boundaries over the range of positions"""
+    if len(positions) < 2:
+        return list(positions)
+    first, last = positions[0], positions[-1] + positions[1] - positions[0]
+    return [first + position for position in frame_positions(
+        last - first, len(positions) * SCENE_PROBES_PER_FRAME)]
+
+
+def select_scenes(probes: Iterable[Tuple[int, np.ndarray]], budget: int,
+                  threshold: float = SCENE_THRESHOLD) -> List[int]:
+    """Middle position of every scene in probes (position, BGR image)"""
+    histograms, probed = [], []
+    for position, image in probes:
+        small = cv2.resize(image, SCENE_PROBE_SIZE,
+                           interpolation=cv2.INTER_NEAREST)
+        hsv = cv2.cvtColor(small, cv2.COLOR_BGR2HSV)
+        histogram = cv2.calcHist([hsv], [0, 1], None, [16, 8],
+                                 [0, 180, 0, 256])
+        histograms.append(cv2.normalize(histogram, histogram))
+        probed.append(position)
+    if not probed or budget <= 0:
+        return []
+
+    distances = np.array([
+        cv2.compareHist(histograms[i - 1], histograms[i],
+                        cv2.HISTCMP_BHATTACHARYYA)
+        for i in range(1, len(histograms))])
+    cuts = np.flatnonzero(distances > threshold) + 1
+    if len(cuts) >= budget:
+        strongest = np.argsort(distances[cuts - 1])[::-1][:budget - 1]
+        cuts = np.sort(cuts[strongest])
+
+    bounds = [0, *cuts.tolist(), len(probed)]
+    return [probed[(start + end - 1) // 2]
+            for start, end in zip(bounds, bounds[1:])]
+
+
+def nearest_keyframes(positions: List[int], fps: float,
+                      keyframes: List[float]) -> List[int]:
+    """Indexes of the nearest keyframe (timestamps) to every position,
+    without repeating keyframes"""
+    wanted = np.asarray(positions, dtype=np.float64) / fps
+    available = np.asarray(keyframes)
+    nearest = np.abs(available[None, :] - wanted[:, None]).argmin(axis=1)
+    return list(dict.fromkeys(nearest.tolist()))
+
+
+def keyframe_timestamps(video_file_name: str, timeout: int = 60) -> List[float]:
+    """Timestamps (seconds) of the video keyframes, read from the packet
+    flags with ffprobe (demux only, nothing is decoded)"""
+    try:
+        result = subprocess.run(
+            ['ffprobe', '-v', 'error', '-select_streams', 'v:0',
+             '-show_entries', 'packet=pts_time,flags', '-of', 'csv=p=0',
+             video_file_name],
+            capture_output=True, text=True, timeout=timeout, check=True)
+    except (OSError, subprocess.SubprocessError) as exc:
+        logging.getLogger(__name__).warning(
+            'Failed to read keyframes from %s: %s', video_file_name, exc)
+        return []
+
+    timestamps = set()
+    for line in result.stdout.splitlines():
+        pts_time, _, flags = line.partition(',')
+        if 'K' in flags and pts_time not in ('', 'N/A'):
+            timestamps.add(float(pts_time))
+    return sorted(timestamps)
+
+
+def read_frames(vidcap: cv2.VideoCapture, video_file_name: str,
+                positions: List[int],
+                mode: SamplingMode = SamplingMode.Seek) -> Iterator[Tuple[int, np.ndarray]]:
+    """Read the frames at positions from an opened capture (Keyframe and
+    Scene modes pick their own positions, at most len(positions))
+    Yields (position, BGR image) for every frame successfully read"""
+    mode = SamplingMode(mode)
+    if mode == SamplingMode.Grab:
+        yield from _read_grab(vidcap, positions)
+    elif mode == SamplingMode.Time:
+        yield from _read_time(vidcap, positions)
+    elif mode == SamplingMode.Keyframe:
+        yield from _read_keyframes(vidcap, video_file_name, positions)
+    elif mode == SamplingMode.Scene:
+        yield from _read_seek(vidcap, scene_positions(vidcap, positions))
+    else:
+        yield from _read_seek(vidcap, positions)
+
+
+def _read_seek(vidcap: cv2.VideoCapture, positions: List[int]):
+    for position in positions:
+        vidcap.set(cv2.CAP_PROP_POS_FRAMES, position)
+        success, image = vidcap.read()
+        if not success:
+            return
+        yield position, image
+
+
+def _read_grab(vidcap: cv2.VideoCapture, positions: List[int]):
+    current = int(vidcap.get(cv2.CAP_PROP_POS_FRAMES))
+    for position in sorted(positions):
+        if position < current:
+            # behind the decoder, only possible on a reused capture
+            vidcap.set(cv2.CAP_PROP_POS_FRAMES, position)
+            current = position
+        while current < position:
+            if not vidcap.grab():
+                return
+            current += 1
+        success, image = vidcap.read()
+        if not success:
+            return
+        current += 1
+        yield position, image
+
+
+def _read_time(vidcap: cv2.VideoCapture, positions: List[int]):
+    fps = vidcap.get(cv2.CAP_PROP_FPS)
+    if not fps or fps != fps:  # missing or NaN
+        yield from _read_seek(vidcap, positions)
+        return
+    for position in positions:
+        vidcap.set(cv2.CAP_PROP_POS_MSEC, position * 1000 / fps)
+        success, image = vidcap.read()
+        if not success:
+            return
+        yield position, image
+
+
+def _read_keyframes(vidcap: cv2.VideoCapture, video_file_name: str,
+                    positions: List[int]):
+    fps = vidcap.get(cv2.CAP_PROP_FPS)
+    keyframes = keyframe_timestamps(video_file_name)
+    if not keyframes or not fps or fps != fps:
+        yield from _read_time(vidcap, positions)
+        return
+
+    for index in nearest_keyframes(positions, fps, keyframes):
+        timestamp = keyframes[index]
+        vidcap.set(cv2.CAP_PROP_POS_MSEC, timestamp * 1000)
+        success, image = vidcap.read()
+        if not success:
+            return
+        yield int(round(timestamp * fps)), image
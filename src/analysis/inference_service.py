@@ -0,0 +1,146 @@
+"""Shared inference service that micro-batches frames from concurrent
+analysis requests into a single model forward pass"""
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from queue import Empty, Queue
+from typing import List
+
+import numpy as np
+
+
+class InferenceRequest:
+
+    __slots__ = ['images', 'future']
+
+    def __init__(self, images: np.ndarray):
+        self.images = images
+        self.future = Future()
+
+
+class InferenceService:
+
+    def __init__(self, model, max_batch_size: int = 64,
+                 max_wait: float = 0.05):
+        """model: object with predict(images) -> predictions
+        max_batch_size: maximum frames in one forward pass
+        max_wait: seconds to wait for more requests after the first one"""
+        self.log = logging.getLogger(self.__class__.__name__)
+        self.max_batch_size = max(max_batch_size, 1)
+        self.max_wait = max_wait
+        self._model = model
+        self._queue: Queue = Queue()
+        self._pending: InferenceRequest = None
+        self._lock = threading.Lock()
+        self._can_run = False
+        self._thread: threading.Thread = None
+        self.batches = 0
+        self.frames = 0
+
+    def start(self):
+        with self._lock:
+            if self._can_run:
+                return
+            self._can_run = True
+            self._thread = threading.Thread(target=self._run,
+                                            name='InferenceService',
+                                            daemon=True)
+            self._thread.start()
+        self.log.info('InferenceService started (max_batch_size=%s max_wait=%ss)',
+                      self.max_batch_size, self.max_wait)
+
+    def stop(self, timeout: float = 5):
+        """Stop the service thread, failing the requests it did not take"""
+        with self._lock:
+            self._can_run = False
+            thread, self._thread = self._thread, None
+        self.log.info('InferenceService is stopping')
+        if thread and thread is not threading.current_thread():
+            thread.join(timeout)
+        self._fail_pending()
+
+    def _fail_pending(self):
+        """Set an error on the queued and held back requests, so that no
+        caller waits forever on a stopped service"""
+        requests = [self._pending] if self._pending else []
+        self._pending = None
+        while True:
+            try:
+                requests.append(self._queue.get_nowait())
+            except Empty:
+                break
+        for request in requests:
+            if not request.future.done():
+                request.future.set_exception(
+                    RuntimeError('InferenceService stopped'))
+        if requests:
+            self.log.warning('InferenceService stopped with %s pending '
+                             'requests', len(requests))
+
+    def predict(self, images: np.ndarray, timeout: float = None) -> np.ndarray:
+        """Predict images (frames, dim, dim, 3) and wait for the result"""
+        if not len(images):
+            return np.empty((0,), dtype=np.float32)
+        self.start()
+        request = InferenceRequest(images)
+        self._queue.put(request)
+        return request.future.result(timeout)
+
+    def _next_batch(self) -> List[InferenceRequest]:
+        if self._pending:
+            first, self._pending = self._pending, None
+        else:
+            first = self._queue.get(block=True, timeout=1)
+
+        batch = [first]
+        size = len(first.images)
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                request = self._queue.get(block=True, timeout=remaining)
+            except Empty:
+                break
+            if size + len(request.images) > self.max_batch_size:
+                # keep it for the next forward pass
+                self._pending = request
+                break
+            batch.append(request)
+            size += len(request.images)
+        return batch
+
+    def _run(self):
+        while self._can_run:
+            try:
+                batch = self._next_batch()
+            except Empty:
+                continue
+            self._process(batch)
+
+        self._fail_pending()
+        self.log.info('InferenceService stopped')
+
+    def _process(self, batch: List[InferenceRequest]):
+        try:
+            images = batch[0].images if len(batch) == 1 else \
+                np.concatenate([request.images for request in batch])
+            predictions = self._model.predict(images)
+            self.batches += 1
+            self.frames += len(images)
+            self.log.debug('Inference batch: %s requests, %s frames',
+                           len(batch), len(images))
+        except Exception as exc:
+            self.log.error('Inference failed for %s requests: %s',
+                           len(batch), exc)
+            for request in batch:
+                request.future.set_exception(exc)
+            return
+
+        offset = 0
+        for request in batch:
+            size = len(request.images)
+            request.future.set_result(predictions[offset:offset + size])
+            offset += size
@@ -1,9 +1,10 @@
 import os
 import logging
-import tensorflow as tf
-import tensorflow_hub as hub
 
-_MODEL = None
+from typing import Iterable
+
+from .backends import (DEFAULT_BUCKETS, KERAS, TFLITE_SUFFIXES, KerasBackend,
+                       ModelBackend, TFLiteBackend)
 
 
 class ModelCollection:
@@ -17,17 +18,29 @@ class ModelCollection:
         models_path = os.path.abspath(os.path.join(
             os.path.dirname(__file__), 'models'))
         for module in os.listdir(models_path):
-            self._model_file = os.path.join(models_path, module)
+            if not module.endswith('.tflite'):
+                ModelCollection._model_file = os.path.join(
+                    models_path, module)
         self.log.info('Available model: %s', self._model_file)
 
-    def get_model(self):
-        global _MODEL
-        if not _MODEL:
-            self.log.info(
-                'Loading model: %s', self._model_file)
-            _MODEL = tf.keras.models.load_model(
-                self._model_file,
-                custom_objects={'KerasLayer': hub.KerasLayer},
-                compile=False)
-
-        return _MODEL
+    def model_file(self, backend: str = KERAS) -> str:
+        """Keras model file, or its converted TFLite variant"""
+        if backend == KERAS:
+            return self._model_file
+        if backend not in TFLITE_SUFFIXES:
+            raise ValueError(f'Invalid backend: {backend}')
+        return os.path.splitext(self._model_file)[0] + TFLITE_SUFFIXES[backend]
+
+    def get_model(self, backend: str = KERAS, threads: int = 0,
+                  buckets: Iterable[int] = DEFAULT_BUCKETS) -> ModelBackend:
+        """Load the model for backend (AnalysisEngine keeps the single
+        loaded handle of the process)
+        threads: TFLite interpreter threads, 0 for the default
+        buckets: Keras compiled batch sizes, empty to use model.predict"""
+        model_file = self.model_file(backend)
+        if backend == KERAS:
+            return KerasBackend(model_file, buckets)
+        if not os.path.isfile(model_file):
+            raise FileNotFoundError(
+                f'{model_file} (run python -m src.analysis.convert_tflite)')
+        return TFLiteBackend(model_file, threads)
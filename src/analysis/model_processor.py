@@ -3,31 +3,74 @@ import os
 import shutil
 import tempfile
 import time
-from typing import List, Union
+from typing import Dict, List, Union
 
 import numpy as np
+from src.config.config import Config
 from src.dto.get_video_response import GetVideoResponse
-from src.dto.video_categories import VideoCategory
 from tensorflow import keras
 
-from .model_collection import ModelCollection
-from .video_capture import extract_video_frames
+from .frame_sampler import SamplingMode, progressive_positions
+from .prediction_aggregator import PredictionAggregate, aggregate_predictions
+from .preview import PreviewSettings, write_previews
+from .video_capture import (Decoder, VideoFrames, extract_video_frames,
+                            extract_video_frames_array)
 
 
 IMAGE_DIM = 224   # required/default image dimensionality
 
 
+class AdaptiveSampling:
+    """Early exit settings: classify a first wave of frames and sample more
+    waves, up to the frame budget, only while the result is borderline"""
+
+    def __init__(self, first_wave: int = 6, wave_size: int = 6,
+                 neutral_exit: float = 90.0, explicit_exit: float = 90.0):
+        self.first_wave = first_wave
+        self.wave_size = wave_size
+        self.neutral_exit = neutral_exit
+        self.explicit_exit = explicit_exit
+
+    def is_conclusive(self, prediction: PredictionAggregate,
+                      aggregate: str) -> bool:
+        category = prediction.category(aggregate)
+        return (category.neutral >= self.neutral_exit or
+                category.porn + category.hentai >= self.explicit_exit)
+
+
 class VideoAnalyzer:
-    MODELS = {}
 
-    def __init__(self, media_id: str, video_filename: str):
-        self.model_collection = ModelCollection()
+    def __init__(self, media_id: str, video_filename: str,
+                 in_memory: bool = True,
+                 sampling_mode: SamplingMode = SamplingMode.Seek,
+                 aggregate: str = 'mean', top_k: int = 3,
+                 threshold: float = 0.5, n_frames: int = 20,
+                 adaptive: AdaptiveSampling = None,
+                 decoder: Decoder = Decoder.OpenCV, segments: int = 1,
+                 engine=None, preview: PreviewSettings = None):
+        """engine: AnalysisEngine with the model, the process engine when
+        None
+        preview: write a poster and a sprite sheet of the analysed frames
+        next to the video (in memory analysis)"""
+        from .engine import get_analysis_engine
+        self.engine = engine or get_analysis_engine()
         self._log = logging.getLogger(self.__class__.__name__)
-        self.model = self.model_collection.get_model()
         self.media_id = media_id
         if not os.path.isfile(video_filename):
             raise FileNotFoundError(video_filename)
         self.video_filename = video_filename
+        self.in_memory = in_memory
+        self.sampling_mode = sampling_mode
+        self.decoder = decoder
+        self.segments = segments
+        self.aggregate = aggregate
+        self.top_k = top_k
+        self.threshold = threshold
+        self.n_frames = n_frames
+        self.adaptive = adaptive
+        self.preview = preview
+        self._frames: np.ndarray = None
+        self._frames_order: np.ndarray = None
 
     def __call__(self, *args, **kwds) -> Union[GetVideoResponse, None]:
         return self.process(self.media_id, self.video_filename)
@@ -39,27 +82,126 @@ class VideoAnalyzer:
         video_size = os.path.getsize(video_filename)
         try:
             start_time = time.time()
-            tmp = tempfile.mkdtemp(suffix='vp')
-            frames = extract_video_frames(video_filename, 20, tmp)
-            prediction = self._predict(frames)
-            shutil.rmtree(tmp)
+            if self.in_memory and self.adaptive:
+                prediction = self._classify_adaptive(video_filename)
+            elif self.in_memory:
+                images = extract_video_frames_array(
+                    video_filename, self.n_frames, IMAGE_DIM,
+                    self.sampling_mode, self.decoder, self.segments)
+                prediction = self._classify_nd(images)
+                if self.preview:
+                    self._frames = images
+            else:
+                tmp = tempfile.mkdtemp(suffix='vp')
+                frames = extract_video_frames(
+                    video_filename, self.n_frames, tmp, self.sampling_mode,
+                    self.decoder, IMAGE_DIM, self.segments)
+                prediction = self._predict(frames)
+                shutil.rmtree(tmp)
+
+            video_data = self._response(media_id, video_filename,
+                                        prediction, start_time)
 
+        except Exception as exc:
             video_data = GetVideoResponse(
                 video_id=media_id,
-                categories=VideoCategory(**prediction['data']),
-                message='OK',
-                processing_time=time.time()-start_time
+                message=str(exc)
             )
-            self._log.info('Processed video: %s', video_data)
 
+        return video_data
+
+    def process_frames(self, images: np.ndarray) -> GetVideoResponse:
+        """Classify frames already decoded elsewhere, like the frames teed
+        from the optimizer encode (RGB IMAGE_DIM squares, uint8 or
+        normalized)"""
+        try:
+            start_time = time.time()
+            if images.dtype == np.uint8:
+                images = np.multiply(images, 1 / 255, dtype=np.float32)
+            prediction = self._classify_nd(images)
+            if self.preview:
+                self._frames = images
+            video_data = self._response(self.media_id, self.video_filename,
+                                        prediction, start_time)
         except Exception as exc:
             video_data = GetVideoResponse(
-                video_id=media_id,
+                video_id=self.media_id,
                 message=str(exc)
             )
 
         return video_data
 
+    def _response(self, media_id: str, video_filename: str,
+                  prediction: PredictionAggregate,
+                  start_time: float) -> GetVideoResponse:
+        video_data = GetVideoResponse(
+            video_id=media_id,
+            categories=prediction.category(self.aggregate),
+            statistics=prediction.statistics(),
+            frames=prediction.frame_categories(),
+            frames_used=len(prediction),
+            message='OK',
+            processing_time=time.time()-start_time,
+            previews=self._write_previews(video_filename, prediction)
+        )
+        self._log.info('Processed video: %s', video_data)
+        return video_data
+
+    def _classify_adaptive(self, video_filename: str) -> PredictionAggregate:
+        """Classify frames in waves until the aggregated scores are clearly
+        neutral or clearly explicit, or the frame budget is spent"""
+        with VideoFrames(video_filename, IMAGE_DIM, self.sampling_mode,
+                         self.decoder, self.segments) as video_frames:
+            positions = progressive_positions(
+                video_frames.frame_count, self.n_frames)
+            wave = positions[:self.adaptive.first_wave]
+            read = len(wave)
+            images = video_frames.read(wave)
+            waves = [(wave, images)]
+            model_preds = self._predict_nd(images)
+            prediction = aggregate_predictions(
+                model_preds, self.top_k, self.threshold)
+            while (read < len(positions) and
+                   not self.adaptive.is_conclusive(prediction, self.aggregate)):
+                wave = positions[read:read + self.adaptive.wave_size]
+                read += len(wave)
+                images = video_frames.read(wave)
+                waves.append((wave, images))
+                model_preds = np.concatenate(
+                    [model_preds, self._predict_nd(images)])
+                prediction = aggregate_predictions(
+                    model_preds, self.top_k, self.threshold)
+
+        if self.preview:
+            # each wave is read in position order, the waves are not
+            read_positions = [position for wave, _ in waves
+                              for position in sorted(wave)]
+            self._frames = np.concatenate([images for _, images in waves])
+            self._frames_order = np.argsort(read_positions, kind='stable')
+        self._log.debug('Adaptive sampling %s: %s of %s frames',
+                        video_filename, len(prediction), self.n_frames)
+        return prediction
+
+    def _write_previews(self, video_filename: str,
+                        prediction: PredictionAggregate) -> Dict[str, str]:
+        """Poster and sprite files of the analysed frames, None when
+        disabled or failed (the analysis result stands)"""
+        if not self.preview or self._frames is None:
+            return None
+        images = self._frames
+        neutral = np.array([category.neutral
+                            for category in prediction.frame_categories()])
+        if self._frames_order is not None:
+            images = images[self._frames_order]
+            neutral = neutral[self._frames_order]
+        try:
+            return write_previews(video_filename, images, neutral,
+                                  self.preview)
+        except Exception as exc:
+            self._log.warning('Preview failed for %s: %s',
+                              video_filename, exc)
+            return None
+
     def _predict(self, files: List[str]):
         image_preds = self._classify(files, IMAGE_DIM)
         return image_preds
@@ -69,8 +211,7 @@ class VideoAnalyzer:
         and image dimensionality...."""
         images, _ = self._load_images(
             input_paths, (image_dim, image_dim))
-        probs = self._classify_nd(images)
-        return dict(zip(['data'], probs))
+        return self._classify_nd(images)
 
     def _load_images(self, image_paths, image_size):
         '''
@@ -103,17 +244,18 @@ class VideoAnalyzer:
 
         return np.asarray(loaded_images), loaded_image_paths
 
-    def _classify_nd(self, nd_images):
+    def _classify_nd(self, nd_images) -> PredictionAggregate:
         """ Classify given a model, image array (numpy)...."""
 
-        model_preds = self.model.predict(nd_images)
+        model_preds = self._predict_nd(nd_images)
+        return aggregate_predictions(model_preds, self.top_k, self.threshold)
+
+    def _predict_nd(self, nd_images) -> np.ndarray:
+        return self.engine.predict(nd_images)
 
-        categories = ['drawings', 'hentai', 'neutral', 'porn', 'sexy']
 
-        probs = []
-        for _, single_preds in enumerate(model_preds):
-            single_probs = {}
-            for j, pred in enumerate(single_preds):
-                single_probs[categories[j]] = round(float(pred), 6) * 100
-            probs.append(single_probs)
-        return probs
+def create_video_analyzer(media_id: str, video_filename: str,
+                          config: Config) -> VideoAnalyzer:
+    """VideoAnalyzer with the analysis settings from config"""
+    from .engine import get_analysis_engine
+    return get_analysis_engine(config).analyzer(media_id, video_filename)
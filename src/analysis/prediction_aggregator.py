@@ -0,0 +1,64 @@
+"""Aggregation of the model predictions of every sampled frame"""
+from typing import Dict, List
+
+import numpy as np
+from src.dto.video_categories import VideoCategory
+
+CATEGORIES = ['drawings', 'hentai', 'neutral', 'porn', 'sexy']
+STATISTICS = ['mean', 'max', 'top_k_mean', 'over_threshold']
+
+
+class PredictionAggregate:
+    """Per category statistics over the frames, as percentages"""
+
+    __slots__ = ['frames', 'mean', 'max', 'top_k_mean', 'over_threshold']
+
+    def __init__(self, frames: np.ndarray, mean: np.ndarray, max: np.ndarray,
+                 top_k_mean: np.ndarray, over_threshold: np.ndarray):
+        self.frames = frames
+        self.mean = mean
+        self.max = max
+        self.top_k_mean = top_k_mean
+        self.over_threshold = over_threshold
+
+    def __len__(self) -> int:
+        return len(self.frames)
+
+    def category(self, statistic: str = 'mean') -> VideoCategory:
+        if statistic not in STATISTICS:
+            raise ValueError(f'Invalid statistic: {statistic}')
+        return _to_category(getattr(self, statistic))
+
+    def statistics(self) -> Dict[str, VideoCategory]:
+        return {statistic: self.category(statistic)
+                for statistic in STATISTICS}
+
+    def frame_categories(self) -> List[VideoCategory]:
+        return [_to_category(frame) for frame in self.frames]
+
+
+def aggregate_predictions(model_preds: np.ndarray, top_k: int = 3,
+                          threshold: float = 0.5) -> PredictionAggregate:
+    """Aggregate model_preds (frames, categories) probabilities
+    top_k: number of highest scoring frames for top_k_mean
+    threshold: probability for a frame to count in over_threshold"""
+    preds = np.asarray(model_preds, dtype=np.float64)
+    if preds.ndim != 2 or preds.shape[1] != len(CATEGORIES):
+        raise ValueError(f'Invalid predictions shape: {preds.shape}')
+    if not len(preds):
+        empty = np.zeros(len(CATEGORIES))
+        return PredictionAggregate(preds, empty, empty, empty, empty)
+
+    k = min(max(top_k, 1), len(preds))
+    top_k_mean = np.partition(preds, -k, axis=0)[-k:].mean(axis=0)
+
+    return PredictionAggregate(
+        frames=np.round(preds, 6) * 100,
+        mean=np.round(preds.mean(axis=0), 6) * 100,
+        max=np.round(preds.max(axis=0), 6) * 100,
+        top_k_mean=np.round(top_k_mean, 6) * 100,
+        over_threshold=np.round((preds > threshold).mean(axis=0), 6) * 100)
+
+
+def _to_category(values: np.ndarray) -> VideoCategory:
+    return VideoCategory(**dict(zip(CATEGORIES, values.tolist())))
@@ -0,0 +1,99 @@
+"""Poster frame and preview sprite sheet from the frames sampled for the
+analysis, so the previews need no second decode pass"""
+import math
+import os
+from typing import Dict, Sequence
+
+import cv2
+import numpy as np
+
+POSTER = 'poster'
+SPRITE = 'sprite'
+PREVIEW_FORMATS = ('jpg', 'webp')
+PREVIEW_QUALITY = 80
+
+
+class PreviewSettings:
+
+    def __init__(self, image_format: str = 'jpg', tile_width: int = 160,
+                 columns: int = 5, quality: int = PREVIEW_QUALITY):
+        if image_format not in PREVIEW_FORMATS:
+            raise ValueError(f'Invalid preview format: {image_format}')
+        self.image_format = image_format
+        self.tile_width = tile_width
+        self.columns = columns
+        self.quality = quality
+
+
+def video_aspect(video_file_name: str) -> float:
+    """Display width / height of the video, 1 when unknown"""
+    vidcap = cv2.VideoCapture(video_file_name)
+    try:
+        width = vidcap.get(cv2.CAP_PROP_FRAME_WIDTH)
+        height = vidcap.get(cv2.CAP_PROP_FRAME_HEIGHT)
+    finally:
+        vidcap.release()
+    return width / height if width and height else 1.0
+
+
+def to_bgr(images: np.ndarray) -> np.ndarray:
+    """uint8 BGR frames of the normalized RGB model input"""
+    if images.dtype != np.uint8:
+        images = np.clip(images * 255 + 0.5, 0, 255).astype(np.uint8)
+    return np.ascontiguousarray(images[..., ::-1])
+
+
+def poster_frame(images: np.ndarray, neutral: Sequence[float],
+                 aspect: float) -> np.ndarray:
+    """The most neutral frame, back to the video aspect ratio (the model
+    input is square)"""
+    image = to_bgr(images[int(np.argmax(neutral))])
+    dim = image.shape[1]
+    size = (dim, max(1, round(dim / aspect))) if aspect >= 1 else \
+        (max(1, round(dim * aspect)), dim)
+    return cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+
+
+def sprite_sheet(images: np.ndarray, aspect: float, tile_width: int,
+                 columns: int) -> np.ndarray:
+    """Frames, in video order, as tiles of tile_width in a grid of columns"""
+    tile_height = max(1, round(tile_width / aspect))
+    columns = min(columns, len(images))
+    rows = math.ceil(len(images) / columns)
+    sheet = np.zeros((rows * tile_height, columns * tile_width, 3),
+                     dtype=np.uint8)
+    for index, image in enumerate(to_bgr(images)):
+        row, column = divmod(index, columns)
+        cv2.resize(image, (tile_width, tile_height),
+                   dst=sheet[row * tile_height:(row + 1) * tile_height,
+                             column * tile_width:(column + 1) * tile_width],
+                   interpolation=cv2.INTER_AREA)
+    return sheet
+
+
+def write_previews(video_file_name: str, images: np.ndarray,
+                   neutral: Sequence[float],
+                   settings: PreviewSettings) -> Dict[str, str]:
+    """Write the poster and sprite files next to the video
+    images: analysed frames in video order, neutral: their neutral scores
+    Returns the written files by kind (poster, sprite)"""
+    if not len(images):
+        return {}
+    aspect = video_aspect(video_file_name)
+    if settings.image_format == 'webp':
+        params = [cv2.IMWRITE_WEBP_QUALITY, settings.quality]
+    else:
+        params = [cv2.IMWRITE_JPEG_QUALITY, settings.quality]
+    previews = {}
+    for kind, image in (
+            (POSTER, poster_frame(images, neutral, aspect)),
+            (SPRITE, sprite_sheet(images, aspect, settings.tile_width,
+                                  settings.columns))):
+        filename = f'{video_file_name}.{kind}.{settings.image_format}'
+        ok, data = cv2.imencode('.' + settings.image_format, image, params)
+        if not ok:
+            raise RuntimeError(f'Failed to encode {filename}')
+        with open(filename, 'wb') as file:
+            file.write(data.tobytes())
+        previews[kind] = os.path.abspath(filename)
+    return previews
@@ -1,12 +1,84 @@
 import os
-from typing import List
+from concurrent.futures import ThreadPoolExecutor
+from enum import Enum
+from typing import Callable, List
 
 import cv2
+import numpy as np
+
+from .ffmpeg_decoder import ffmpeg_frames
+from .frame_sampler import (SCENE_PROBE_SIZE, SamplingMode, frame_positions,
+                            keyframe_timestamps, nearest_keyframes,
+                            read_frames, scene_probes, select_scenes)
+
+
+class Decoder(Enum):
+    OpenCV = 'opencv'   # cv2.VideoCapture full resolution frames, resized
+    FFmpeg = 'ffmpeg'   # ffmpeg pipe scaling the frames before Python
+
+
+# Modes that read each position independently, so a range can be read by
+# its own capture; Keyframe and Scene need the whole video
+SEGMENT_MODES = (SamplingMode.Seek, SamplingMode.Grab, SamplingMode.Time)
+SEGMENT_MIN_FRAMES = 250    # shortest range worth its own capture
+
+
+def video_frame_count(video_file_name: str) -> int:
+    """Frame count from the container metadata, nothing is decoded"""
+    vidcap = cv2.VideoCapture(video_file_name)
+    try:
+        return max(int(vidcap.get(cv2.CAP_PROP_FRAME_COUNT)), 0)
+    finally:
+        vidcap.release()
+
+
+def segment_count(frame_count: int, segments: int,
+                  min_frames: int = SEGMENT_MIN_FRAMES) -> int:
+    """Ranges to split a video into, at most segments, at least
+    min_frames long"""
+    return max(min(segments, frame_count // max(min_frames, 1)), 1)
+
+
+def read_frames_segments(video_file_name: str, positions: List[int],
+                         mode: SamplingMode, segments: int,
+                         process: Callable[[np.ndarray], object]) -> list:
+    """Read the frames at positions splitting them into contiguous ranges,
+    each one read by its own capture on a thread pool (OpenCV releases the
+    GIL while decoding). process(BGR image) runs on the reading thread
+    Returns the processed frames in position order"""
+    positions = sorted(positions)
+    ranges = [chunk.tolist() for chunk in np.array_split(
+        positions, min(segments, len(positions))) if len(chunk)]
+
+    def read_range(range_positions: List[int]) -> list:
+        vidcap = cv2.VideoCapture(video_file_name)
+        try:
+            if mode == SamplingMode.Grab:
+                # start the forward pass at the range, not at frame 0
+                vidcap.set(cv2.CAP_PROP_POS_FRAMES, range_positions[0])
+            return [process(image) for _, image in read_frames(
+                vidcap, video_file_name, range_positions, mode)]
+        finally:
+            vidcap.release()
+
+    if len(ranges) < 2:
+        return [frame for range_positions in ranges
+                for frame in read_range(range_positions)]
+    with ThreadPoolExecutor(max_workers=len(ranges),
+                            thread_name_prefix='VideoSegment') as executor:
+        return [frame for frames in executor.map(read_range, ranges)
+                for frame in frames]
 
 
 def extract_video_frames(video_file_name: str,
-                          n_frames: int, destiny_folder: str) -> List[str]:
+                          n_frames: int, destiny_folder: str,
+                          mode: SamplingMode = SamplingMode.Seek,
+                          decoder: Decoder = Decoder.OpenCV,
+                          image_dim: int = 224,
+                          segments: int = 1) -> List[str]:
     """Extract frames from video and saves into destiny folder
+    image_dim: size of the frames decoded by Decoder.FFmpeg
+    segments: parallel captures over ranges of long videos (OpenCV decoder)
     Returns list of files for each frame"""
     video_file_name = os.path.abspath(video_file_name)
     if not os.path.isfile(video_file_name):
@@ -14,22 +86,142 @@ def extract_video_frames(video_file_name: str,
     if not os.path.isdir(destiny_folder):
         raise FileNotFoundError(destiny_folder)
 
+    if Decoder(decoder) == Decoder.FFmpeg:
+        with VideoFrames(video_file_name, image_dim, mode,
+                         decoder) as video_frames:
+            images = video_frames.read_raw(frame_positions(
+                video_frames.frame_count, n_frames))
+        files = []
+        for frame, image in enumerate(images, 1):
+            frame_file_name = os.path.join(
+                destiny_folder, f'frame_{frame:03}.jpg')
+            if cv2.imwrite(frame_file_name,
+                           cv2.cvtColor(image, cv2.COLOR_RGB2BGR)):
+                files.append(frame_file_name)
+        return files
+
     vidcap = cv2.VideoCapture(video_file_name)
-    skip = int(vidcap.get(cv2.CAP_PROP_FRAME_COUNT)/n_frames)
-    frame = 0
-
-    success = True
-    files = []
-    while success:
-        vidcap.set(cv2.CAP_PROP_POS_FRAMES, frame*skip)
-        frame += 1
-        success, image = vidcap.read()
-        if success:
+    try:
+        frame_count = int(vidcap.get(cv2.CAP_PROP_FRAME_COUNT))
+        positions = frame_positions(frame_count, n_frames)
+        segments = segment_count(frame_count, segments)
+        if segments > 1 and SamplingMode(mode) in SEGMENT_MODES:
+            frames = enumerate(read_frames_segments(
+                video_file_name, positions, SamplingMode(mode), segments,
+                lambda image: image), 1)
+        else:
+            frames = ((frame, image) for frame, (_, image) in enumerate(
+                read_frames(vidcap, video_file_name, positions, mode), 1))
+        files = []
+        for frame, image in frames:
             frame_file_name = os.path.join(
                 destiny_folder, f'frame_{frame:03}.jpg')
             if cv2.imwrite(frame_file_name, image):
                 files.append(frame_file_name)
-        if frame >= n_frames:
-            success = False
+    finally:
+        vidcap.release()
 
     return files
+
+
+class VideoFrames:
+    """Opened video to read frames as normalized batches, possibly in
+    several waves over the same capture"""
+
+    def __init__(self, video_file_name: str, image_dim: int,
+                 mode: SamplingMode = SamplingMode.Seek,
+                 decoder: Decoder = Decoder.OpenCV, segments: int = 1,
+                 segment_min_frames: int = SEGMENT_MIN_FRAMES):
+        """segments: parallel captures over ranges of long videos, each
+        at least segment_min_frames long (OpenCV decoder)"""
+        self.video_file_name = os.path.abspath(video_file_name)
+        if not os.path.isfile(self.video_file_name):
+            raise FileNotFoundError(self.video_file_name)
+        self.image_dim = image_dim
+        self.mode = SamplingMode(mode)
+        self.decoder = Decoder(decoder)
+        self.vidcap = cv2.VideoCapture(self.video_file_name)
+        self.frame_count = int(self.vidcap.get(cv2.CAP_PROP_FRAME_COUNT))
+        self.segments = segment_count(self.frame_count, segments,
+                                      segment_min_frames) \
+            if self.mode in SEGMENT_MODES else 1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        self.vidcap.release()
+
+    def read(self, positions: List[int]) -> np.ndarray:
+        """Returns a float32 array (frames, image_dim, image_dim, 3) of RGB
+        values normalized to [0, 1], ready for model.predict"""
+        raw = self.read_raw(positions)
+        # [0, 255] -> [0, 1] for the whole batch at once
+        images = np.empty(raw.shape, dtype=np.float32)
+        np.multiply(raw, 1 / 255, out=images, casting='unsafe')
+        return images
+
+    def read_raw(self, positions: List[int]) -> np.ndarray:
+        """Returns an uint8 array (frames, image_dim, image_dim, 3) of RGB
+        values"""
+        if self.decoder == Decoder.FFmpeg:
+            return self._read_ffmpeg(sorted(positions))
+
+        dim = self.image_dim
+        if self.segments > 1:
+            # Same interpolation as keras load_img(target_size=...)
+            frames = read_frames_segments(
+                self.video_file_name, positions, self.mode, self.segments,
+                lambda image: cv2.resize(image, (dim, dim),
+                                         interpolation=cv2.INTER_NEAREST))
+            raw = np.stack(frames) if frames else \
+                np.empty((0, dim, dim, 3), dtype=np.uint8)
+            # BGR -> RGB
+            return raw[:, :, :, ::-1]
+
+        raw = np.empty((len(positions), dim, dim, 3), dtype=np.uint8)
+        count = 0
+        for _, image in read_frames(self.vidcap, self.video_file_name,
+                                    sorted(positions), self.mode):
+            # Same interpolation as keras load_img(target_size=...)
+            cv2.resize(image, (dim, dim), dst=raw[count],
+                       interpolation=cv2.INTER_NEAREST)
+            count += 1
+        # BGR -> RGB
+        return raw[:count, :, :, ::-1]
+
+    def _read_ffmpeg(self, positions: List[int]) -> np.ndarray:
+        dim = self.image_dim
+        if self.mode == SamplingMode.Scene and len(positions) > 1:
+            probes = scene_probes(positions)
+            probe_images = ffmpeg_frames(
+                self.video_file_name, probes, *SCENE_PROBE_SIZE,
+                pix_fmt='bgr24')
+            positions = select_scenes(zip(probes, probe_images),
+                                      len(positions))
+        elif self.mode == SamplingMode.Keyframe:
+            fps = self.vidcap.get(cv2.CAP_PROP_FPS)
+            keyframes = keyframe_timestamps(self.video_file_name)
+            if keyframes and fps and fps == fps:
+                return ffmpeg_frames(
+                    self.video_file_name,
+                    nearest_keyframes(positions, fps, keyframes),
+                    dim, dim, keyframes_only=True)
+        return ffmpeg_frames(self.video_file_name, positions, dim, dim)
+
+
+def extract_video_frames_array(video_file_name: str,
+                               n_frames: int, image_dim: int,
+                               mode: SamplingMode = SamplingMode.Seek,
+                               decoder: Decoder = Decoder.OpenCV,
+                               segments: int = 1) -> np.ndarray:
+    """Extract frames from video straight into memory, without temporary files
+    Returns a float32 array (frames, image_dim, image_dim, 3) of RGB
+    values normalized to [0, 1], ready for model.predict"""
+    with VideoFrames(video_file_name, image_dim, mode, decoder,
+                     segments) as video_frames:
+        return video_frames.read(
+            frame_positions(video_frames.frame_count, n_frames))
@@ -0,0 +1,14 @@
+from fastapi import APIRouter, Response, status
+from src.app.service import get_service
+from src.dto.health_response import HealthResponse
+
+router = APIRouter(tags=['Health'])
+
+
+@router.get('/health', response_model=HealthResponse)
+async def health(response: Response):
+    """Readiness for the load balancer: 503 until the model is warmed up"""
+    health_response = get_service().get_health()
+    if not health_response.ready:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    return health_response
@@ -1,4 +1,5 @@
 from fastapi import APIRouter, BackgroundTasks, Response, UploadFile, status
+from src.app.encoding_profiles import PROFILES
 from src.app.service import get_service
 from src.config.config import get_config
 from src.dto.media_notification_response import MediaNotificationResponse
@@ -50,6 +51,13 @@ async def process_media(media_request: MediaProcessRequest,
 
     media_id = request.media_id
 
+    if media_request.profile and media_request.profile not in PROFILES:
+        response.status_code = status.HTTP_400_BAD_REQUEST
+        return VideoReceiveResponse(media_id=media_id,
+                                    post_id=media_request.post_id,
+                                    status=MediaStatusEnum.Rejected,
+                                    message='Invalid encoding profile')
+
     if request.s3_host != config.endpoint_url:
         response.status_code = status.HTTP_400_BAD_REQUEST
         return VideoReceiveResponse(media_id=media_id,
@@ -65,7 +73,7 @@ async def process_media(media_request: MediaProcessRequest,
                                     message='Invalid S3 bucket')
 
     success, code, msg = get_service().register_process_video(
-        media_id, media_request.post_id)
+        media_id, media_request.post_id, media_request.profile)
     if not success:
         response.status_code = code
         return VideoReceiveResponse(media_id=media_id,
@@ -0,0 +1,178 @@
+"""Admission control of the encodes: each encode gets a thread count (from
+its duration x resolution) and a memory estimate (from its resolution),
+and starts only while they fit in the CPU quota and memory limit of the
+container (cgroup v2 or v1), so overlapping large encodes neither get
+throttled nor OOM killed"""
+import logging
+import math
+import os
+import threading
+from contextlib import contextmanager
+from typing import Tuple
+
+import cv2
+from src.config.config import Config
+
+# libvpx keeps about lag-in-frames (25) plus reference and alt-ref frames
+# of 1.5 bytes per pixel (yuv420p), and the decoder its own few frames
+FRAME_BUFFERS = 48
+BASE_MEMORY = 64 * 1024 * 1024
+# VP9 threads are tile columns, each at least 256 pixels wide
+TILE_WIDTH = 256
+MAX_THREADS = 8
+# work of one encoder thread: about 10s of 1080p at 25fps
+WORK_PER_THREAD = 1920 * 1080 * 25 * 10
+# share of the container memory left to the encodes by default, the rest
+# is for the model and the service
+MEMORY_SHARE = 0.75
+
+
+class EncodeCost:
+
+    __slots__ = ['threads', 'memory', 'work']
+
+    def __init__(self, threads: int, memory: int, work: float):
+        """threads: encoder threads, memory: estimated peak bytes,
+        work: duration x resolution (pixels to encode)"""
+        self.threads = threads
+        self.memory = memory
+        self.work = work
+
+    def __str__(self):
+        return (f'{self.threads} threads, {self.memory // 2**20}MB, '
+                f'{self.work / 1e6:.0f}M pixels')
+
+
+def cgroup_limits() -> Tuple[float, int]:
+    """CPU quota (CPUs) and memory limit (bytes) of the container, the
+    available CPUs and the physical memory when there is no limit"""
+    cpus = len(os.sched_getaffinity(0)) \
+        if hasattr(os, 'sched_getaffinity') else os.cpu_count() or 1
+    quota = _read('/sys/fs/cgroup/cpu.max')          # v2: "quota period"
+    if quota:
+        value, _, period = quota.partition(' ')
+        if value != 'max' and period:
+            cpus = min(cpus, int(value) / int(period))
+    else:
+        value = _read('/sys/fs/cgroup/cpu/cpu.cfs_quota_us')
+        period = _read('/sys/fs/cgroup/cpu/cpu.cfs_period_us')
+        if value and period and int(value) > 0:
+            cpus = min(cpus, int(value) / int(period))
+
+    memory = os.sysconf('SC_PHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    limit = _read('/sys/fs/cgroup/memory.max') or \
+        _read('/sys/fs/cgroup/memory/memory.limit_in_bytes')
+    if limit and limit != 'max':
+        memory = min(memory, int(limit))
+    return cpus, memory
+
+
+def _read(filename: str) -> str:
+    try:
+        with open(filename) as file:
+            return file.read().strip()
+    except OSError:
+        return ''
+
+
+def encode_cost(filename: str) -> EncodeCost:
+    """Cost estimate of encoding the video, from its resolution and
+    duration (container metadata, nothing is decoded)"""
+    vidcap = cv2.VideoCapture(filename)
+    try:
+        width = int(vidcap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(vidcap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        frames = max(vidcap.get(cv2.CAP_PROP_FRAME_COUNT), 0)
+    finally:
+        vidcap.release()
+    return estimate_cost(width, height, frames)
+
+
+def estimate_cost(width: int, height: int, frames: float) -> EncodeCost:
+    """Threads in proportion to the work (duration x resolution), up to the
+    tile columns of the width, so that short encodes reserve little of the
+    budget; memory from the frame buffers"""
+    pixels = width * height
+    work = pixels * frames
+    threads = min(max(width // TILE_WIDTH, 1), MAX_THREADS)
+    if work:
+        threads = min(threads, max(math.ceil(work / WORK_PER_THREAD), 1))
+    return EncodeCost(
+        threads=threads,
+        memory=BASE_MEMORY + int(pixels * 1.5 * FRAME_BUFFERS),
+        work=work)
+
+
+class EncoderScheduler:
+
+    def __init__(self, cpus: float, memory: int):
+        """cpus and memory: budget shared by the running encodes"""
+        self.log = logging.getLogger(self.__class__.__name__)
+        self.cpus = max(int(cpus), 1)
+        self.memory = memory
+        self.used_cpus = 0
+        self.used_memory = 0
+        self.running = 0
+        self._waiting = []
+        self._condition = threading.Condition()
+
+    @contextmanager
+    def admit(self, cost: EncodeCost):
+        """Wait until the encode fits in the free budget, yielding its
+        thread count. Waiting encodes start in arrival order, except that
+        smaller ones start ahead of an earlier one that does not fit yet.
+        An encode larger than the whole budget runs alone"""
+        threads = min(cost.threads, self.cpus)
+        memory = min(cost.memory, self.memory)
+        entry = (threads, memory)
+        with self._condition:
+            self._waiting.append(entry)
+            if not self._admissible(entry):
+                self.log.info('Encode waiting for budget: %s (%s)',
+                              cost, self)
+            self._condition.wait_for(lambda: self._admissible(entry))
+            self._waiting.remove(entry)
+            self.used_cpus += threads
+            self.used_memory += memory
+            self.running += 1
+        try:
+            yield threads
+        finally:
+            with self._condition:
+                self.used_cpus -= threads
+                self.used_memory -= memory
+                self.running -= 1
+                self._condition.notify_all()
+
+    def _admissible(self, entry: Tuple[int, int]) -> bool:
+        for waiting in self._waiting:
+            if self._fits(waiting):
+                return waiting is entry
+            if waiting is entry:
+                return False
+        return False
+
+    def _fits(self, entry: Tuple[int, int]) -> bool:
+        threads, memory = entry
+        return (self.used_cpus + threads <= self.cpus and
+                self.used_memory + memory <= self.memory)
+
+    def __str__(self):
+        return (f'{self.running} running, {self.used_cpus}/{self.cpus} CPUs, '
+                f'{self.used_memory // 2**20}/{self.memory // 2**20}MB, '
+                f'{len(self._waiting)} waiting')
+
+
+def encoder_scheduler(config: Config) -> EncoderScheduler:
+    """Scheduler of the configured budget, None when disabled"""
+    if not config.encode_scheduler:
+        return None
+    cpus, memory = cgroup_limits()
+    if config.encode_cpus:
+        cpus = min(cpus, len(config.encode_cpus))
+    scheduler = EncoderScheduler(
+        config.encode_cpu_budget or cpus,
+        config.encode_memory_budget_mb * 2**20 or int(memory * MEMORY_SHARE))
+    scheduler.log.info('Encode budget: %s CPUs, %sMB',
+                       scheduler.cpus, scheduler.memory // 2**20)
+    return scheduler
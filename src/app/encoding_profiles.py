@@ -0,0 +1,60 @@
+"""Named VP9 encoding profiles of the VideoOptimizer
+
+https://trac.ffmpeg.org/wiki/Encode/VP9
+https://developers.google.com/media/vp9/settings/vod"""
+from typing import Dict
+
+TWO_PASS = 'two-pass'
+SINGLE_PASS = 'single-pass'
+QUICK = 'quick'
+
+
+class EncodingProfile:
+
+    __slots__ = ['name', 'passes', 'video_options', 'audio_options']
+
+    def __init__(self, name: str, passes: int, video_options: Dict[str, str],
+                 audio_options: Dict[str, str] = None):
+        """passes: 2 for a stats pass before the encode, 1 for a single pass
+        video_options: ffmpeg output options of the video stream"""
+        if passes not in (1, 2):
+            raise ValueError(f'Invalid passes: {passes}')
+        self.name = name
+        self.passes = passes
+        self.video_options = video_options
+        self.audio_options = audio_options or {'c:a': 'libopus'}
+
+    def __str__(self):
+        return f'{self.name} ({self.passes} pass)'
+
+
+PROFILES: Dict[str, EncodingProfile] = {
+    # Best compression, nearly twice the encode time
+    TWO_PASS: EncodingProfile(TWO_PASS, 2, {
+        'c:v': 'libvpx-vp9',
+        'b:v': '0',
+        'crf': '30'}),
+    # Constrained quality: CRF capped at a bitrate, good deadline
+    SINGLE_PASS: EncodingProfile(SINGLE_PASS, 1, {
+        'c:v': 'libvpx-vp9',
+        'b:v': '2M',
+        'crf': '32',
+        'deadline': 'good',
+        'cpu-used': '4',
+        'row-mt': '1'}),
+    # Good enough for backlogs: fastest speed setting of libvpx
+    QUICK: EncodingProfile(QUICK, 1, {
+        'c:v': 'libvpx-vp9',
+        'b:v': '1500k',
+        'crf': '36',
+        'deadline': 'realtime',
+        'cpu-used': '8',
+        'row-mt': '1'}),
+}
+
+
+def get_profile(name: str) -> EncodingProfile:
+    if name not in PROFILES:
+        raise ValueError(f'Invalid encoding profile: {name} '
+                         f'(valid: {", ".join(PROFILES)})')
+    return PROFILES[name]
@@ -1,14 +1,30 @@
 import datetime
+import functools
 import logging
+import os
+from concurrent.futures import Future
 
-from src.analysis.model_processor import VideoAnalyzer
+from src.analysis.analysis_executor import get_analysis_executor
+from src.analysis.frame_sampler import frame_positions
+from src.analysis.video_capture import video_frame_count
 from src.app.jobs import JobName
+from src.app.optimizer_pool import get_optimizer_pool
 from src.app.s3_object import S3Object
 from src.app.schedule.schedule_worker import Job, ScheduleContext
+from src.app.video_optimizer import VideoOptimizer
+from src.app.video_probe import probe_source, remux_mode
+from src.domain.media_cache import MediaCache
 from src.domain.media_data import MediaData
+from src.domain.media_probe import MediaProbe
+from src.dto.get_video_response import GetVideoResponse
 from src.dto.media_status_enum import MediaStatusEnum
 
 
+# optimization fields of the tee pipeline result, passed on to Optimize
+TEE_RESULT_FIELDS = ('new_filename', 'new_media_id', 'message', 'policy',
+                     'optimized')
+
+
 class AnalysisJob(Job):
 
     def __init__(self):
@@ -18,6 +34,8 @@ class AnalysisJob(Job):
 
     def do_process(self, event, context: ScheduleContext) -> bool:
         media_id, post_id, metadata = self.get_event_fields(event)
+        if 'content_metadata' in event:
+            return self._analysis_result(event, context)
 
         self.log.info('Content analysing file %s', media_id)
         context.repository.set_media(MediaData(
@@ -29,21 +47,176 @@ class AnalysisJob(Job):
             if not s3_object.download():
                 return False
             filename = s3_object.filename()
+            content_hash = s3_object.content_hash
 
         context.repository.set_media(MediaData(
             post_id=post_id,
             media_id=media_id,
             media_path=filename,
             status=MediaStatusEnum.Analysing))
-        video_response = VideoAnalyzer(media_id, filename)()
-        if video_response:
-            if not video_response.categories:
-                self.log.warning(
-                    'No categories found for %s', media_id)
-                return False
-            content_metadata = video_response.categories.values()
-        else:
-            content_metadata = dict()
+        cached = context.repository.get_cache(content_hash) \
+            if context.config.cache_enabled and content_hash else None
+        if cached and cached.category is not None:
+            self.log.info('Analysis cache hit %s: %s', media_id, cached)
+            return self._analysed(event, filename, content_hash,
+                                  cached.category, context)
+        if context.config.tee_pipeline:
+            return self._tee(event, filename, content_hash, context)
+        return self._analyse(event, filename, content_hash, context)
+
+    def _analyse(self, event, filename: str, content_hash: str,
+                 context: ScheduleContext, tee_result: dict = None) -> bool:
+        """Analyse the file on the analysis executor
+        tee_result: optimization of a tee pipeline whose analysis failed,
+        passed on with the result"""
+        media_id, post_id, metadata = self.get_event_fields(event)
+
+        def on_done(future: Future):
+            # runs on the executor thread: hand the result back to the
+            # scheduler thread through the event queue
+            try:
+                video_response = future.result()
+                content_metadata = self._content_metadata(
+                    media_id, video_response)
+            except Exception as exc:
+                self.log.error('Analysis failed for %s: %s', media_id, exc)
+                return
+            context.schedule.publish_event(
+                JobName.Analysis.value, media_id=media_id, post_id=post_id,
+                metadata=metadata, filename=filename,
+                content_hash=content_hash,
+                content_metadata=content_metadata,
+                previews=video_response.previews if video_response else None,
+                **{'profile': event.get('profile'), **(tee_result or {})})
+
+        get_analysis_executor(context.config).submit(
+            media_id, filename).add_done_callback(on_done)
+        return True
+
+    def _tee(self, event, filename: str, content_hash: str,
+             context: ScheduleContext) -> bool:
+        """Analyse the frames teed from the encode, decoding the video once
+        for both. The result event carries the optimization too, so the
+        Optimize job goes straight to the upload"""
+        media_id, post_id, metadata = self.get_event_fields(event)
+        optimizer_pool = get_optimizer_pool(context.config)
+        try:
+            profile = optimizer_pool.select_profile(event.get('profile'))
+        except ValueError as exc:
+            self.log.error('Optimization of %s: %s', media_id, exc)
+            return False
+        probe = probe_source(media_id, filename, context.config,
+                             context.repository)
+        encode = (not probe or probe.encode or
+                  optimizer_pool.exceeds_policy(probe))
+        # no re-encode, but the container may still need a fix: the frames
+        # are then sampled after the remux
+        remux = None if encode else remux_mode(probe, filename, media_id)
+        positions = frame_positions(video_frame_count(filename),
+                                    context.config.analysis_frames)
+
+        # fields of the result event, from the finished VideoOptimizer
+        tee_result = functools.partial(self._tee_result, media_id, probe,
+                                       encode or bool(remux))
+
+        def on_analysed(future: Future, video_optimizer: VideoOptimizer):
+            # runs on the executor thread
+            try:
+                video_response = future.result()
+                content_metadata = self._content_metadata(
+                    media_id, video_response)
+            except Exception as exc:
+                self.log.error('Tee analysis failed for %s: %s, analysing '
+                               'the file', media_id, exc)
+                self._analyse(event, filename, content_hash, context,
+                              tee_result(video_optimizer))
+                return
+            context.schedule.publish_event(
+                JobName.Analysis.value, media_id=media_id, post_id=post_id,
+                metadata=metadata, filename=filename,
+                content_hash=content_hash,
+                content_metadata=content_metadata,
+                previews=video_response.previews if video_response else None,
+                **tee_result(video_optimizer))
+
+        def on_encoded(future: Future):
+            # runs on the optimizer pool thread
+            try:
+                video_optimizer: VideoOptimizer = future.result()
+            except Exception as exc:
+                self.log.error('Tee failed for %s: %s, analysing and '
+                               'optimizing the file', media_id, exc)
+                self._analyse(event, filename, content_hash, context)
+                return
+            if video_optimizer.frames is None or \
+                    not len(video_optimizer.frames):
+                self.log.error('No frames teed from %s, analysing the file',
+                               media_id)
+                self._analyse(event, filename, content_hash, context,
+                              tee_result(video_optimizer))
+                return
+            get_analysis_executor(context.config).submit_frames(
+                media_id, filename, video_optimizer.frames
+            ).add_done_callback(
+                lambda analysed: on_analysed(analysed, video_optimizer))
+
+        self.log.info('Tee analysing and optimizing %s (%s, encode: %s)',
+                      media_id, remux or profile, encode)
+        optimizer_pool.submit(media_id, filename, profile,
+                              sample_positions=positions,
+                              encode=encode or bool(remux), remux=remux,
+                              probe=probe).add_done_callback(on_encoded)
+        return True
+
+    def _tee_result(self, media_id: str, probe: MediaProbe, encoded: bool,
+                    video_optimizer: VideoOptimizer) -> dict:
+        """TEE_RESULT_FIELDS (and profile) of the finished optimizer"""
+        message = video_optimizer.message or \
+            f'Video not optimized: {media_id} (encode skipped, ' \
+            f'{probe.reason})'
+        return dict(
+            profile=((video_optimizer.remux or video_optimizer.profile.name)
+                     if encoded else None),
+            new_filename=video_optimizer.new_file,
+            new_media_id=video_optimizer.new_media_id(),
+            message=message,
+            optimized=video_optimizer.optimized,
+            policy=(video_optimizer.applied_policy
+                    if video_optimizer.new_file else ''))
+
+    def _content_metadata(self, media_id: str,
+                          video_response: GetVideoResponse) -> dict:
+        """Categories of the analysis, None when there is none"""
+        if not video_response:
+            return dict()
+        if not video_response.categories:
+            self.log.warning('No categories found for %s: %s',
+                             media_id, video_response.message)
+            return None
+        return video_response.categories.values()
+
+    def _analysis_result(self, event, context: ScheduleContext) -> bool:
+        """Result event published when the analysis executor finishes"""
+        filename = event.get('filename')
+        content_hash = event.get('content_hash')
+        content_metadata = event.get('content_metadata')
+        if (content_metadata is not None and
+                context.config.cache_enabled and content_hash):
+            context.repository.set_cache(MediaCache(
+                content_hash=content_hash,
+                category=content_metadata,
+                source_size=os.path.getsize(filename)))
+            context.repository.evict_cache(
+                context.config.cache_max_entries,
+                context.config.cache_max_age_days)
+        return self._analysed(event, filename, content_hash,
+                              content_metadata, context)
+
+    def _analysed(self, event, filename: str, content_hash: str,
+                  content_metadata: dict, context: ScheduleContext) -> bool:
+        media_id, post_id, metadata = self.get_event_fields(event)
+        if content_metadata is None:
+            return False
 
         context.repository.set_media(MediaData(
             post_id=post_id,
@@ -55,7 +228,10 @@ class AnalysisJob(Job):
         context.schedule.publish_event(
             JobName.Optimize.value, filename=filename,
             media_id=media_id, post_id=post_id, metadata=metadata,
-            content_metadata=content_metadata)
+            content_metadata=content_metadata, content_hash=content_hash,
+            previews=event.get('previews'), profile=event.get('profile'),
+            **{field: event[field] for field in TEE_RESULT_FIELDS
+               if field in event})
 
         return True
 
@@ -28,7 +28,7 @@ class NotifyJob(Job):
             if new_media_id and new_media_id != media_id \
             else media_id
 
-        context.repository.set_media(MediaData(
+        self._set_media(context, MediaData(
             post_id=post_id,
             media_id=update_media_id,
             category=content_metadata,
@@ -42,7 +42,8 @@ class NotifyJob(Job):
             return False
 
         # backend accepted the notification
-        context.repository.set_media(
+        self._set_media(
+            context,
             MediaData(post_id=post_id,
                       media_id=update_media_id,
                       category=content_metadata,
@@ -54,5 +55,15 @@ class NotifyJob(Job):
                 JobName.RemoveVideo.value, media_id=media_id)
         return True
 
+    def _set_media(self, context: ScheduleContext, media_data: MediaData):
+        """Replaces the media row, keeping the paths and preview keys stored
+        by the previous jobs"""
+        stored = context.repository.get_media_by_postid(media_data.post_id)
+        if stored:
+            for field in ('media_path', 'new_media_path', 'poster_id',
+                          'sprite_id'):
+                setattr(media_data, field, getattr(stored, field))
+        context.repository.set_media(media_data)
+
     def interval(self) -> datetime.timedelta:
         return datetime.timedelta(seconds=0)
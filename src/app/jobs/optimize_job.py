@@ -1,9 +1,13 @@
 import datetime
 import logging
+from concurrent.futures import Future
 
 from src.app.jobs import JobName
+from src.app.optimizer_pool import get_optimizer_pool
+from src.app.s3_object import S3Object
 from src.app.schedule.schedule_worker import Job, ScheduleContext
 from src.app.video_optimizer import VideoOptimizer
+from src.app.video_probe import probe_source, remux_mode
 from src.domain.media_data import MediaData
 from src.dto.media_status_enum import MediaStatusEnum
 
@@ -18,6 +22,10 @@ class OptimizeJob(Job):
         (filename, media_id, post_id, metadata,
          content_metadata) = self.get_event_fields(event)
         content_metadata = content_metadata or dict()
+        if 'new_filename' in event:
+            return self._optimized(event, context)
+        content_hash = event.get('content_hash')
+        previews = event.get('previews')
 
         self.log.info('Processing video: %s', media_id)
         context.repository.set_media(MediaData(
@@ -27,29 +35,124 @@ class OptimizeJob(Job):
             category=content_metadata,
             status=MediaStatusEnum.Optimizing))
 
-        with VideoOptimizer(media_id, filename,
-                            keep_temp=True) as video_optimizer:
-            video_optimizer.run()
+        new_media_id = self._cached_new_media_id(content_hash, context)
+        if new_media_id is not None:
+            self.log.info('Optimization cache hit %s -> %s',
+                          media_id, new_media_id or media_id)
+            new_media_id = new_media_id or media_id
             context.repository.set_media(MediaData(
                 post_id=post_id,
                 media_id=media_id,
                 media_path=filename,
-                new_media_path=video_optimizer.new_file,
                 category=content_metadata,
                 status=MediaStatusEnum.Optimized,
-                new_media_id=video_optimizer.new_media_id())
-            )
-            self.log.info('Optimization: %s', video_optimizer.message)
+                new_media_id=new_media_id))
             metadata['wmr-status'] = 'OPTIMIZED'
+            context.schedule.publish_event(
+                JobName.Upload.value, filename=filename, new_filename='',
+                media_id=media_id, post_id=post_id, metadata=metadata,
+                content_metadata=content_metadata,
+                new_media_id=new_media_id, content_hash=content_hash,
+                previews=previews)
+            return True
 
+        optimizer_pool = get_optimizer_pool(context.config)
+        probe = probe_source(media_id, filename, context.config,
+                             context.repository)
+        remux = None
+        if (probe and not probe.encode and
+                not optimizer_pool.exceeds_policy(probe)):
+            # no re-encode, but the container may still need a fix
+            remux = remux_mode(probe, filename, media_id)
+            if not remux:
+                self.log.info('Encode skipped: %s', probe)
+                return self._optimized(dict(
+                    event, new_filename='', new_media_id=media_id,
+                    message=f'Video not optimized: {media_id} (encode '
+                            f'skipped, {probe.reason})'), context)
+            self.log.info('Encode skipped, %s: %s', remux, probe)
+
+        def on_done(future: Future):
+            # runs on the pool thread: hand the result back to the
+            # scheduler thread through the event queue
+            try:
+                video_optimizer: VideoOptimizer = future.result()
+            except Exception as exc:
+                self.log.error('Optimization failed for %s: %s',
+                               media_id, exc)
+                return
             context.schedule.publish_event(
-                JobName.Upload.value, filename=filename,
-                new_filename=video_optimizer.new_file,
+                JobName.Optimize.value, filename=filename,
                 media_id=media_id, post_id=post_id, metadata=metadata,
                 content_metadata=content_metadata,
-                new_media_id=video_optimizer.new_media_id())
+                content_hash=content_hash, previews=previews,
+                new_filename=video_optimizer.new_file,
+                new_media_id=video_optimizer.new_media_id(),
+                message=video_optimizer.message,
+                optimized=video_optimizer.optimized,
+                profile=(video_optimizer.remux or
+                         video_optimizer.profile.name),
+                policy=(video_optimizer.applied_policy
+                        if video_optimizer.new_file else ''))
 
+        try:
+            profile = optimizer_pool.select_profile(event.get('profile'))
+        except ValueError as exc:
+            self.log.error('Optimization of %s: %s', media_id, exc)
+            return False
+        optimizer_pool.submit(
+            media_id, filename, profile, remux=remux,
+            probe=probe).add_done_callback(on_done)
         return True
 
+    def _optimized(self, event, context: ScheduleContext) -> bool:
+        """Result event published when the optimizer pool finishes"""
+        (filename, media_id, post_id, metadata,
+         content_metadata) = self.get_event_fields(event)
+        new_filename = event.get('new_filename')
+        new_media_id = event.get('new_media_id')
+        context.repository.set_media(MediaData(
+            post_id=post_id,
+            media_id=media_id,
+            media_path=filename,
+            new_media_path=new_filename,
+            category=content_metadata,
+            status=MediaStatusEnum.Optimized,
+            new_media_id=new_media_id)
+        )
+        self.log.info('Optimization: %s', event.get('message'))
+        metadata['wmr-status'] = 'OPTIMIZED'
+        if event.get('profile'):
+            metadata['wmr-profile'] = event.get('profile')
+        if event.get('policy'):
+            metadata['wmr-policy'] = event.get('policy')
+
+        context.schedule.publish_event(
+            JobName.Upload.value, filename=filename,
+            new_filename=new_filename,
+            media_id=media_id, post_id=post_id, metadata=metadata,
+            content_metadata=content_metadata,
+            new_media_id=new_media_id,
+            content_hash=event.get('content_hash'),
+            previews=event.get('previews'),
+            optimized=event.get('optimized'))
+        return True
+
+    def _cached_new_media_id(self, content_hash: str,
+                             context: ScheduleContext) -> str:
+        """Optimization result for the same content: the key of the
+        optimized object if it still exists, '' if optimizing did not help,
+        None when unknown"""
+        if not context.config.cache_enabled or not content_hash:
+            return None
+        cached = context.repository.get_cache(content_hash)
+        if not cached or cached.new_media_id is None:
+            return None
+        if cached.new_media_id:
+            with S3Object(context.config, cached.new_media_id) as s3_object:
+                if not s3_object.exists:
+                    return None
+        return cached.new_media_id
+
     def interval(self) -> datetime.timedelta:
         return datetime.timedelta(seconds=0)
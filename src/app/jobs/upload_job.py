@@ -1,10 +1,12 @@
 import datetime
 import logging
 import os
+from typing import Dict
 
 from src.app.jobs import JobName
 from src.app.s3_object import S3Object
 from src.app.schedule.schedule_worker import Job, ScheduleContext
+from src.domain.media_cache import MediaCache
 from src.domain.media_data import MediaData
 from src.dto.media_status_enum import MediaStatusEnum
 
@@ -31,6 +33,11 @@ class UploadJob(Job):
             new_media_id=new_media_id)
         )
         metadata['wmr-source'] = media_id
+        previews = event.get('previews') or dict()
+        preview_ids = self._upload_previews(
+            previews, new_media_id or media_id, media_id, context)
+        metadata.update({'wmr-'+kind: key
+                         for kind, key in preview_ids.items()})
         metadata.update({'wmr_analisys-'+key: content_metadata[key]
                          for key in content_metadata})
 
@@ -51,17 +58,24 @@ class UploadJob(Job):
                 self.log.info('Successfully updated video: %s %s',
                               media_id, metadata)
 
+        self._cache_outcome(event, new_filename, new_media_id, context)
+
         if os.path.isfile(filename):
             os.remove(filename)
         if os.path.isfile(new_filename):
             os.remove(new_filename)
+        for preview_filename in previews.values():
+            if os.path.isfile(preview_filename):
+                os.remove(preview_filename)
 
         context.repository.set_media(
             MediaData(post_id=post_id,
                       media_id=media_id,
                       category=content_metadata,
                       status=MediaStatusEnum.Uploaded,
-                      new_media_id=new_media_id))
+                      new_media_id=new_media_id,
+                      poster_id=preview_ids.get('poster', ''),
+                      sprite_id=preview_ids.get('sprite', '')))
 
         context.schedule.publish_event(
             JobName.Notify.value, media_id=media_id, post_id=post_id,
@@ -71,5 +85,40 @@ class UploadJob(Job):
             filename=filename)
         return True
 
+    def _cache_outcome(self, event, new_filename: str, new_media_id: str,
+                       context: ScheduleContext):
+        """Optimization outcome of the content, for the next upload of it"""
+        content_hash = event.get('content_hash')
+        if not (context.config.cache_enabled and content_hash):
+            return
+        if new_filename:
+            cached_media_id = new_media_id
+        elif event.get('optimized') is False:
+            # the encode finished and did not help
+            cached_media_id = ''
+        else:
+            # failed (retried next time) or reused from the cache
+            cached_media_id = None
+        context.repository.set_cache(MediaCache(
+            content_hash=content_hash, new_media_id=cached_media_id))
+
+    def _upload_previews(self, previews: Dict[str, str], target_id: str,
+                         media_id: str,
+                         context: ScheduleContext) -> Dict[str, str]:
+        """Upload the preview files next to target_id (video.mp4 ->
+        video.poster.jpg). Returns the uploaded keys by kind; a failed
+        preview does not fail the upload"""
+        preview_ids = {}
+        for kind, preview_filename in previews.items():
+            key = (os.path.splitext(target_id)[0] + '.' + kind +
+                   os.path.splitext(preview_filename)[1])
+            with S3Object(context.config, key) as s3_object:
+                if s3_object.upload(preview_filename,
+                                    **{'wmr-source': media_id}):
+                    preview_ids[kind] = s3_object.key
+                else:
+                    self.log.warning('Failed to upload %s %s', kind, key)
+        return preview_ids
+
     def interval(self) -> datetime.timedelta:
         return datetime.timedelta(seconds=0)
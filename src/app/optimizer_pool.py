@@ -0,0 +1,166 @@
+"""Pool of concurrent video encodes, off the scheduler thread
+
+Each encode is an ffmpeg process with its own working directory, so the
+pool threads only wait on them, and on the admission of the encoder
+scheduler: encodes waiting for CPU or memory budget never hold the
+scheduler thread (notify and upload events)."""
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List
+
+from src.app.encoder_scheduler import encode_cost, encoder_scheduler
+from src.app.encoding_profiles import EncodingProfile, get_profile
+from src.app.output_policy import output_policy
+from src.app.video_optimizer import VideoOptimizer
+from src.app.video_probe import encode_threshold
+from src.config.config import Config
+from src.config.runtime import cpu_affinity
+from src.domain.media_probe import MediaProbe
+
+singleton_pool = None
+
+
+class OptimizerPool:
+
+    def __init__(self, config: Config, workers: int = 1):
+        """workers: simultaneous encodes, 0 to encode inline on the caller
+        thread"""
+        self.log = logging.getLogger(self.__class__.__name__)
+        self.config = config
+        self.workers = max(workers, 0)
+        self._executor: ThreadPoolExecutor = None
+        self._lock = threading.Lock()
+        self.pending = 0
+        # queued and running encodes, cancelled on shutdown (cancel_futures
+        # of Executor.shutdown needs Python 3.9)
+        self._futures = set()
+        self.scheduler = encoder_scheduler(config)
+        self.policy = output_policy(config)
+
+    def select_profile(self, name: str = None) -> EncodingProfile:
+        """The named profile, or the configured one: the backlog profile
+        while the pending encodes reach the backlog size"""
+        if not name:
+            backlog_size = self.config.encoding_backlog_size
+            name = self.config.encoding_backlog_profile \
+                if backlog_size and self.pending >= backlog_size \
+                else self.config.encoding_profile
+        return get_profile(name)
+
+    def exceeds_policy(self, probe: MediaProbe) -> bool:
+        """True when the output policy caps the probed source, so it must
+        be encoded even if it is already efficiently compressed"""
+        return bool(self.policy and self.policy.exceeded(
+            probe.width, probe.height, probe.fps, probe.bit_rate))
+
+    def submit(self, media_id: str, filename: str,
+               profile: EncodingProfile = None,
+               sample_positions: List[int] = None,
+               encode: bool = True, remux: str = None,
+               probe: MediaProbe = None) -> Future:
+        """Future with the finished VideoOptimizer of the media (new_file,
+        message, profile and new_media_id)
+        sample_positions: frames to tee to the analysis (frames)
+        encode: False to only decode the sample_positions frames
+        remux: stream copy mode (REMUX or REMUX_AUDIO) instead of encoding
+        probe: of the source, to run the trial encode only when its bits
+        per pixel are close to the threshold"""
+        profile = profile or self.select_profile()
+        if not self.workers:
+            future = Future()
+            try:
+                future.set_result(self.optimize(
+                    media_id, filename, profile, sample_positions, encode,
+                    remux, probe))
+            except Exception as exc:
+                future.set_exception(exc)
+            return future
+
+        future = self._get_executor().submit(
+            self.optimize, media_id, filename, profile, sample_positions,
+            encode, remux, probe)
+        with self._lock:
+            self.pending += 1
+            self._futures.add(future)
+        future.add_done_callback(self._done)
+        return future
+
+    def _done(self, future: Future):
+        with self._lock:
+            self.pending -= 1
+            self._futures.discard(future)
+
+    def optimize(self, media_id: str, filename: str,
+                 profile: EncodingProfile = None,
+                 sample_positions: List[int] = None,
+                 encode: bool = True, remux: str = None,
+                 probe: MediaProbe = None) -> VideoOptimizer:
+        if encode and not remux and self.scheduler:
+            # stream copies are cheap enough to skip the admission
+            with self.scheduler.admit(encode_cost(filename)) as threads:
+                return self._optimize(media_id, filename, profile,
+                                      sample_positions, encode, threads,
+                                      probe=probe)
+        return self._optimize(media_id, filename, profile, sample_positions,
+                              encode, remux=remux, probe=probe)
+
+    def _optimize(self, media_id: str, filename: str,
+                  profile: EncodingProfile, sample_positions: List[int],
+                  encode: bool, threads: int = 0, remux: str = None,
+                  probe: MediaProbe = None) -> VideoOptimizer:
+        with VideoOptimizer(
+                media_id, filename, keep_temp=True, profile=profile,
+                trial_seconds=self.config.trial_encode_seconds,
+                trial_min_saving=self.config.trial_min_saving,
+                probe=probe, trial_max_bpp=self._trial_max_bpp(probe),
+                chunk_workers=self.config.encode_chunk_workers,
+                chunk_min_duration=self.config.encode_chunk_min_duration,
+                sample_positions=sample_positions,
+                threads=threads, remux=remux,
+                policy=self.policy) as video_optimizer:
+            with cpu_affinity(self.config.encode_cpus):
+                if encode:
+                    video_optimizer.run()
+                else:
+                    video_optimizer.sample()
+        return video_optimizer
+
+    def _trial_max_bpp(self, probe: MediaProbe) -> float:
+        """Bits per pixel of the source above which the encode is a clear
+        win and needs no trial: the threshold of its codec plus the margin"""
+        if not probe or not self.config.trial_bpp_margin:
+            return 0
+        threshold = encode_threshold(probe.codec, self.config.probe_min_bpp,
+                                     self.config.probe_min_bpp_codecs)
+        return threshold * (1 + self.config.trial_bpp_margin)
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if not self._executor:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers,
+                    thread_name_prefix='VideoOptimizer')
+                self.log.info('OptimizerPool started with %s workers',
+                              self.workers)
+            return self._executor
+
+    def shutdown(self, wait: bool = True):
+        # outside the lock: cancelled futures run _done, which takes it
+        with self._lock:
+            executor, self._executor = self._executor, None
+            futures = list(self._futures)
+        if executor:
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=wait)
+            self.log.info('OptimizerPool stopped')
+
+
+def get_optimizer_pool(config: Config) -> OptimizerPool:
+    global singleton_pool
+    if not singleton_pool:
+        singleton_pool = OptimizerPool(
+            config, workers=config.optimizer_workers)
+
+    return singleton_pool
@@ -0,0 +1,109 @@
+"""Caps of the optimized outputs: resolution, frame rate and bitrate
+
+The height cap applies to the shorter side, so portrait phone videos get
+the same resolution class as landscape ones (and the rotation metadata of
+the source does not matter)."""
+from typing import Dict
+
+from src.config.config import Config
+
+
+class OutputPolicy:
+
+    __slots__ = ['max_height', 'max_fps', 'max_bitrate']
+
+    def __init__(self, max_height: int = 0, max_fps: float = 0,
+                 max_bitrate: str = ''):
+        """max_height: shorter side (pixels), max_fps: frame rate,
+        max_bitrate: video bitrate ceiling (ex: 2M, 1500k), 0 or empty for
+        no cap"""
+        self.max_height = max_height
+        self.max_fps = max_fps
+        self.max_bitrate = parse_bitrate(max_bitrate)
+
+    def exceeded(self, width: int, height: int, fps: float,
+                 bit_rate: int = 0) -> bool:
+        """True when a source with these properties would be capped"""
+        return bool(self._caps(width, height, fps) or
+                    (self.max_bitrate and bit_rate > self.max_bitrate))
+
+    def video_options(self, width: int, height: int, fps: float,
+                      video_options: Dict[str, str]) -> Dict[str, str]:
+        """Encoder options of the source capped by the policy: scale and fps
+        filters (vf), and b:v at most max_bitrate (constrained quality with
+        crf)"""
+        caps = self._caps(width, height, fps)
+        options = dict(video_options)
+        filters = []
+        if 'fps' in caps:
+            filters.append(f'fps={caps["fps"]:g}')
+        if 'height' in caps:
+            filters.append('scale={}:{}'.format(*caps['scale']))
+        if filters:
+            options['vf'] = ','.join(filters)
+        if self.max_bitrate:
+            bit_rate = parse_bitrate(options.get('b:v', '0'))
+            if not bit_rate or bit_rate > self.max_bitrate:
+                options['b:v'] = str(self.max_bitrate)
+        return options
+
+    def applied(self, width: int, height: int, fps: float,
+                video_options: Dict[str, str]) -> str:
+        """The caps that change the encode of the source, ex:
+        height=1080,fps=30,bitrate=2M ('' when none)"""
+        caps = self._caps(width, height, fps)
+        applied = [f'height={caps["height"]}'] if 'height' in caps else []
+        if 'fps' in caps:
+            applied.append(f'fps={caps["fps"]:g}')
+        capped = self.video_options(width, height, fps, video_options)
+        if capped.get('b:v') != video_options.get('b:v'):
+            applied.append(f'bitrate={format_bitrate(self.max_bitrate)}')
+        return ','.join(applied)
+
+    def _caps(self, width: int, height: int, fps: float) -> dict:
+        caps = {}
+        short_side = min(width, height)
+        if self.max_height and short_side > self.max_height:
+            ratio = self.max_height / short_side
+            caps['height'] = self.max_height
+            # even dimensions for yuv420p
+            caps['scale'] = (_even(width * ratio), _even(height * ratio))
+        if self.max_fps and fps > self.max_fps:
+            caps['fps'] = self.max_fps
+        return caps
+
+    def __bool__(self):
+        return bool(self.max_height or self.max_fps or self.max_bitrate)
+
+    def __str__(self):
+        bit_rate = format_bitrate(self.max_bitrate) if self.max_bitrate \
+            else '-'
+        return (f'max height {self.max_height or "-"}, '
+                f'max fps {self.max_fps or "-"}, max bitrate {bit_rate}')
+
+
+def parse_bitrate(value: str) -> int:
+    """Bits per second of an ffmpeg bitrate, ex: 2M, 1500k or 800000"""
+    value = str(value or '0').strip()
+    multiplier = {'k': 1000, 'm': 1000000}.get(value[-1:].lower(), 1)
+    if multiplier > 1:
+        value = value[:-1]
+    return int(float(value) * multiplier)
+
+
+def format_bitrate(bit_rate: int) -> str:
+    for suffix, multiplier in (('M', 1000000), ('k', 1000)):
+        if bit_rate % multiplier == 0:
+            return f'{bit_rate // multiplier}{suffix}'
+    return str(bit_rate)
+
+
+def output_policy(config: Config) -> OutputPolicy:
+    """Configured policy, None without caps"""
+    policy = OutputPolicy(config.output_max_height, config.output_max_fps,
+                          config.output_max_bitrate)
+    return policy if policy else None
+
+
+def _even(value: float) -> int:
+    return max(2, int(round(value / 2)) * 2)
@@ -1,4 +1,5 @@
 import datetime
+import hashlib
 import logging
 import os
 import tempfile
@@ -30,6 +31,7 @@ class S3Object:
         self._keep = keep_file
         self.exists = False
         self.forbidden = False
+        self.content_hash = ''
 
     def filename(self) -> str:
         if self.downloaded:
@@ -84,11 +86,15 @@ class S3Object:
         try:
             self.log.info('Downloading %s:%s',
                           self.config.bucket_name, self.key)
-            self.client.download_file(
-                Bucket=self.config.bucket_name,
-                Key=self.key,
-                Filename=self.file.name)
-            self.log.info('Downloaded file #%s', self.key)
+            content_hash = hashlib.sha256()
+            with open(self.file.name, 'wb') as file:
+                self.client.download_fileobj(
+                    Bucket=self.config.bucket_name,
+                    Key=self.key,
+                    Fileobj=HashingWriter(file, content_hash))
+            self.content_hash = content_hash.hexdigest()
+            self.log.info('Downloaded file #%s sha256:%s',
+                          self.key, self.content_hash)
             self.downloaded = True
             return True
         except Exception as e:
@@ -170,6 +176,22 @@ class S3Object:
             self.log.error('Error setting metadata for %s: %s', self.key, exc)
 
 
+class HashingWriter:
+    """Write only file object that hashes the content written through it.
+    Not seekable, so the downloader writes the parts in order"""
+
+    def __init__(self, file, content_hash):
+        self.file = file
+        self.content_hash = content_hash
+
+    def write(self, data: bytes) -> int:
+        self.content_hash.update(data)
+        return self.file.write(data)
+
+    def seekable(self) -> bool:
+        return False
+
+
 def parse_metadata(metadata: dict) -> dict:
     if not metadata or not isinstance(metadata, dict):
         return {}
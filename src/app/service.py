@@ -2,12 +2,15 @@ import logging
 from typing import Tuple
 
 from fastapi import UploadFile
+from src.analysis.analysis_executor import get_analysis_executor
 from src.app.jobs import JobName
 from src.app.s3_collection import S3Collection
 from src.app.s3_object import S3Object
 from src.app.schedule.schedule_worker import ScheduleWorker
 from src.config.config import Config
+from src.config.runtime import runtime_info
 from src.dto.app_status_response import AppStatusResponse
+from src.dto.health_response import HealthResponse
 from src.dto.media_notification_response import MediaNotificationResponse
 from src.dto.media_status_enum import MediaStatusEnum
 from src.dto.media_status_response import MediaStatusResponse
@@ -32,7 +35,8 @@ class MediaReceiverService:
         return MediaStatusResponse(media_id=media_id,
                                    status=MediaStatusEnum.Rejected)
 
-    def register_process_video(self, media_id: str, post_id: int) -> Tuple[bool, int, str]:
+    def register_process_video(self, media_id: str, post_id: int,
+                               profile: str = None) -> Tuple[bool, int, str]:
         try:
             with S3Object(self.config, media_id, keep_file=True) as s3_object:
                 if s3_object.forbidden:
@@ -48,7 +52,8 @@ class MediaReceiverService:
                                          media_id=media_id,
                                          post_id=post_id,
                                          metadata=s3_object.metadata or {},
-                                         filename=s3_object.filename())
+                                         filename=s3_object.filename(),
+                                         profile=profile)
             return True, 202, 'OK'
         except Exception as exc:
             self.log.error('Error registering video: %s', exc)
@@ -76,7 +81,24 @@ class MediaReceiverService:
         return AppStatusResponse(openapi_url=app.docs_url,
                                  status=status_count,
                                  latest_media=latest_media,
-                                 s3_url=self.config.endpoint_url)
+                                 s3_url=self.config.endpoint_url,
+                                 runtime=runtime_info(self.config))
+
+    def get_health(self) -> HealthResponse:
+        executor = get_analysis_executor(self.config)
+        if executor.ready.is_set():
+            health_status = 'ready'
+        elif executor.warm_up_error:
+            health_status = 'failed'
+        else:
+            health_status = 'warming_up'
+        return HealthResponse(
+            ready=executor.ready.is_set(),
+            status=health_status,
+            backend=self.config.analysis_backend,
+            warm_up_batch_sizes=self.config.analysis_warmup_batch_sizes,
+            warm_up_time=executor.warm_up_time,
+            message=str(executor.warm_up_error or '') or None)
 
     def get_media_info(self, post_id: int) -> MediaNotificationResponse:
         repo = get_repository(self.config)
@@ -2,6 +2,7 @@ import logging
 import os
 from pathlib import Path
 
+import src.app.api.health as health_api
 import src.app.api.media as media_api
 import src.app.api.stats as stats_api
 import src.app.api.storage as storage_api
@@ -9,6 +10,8 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from src import __appname__, __description__, __version__
+from src.analysis.analysis_executor import get_analysis_executor
+from src.app.optimizer_pool import get_optimizer_pool
 from src.app.service import MediaReceiverService, set_service
 from src.app.setup_scheduler import get_scheduler
 from src.config.config import get_config
@@ -48,6 +51,7 @@ if config.cors_origins:
 app.include_router(media_api.router)
 app.include_router(storage_api.router)
 app.include_router(stats_api.router)
+app.include_router(health_api.router)
 
 static_folder = os.path.abspath('./static')
 if os.path.isdir(static_folder):
@@ -58,12 +62,15 @@ if os.path.isdir(static_folder):
 @app.on_event("startup")
 async def startup():
     logging.info('Starting %s v%s', __appname__, __version__)
+    get_analysis_executor(config).start_warm_up()
     scheduler.start()
 
 
 @app.on_event("shutdown")
 async def shutdown():
     scheduler.stop()
+    get_analysis_executor(config).shutdown(wait=False)
+    get_optimizer_pool(config).shutdown(wait=False)
 
 
 # @app.get("/stats", response_model=AppStatusResponse)
@@ -4,32 +4,109 @@
 # ffmpeg -i input.mp4 -c:v libvpx-vp9 -b:v 0 -crf 30 -pass 2 -c:a libopus output.webm
 import asyncio
 import datetime
+import glob
 import logging
 import os
+import shutil
+import subprocess
 import tempfile
 from time import time
-from typing import Tuple
+from typing import Dict, List, Tuple
 
+import cv2
+import numpy as np
 from ffmpeg import FFmpeg
+from src.analysis.ffmpeg_decoder import ffmpeg_frames
+from src.app.encoding_profiles import PROFILES, TWO_PASS, EncodingProfile
+from src.app.output_policy import OutputPolicy
+from src.domain.media_probe import MediaProbe
+
+
+# the trial encode only pays off on videos this many times its length
+TRIAL_MIN_DURATION_FACTOR = 4
+# encode attempts of each chunk of a chunked encode
+CHUNK_ATTEMPTS = 2
+# frames teed to the analysis are scaled to the model input (IMAGE_DIM)
+SAMPLE_DIM = 224
+# stream copy modes: remux with the moov atom first, and the same with the
+# audio transcoded
+REMUX = 'remux'
+REMUX_AUDIO = 'remux-audio'
+MP4_EXTENSIONS = ('.mp4', '.mov', '.m4v')
 
 
 class VideoOptimizer:
 
-    def __init__(self, media_id: str, filename: str, keep_temp: bool = False):
+    def __init__(self, media_id: str, filename: str, keep_temp: bool = False,
+                 profile: EncodingProfile = None, trial_seconds: float = 0,
+                 trial_min_saving: float = 5.0, chunk_workers: int = 0,
+                 chunk_min_duration: float = 60.0,
+                 sample_positions: List[int] = None,
+                 sample_dim: int = SAMPLE_DIM, threads: int = 0,
+                 remux: str = None, policy: OutputPolicy = None,
+                 probe: MediaProbe = None, trial_max_bpp: float = 0):
+        """profile: encoding profile, two-pass when None
+        trial_seconds: length of the sample encoded from the middle of the
+        video to project the output size, 0 to always run the full encode
+        trial_min_saving: projected size reduction (%) needed to run the
+        full encode
+        chunk_workers: encode videos of at least chunk_min_duration seconds
+        as that many keyframe aligned chunks in parallel ffmpeg processes,
+        0 or 1 for a single encode
+        sample_positions: frames to keep in frames (uint8 RGB, sample_dim
+        square) for the analysis, teed from the decode of the first encode
+        pass
+        threads: encoder threads (shared by the chunks of a chunked encode),
+        0 for the ffmpeg default
+        remux: REMUX or REMUX_AUDIO to copy the video stream into an mp4
+        with the moov atom first (webm for webm sources) instead of
+        encoding it
+        policy: caps of the output resolution, frame rate and bitrate (not
+        applied to remuxes)
+        probe, trial_max_bpp: skip the trial when the probed bits per pixel
+        of the source reach trial_max_bpp (a clear win), 0 to always run it"""
         if not os.path.isfile(filename):
             raise FileNotFoundError(filename)
         self.media_id = media_id
         self.filename = filename
+        self.profile = profile or PROFILES[TWO_PASS]
+        self.trial_seconds = trial_seconds
+        self.trial_min_saving = trial_min_saving
+        self.probe = probe
+        self.trial_max_bpp = trial_max_bpp
+        self.chunk_workers = chunk_workers
+        self.chunk_min_duration = chunk_min_duration
+        self.sample_positions = sample_positions
+        self.sample_dim = sample_dim
+        self.threads = threads
+        self.remux = remux
+        self.policy = policy if policy and not remux else None
+        # caps of the policy that change this encode, ex: height=1080,fps=30
+        self.applied_policy = ''
+        if self.policy:
+            self._source = video_properties(filename)
+            self.applied_policy = self.policy.applied(
+                *self._source, self.profile.video_options)
         self.log = logging.getLogger(self.__class__.__name__)
 
         self.output = tempfile.NamedTemporaryFile(
-            suffix='.output.webm',
+            suffix='.output' + self._output_extension(),
             prefix=os.path.basename(filename),
             delete=not keep_temp)
+        # Own directory for the two-pass stats, so that concurrent encodes
+        # do not share ffmpeg2pass-0.log in the working directory
+        self.workdir = tempfile.mkdtemp(prefix='wmr-optimizer-')
+        self.passlogfile = os.path.join(self.workdir, 'ffmpeg2pass')
 
         self.new_file = ''
         self.message = ''
+        # outcome of a finished run: True with a new_file, False when the
+        # output (or the trial projection) was not smaller, None on failure
+        self.optimized: bool = None
         self.elapsed_time = datetime.timedelta(seconds=0)
+        # projected size reduction (%) of the trial encode, None without it
+        self.trial_saving: float = None
+        self.frames: np.ndarray = None
 
     def __enter__(self):
         return self
@@ -38,10 +115,22 @@ class VideoOptimizer:
         if exc_val:
             self.log.error('Exit with error: %s', exc_val)
         self.output.close()
+        shutil.rmtree(self.workdir, ignore_errors=True)
 
     def __str__(self):
         return f'{self.media_id} ({self.filename})'
 
+    @property
+    def video_options(self) -> Dict[str, str]:
+        """Video output options of the profile, capped by the policy, with
+        the thread count"""
+        options = self.profile.video_options
+        if self.policy:
+            options = self.policy.video_options(*self._source, options)
+        if not self.threads:
+            return options
+        return {**options, 'threads': str(self.threads)}
+
     def new_media_id(self) -> str:
         if not self.new_file:
             return self.media_id
@@ -51,51 +140,299 @@ class VideoOptimizer:
 
         if current_ext == new_ext:
             # same extension, optimized
-            return os.path.join(current_root+'.optimized', new_ext)
+            return current_root + '.optimized' + new_ext
 
         return current_root + current_ext + new_ext
 
+    def _output_extension(self) -> str:
+        if not self.remux:
+            return '.webm'
+        _, ext = os.path.splitext(self.media_id)
+        return '.mp4' if ext.lower() in MP4_EXTENSIONS else '.webm'
+
     def run(self):
         try:
             start_time = time()
-
-            async def run():
-                await self._create_ffmpeg(1).execute()
-                await self._create_ffmpeg(2).execute()
-            asyncio.run(run())
-            self.elapsed_time = datetime.timedelta(
-                seconds=time()-start_time)
-
             source_len = os.path.getsize(self.filename)
-            output_len = os.path.getsize(self.output.name)
-            if output_len < source_len:
-                self.new_file = self.output.name
-                self.message = f'Video optimized: {self.media_id} ({source_len} -> {output_len} {(output_len-source_len)/source_len*100:1f}%)'
+            if self.applied_policy:
+                self.log.info('Output policy of %s: %s',
+                              self.media_id, self.applied_policy)
+            if self.remux:
+                self._remux_output(source_len)
             else:
-                self.message = f'Video not optimized: {self.media_id} ({source_len} -> {output_len} {(output_len-source_len)/source_len*100:1f}%)'
+                self._encode_output(source_len)
+            self.elapsed_time = datetime.timedelta(
+                seconds=time()-start_time)
 
         except Exception as e:
             self.message = f'Failed to optimize video: {self.media_id} ({self.filename}): {e}'
+        finally:
+            if self.sample_positions and self.frames is None:
+                try:
+                    self.sample()
+                except Exception as e:
+                    # frames stays None: the analysis decodes the file
+                    self.log.error('Failed to sample %s: %s',
+                                   self.media_id, e)
+
+    def _remux_output(self, source_len: int):
+        """Stream copy of the source, kept whatever its size"""
+        self._remux()
+        output_len = os.path.getsize(self.output.name)
+        self.new_file = self.output.name
+        self.optimized = True
+        self.message = (
+            f'Video remuxed: {self.media_id} [{self.remux}] '
+            f'({source_len} -> {output_len} '
+            f'{(output_len-source_len)/source_len*100:1f}%)')
+
+    def _encode_output(self, source_len: int):
+        """Encode with the profile, unless the trial projects too small a
+        saving, kept only when smaller than the source"""
+        duration = video_duration(self.filename)
+        self.trial_saving = self._trial_saving(source_len, duration)
+        if (self.trial_saving is not None and
+                self.trial_saving < self.trial_min_saving):
+            self.optimized = False
+            self.message = (
+                f'Video not optimized: {self.media_id} '
+                f'[{self.profile.name}] (trial projected '
+                f'{self.trial_saving:.1f}% saving < '
+                f'{self.trial_min_saving}%)')
+            return
+
+        async def run():
+            if self.profile.passes == 2:
+                await self._encode(1)
+                await self._encode(2)
+            else:
+                await self._encode(0)
+        if (self.chunk_workers > 1 and
+                duration >= self.chunk_min_duration):
+            asyncio.run(self._chunked_encode(duration))
+        elif self.sample_positions:
+            self._tee_encode()
+            if self.profile.passes == 2:
+                asyncio.run(self._encode(2))
+        else:
+            asyncio.run(run())
+
+        output_len = os.path.getsize(self.output.name)
+        self.optimized = output_len < source_len
+        if self.optimized:
+            self.new_file = self.output.name
+        self.message = (
+            f'Video {"optimized" if self.optimized else "not optimized"}: '
+            f'{self.media_id} [{self.profile.name}] ({source_len} -> '
+            f'{output_len} {(output_len-source_len)/source_len*100:1f}%)')
+
+    def sample(self) -> np.ndarray:
+        """Decode only the sample_positions frames, when there was no
+        encode to tee them from"""
+        self.frames = ffmpeg_frames(self.filename, self.sample_positions,
+                                    self.sample_dim, self.sample_dim)
+        return self.frames
+
+    def _remux(self):
+        """Stream copy of the video (and of the audio, unless REMUX_AUDIO)
+        into the output, with the moov atom first on mp4"""
+        options = {'map': ['0:v:0', '0:a:0?'], 'c': 'copy'}
+        if self._output_extension() == '.mp4':
+            options['movflags'] = '+faststart'
+            if self.remux == REMUX_AUDIO:
+                options.update({'c:a': 'aac', 'b:a': '128k'})
+        elif self.remux == REMUX_AUDIO:
+            options.update({'c:a': 'libopus'})
+        ff = FFmpeg().option('y').input(self.filename).output(
+            self.output.name, options)
+        if not asyncio.run(_execute(ff, self.log, self.remux, self.media_id)):
+            raise RuntimeError(f'ffmpeg {self.remux} failed')
+
+    def _tee_encode(self):
+        """First encode pass (or the single pass) and the frame sampler on
+        a single decode: the decoded video is split between the encoder and
+        a select + scale branch piped to frames"""
+        dim = self.sample_dim
+        select = '+'.join(f'eq(n,{position})'
+                          for position in sorted(set(self.sample_positions)))
+        video_options = dict(self.video_options)
+        split = '[0:v]split=2[encode][sample]'
+        if 'vf' in video_options:
+            # the policy filters go in the graph, on the encode branch
+            split = (f'[0:v]split=2[source][sample];'
+                     f'[source]{video_options.pop("vf")}[encode]')
+        command = ['ffmpeg', '-v', 'error', '-nostdin', '-y',
+                   '-i', self.filename, '-filter_complex',
+                   f"{split};[sample]select='{select}',"
+                   f'scale={dim}:{dim}:flags=neighbor[frames]',
+                   '-map', '[encode]']
+        if self.profile.passes == 2:
+            command += _arguments({**video_options, 'pass': '1',
+                                   'passlogfile': self.passlogfile,
+                                   'an': None, 'f': 'null'}) + ['/dev/null']
+        else:
+            command += ['-map', '0:a?'] + _arguments({
+                **video_options,
+                **self.profile.audio_options}) + [self.output.name]
+        # -vsync (global) rather than -fps_mode, which needs ffmpeg 5.1
+        command += ['-map', '[frames]', '-vsync', 'passthrough',
+                    '-f', 'rawvideo', '-pix_fmt', 'rgb24', 'pipe:1']
+        self.log.info('Started tee %s (%s) %s',
+                      self.profile.name, self.media_id, command)
+        result = subprocess.run(command, capture_output=True)
+        if result.returncode:
+            raise RuntimeError(
+                f'ffmpeg tee failed: '
+                f'{result.stderr.decode(errors="replace").strip()}')
+        frame_size = dim * dim * 3
+        count = len(result.stdout) // frame_size
+        self.frames = np.frombuffer(
+            result.stdout, dtype=np.uint8,
+            count=count * frame_size).reshape((count, dim, dim, 3))
+
+    def _trial_saving(self, source_len: int, duration: float) -> float:
+        """Projected size reduction (%) from a single pass encode of
+        trial_seconds from the middle of the video, None when the video is
+        too short for the trial to pay off, the probe already rates the
+        encode a clear win, or the trial failed"""
+        if (not self.trial_seconds or
+                duration < self.trial_seconds * TRIAL_MIN_DURATION_FACTOR):
+            return None
+        if (self.trial_max_bpp and self.probe and
+                self.probe.bits_per_pixel >= self.trial_max_bpp):
+            self.log.info('Trial skipped %s: %.3f bpp >= %.3f',
+                          self.media_id, self.probe.bits_per_pixel,
+                          self.trial_max_bpp)
+            return None
+        trial_file = os.path.join(self.workdir, 'trial.webm')
+        start = (duration - self.trial_seconds) / 2
+        ff = FFmpeg().option('y').input(self.filename, {
+            'ss': f'{start:.3f}', 't': f'{self.trial_seconds:.3f}'})\
+            .output(trial_file, {
+                **self.video_options,
+                **self.profile.audio_options})
+        if (not asyncio.run(_execute(ff, self.log, 'trial', self.media_id))
+                or not os.path.isfile(trial_file)):
+            self.log.warning('Trial encode %s failed, running the full '
+                             'encode', self.media_id)
+            return None
+
+        projected_len = os.path.getsize(trial_file) * \
+            duration / self.trial_seconds
+        os.remove(trial_file)
+        saving = (1 - projected_len / source_len) * 100
+        self.log.info('Trial encode %s: %.0f bytes projected, %.1f%% saving',
+                      self.media_id, projected_len, saving)
+        return saving
+
+    async def _chunked_encode(self, duration: float):
+        """Split the video stream at keyframes (stream copy), encode the
+        chunks in up to chunk_workers parallel ffmpeg processes sharing the
+        CPUs of this thread, and the audio alongside, then concatenate them
+        into the output without re-encoding"""
+        split = FFmpeg().option('y').input(self.filename).output(
+            os.path.join(self.workdir, 'source%03d.mkv'), {
+                'map': '0:v:0',
+                'c': 'copy',
+                'f': 'segment',
+                'segment_time': f'{duration / self.chunk_workers:.3f}',
+                'reset_timestamps': '1'})
+        if not await _execute(split, self.log, 'split', self.media_id):
+            raise RuntimeError('Failed to split the video in chunks')
+        sources = sorted(glob.glob(os.path.join(self.workdir, 'source*.mkv')))
+
+        cpus = self.threads or (len(os.sched_getaffinity(0))
+                                if hasattr(os, 'sched_getaffinity')
+                                else os.cpu_count() or 1)
+        threads = str(max(1, cpus // min(self.chunk_workers, len(sources))))
+        semaphore = asyncio.Semaphore(self.chunk_workers)
+
+        async def encode(index: int, source: str) -> str:
+            output = os.path.join(self.workdir, f'chunk{index:03d}.webm')
+            passlogfile = os.path.join(self.workdir, f'chunk{index:03d}')
+            async with semaphore:
+                for attempt in range(1, CHUNK_ATTEMPTS + 1):
+                    if await self._encode_chunk(source, output, passlogfile,
+                                                threads, index):
+                        return output
+                    self.log.warning('Chunk %s of %s failed (attempt %s)',
+                                     index, self.media_id, attempt)
+            raise RuntimeError(f'Failed to encode chunk {index}')
+
+        audio = os.path.join(self.workdir, 'audio.webm')
+        encode_audio = FFmpeg().option('y').input(self.filename).output(
+            audio, {'map': '0:a:0', 'vn': None,
+                    **self.profile.audio_options})
+        *chunks, has_audio = await asyncio.gather(
+            *(encode(index, source) for index, source in enumerate(sources)),
+            _execute(encode_audio, self.log, 'audio', self.media_id))
+
+        concat_list = os.path.join(self.workdir, 'chunks.txt')
+        with open(concat_list, 'w') as file:
+            file.writelines(f"file '{chunk}'\n" for chunk in chunks)
+        concat = FFmpeg().option('y').input(
+            concat_list, {'f': 'concat', 'safe': '0'})
+        streams = ['0:v']
+        if has_audio:
+            concat = concat.input(audio)
+            streams.append('1:a')
+        concat = concat.output(self.output.name, {'map': streams, 'c': 'copy'})
+        if not await _execute(concat, self.log, 'concat', self.media_id):
+            raise RuntimeError('Failed to concatenate the chunks')
+        self.log.info('Chunked encode %s: %s chunks, %s threads each',
+                      self.media_id, len(chunks), threads)
+
+    async def _encode_chunk(self, source: str, output: str, passlogfile: str,
+                            threads: str, index: int) -> bool:
+        desc = f'chunk {index}'
+        if self.profile.passes == 2:
+            first_pass = FFmpeg().option('y').input(source).output(
+                '/dev/null', {**self.video_options, 'threads': threads,
+                              'pass': '1', 'passlogfile': passlogfile,
+                              'f': 'null'})
+            if not await _execute(first_pass, self.log, desc, self.media_id):
+                return False
+            options = {'pass': '2', 'passlogfile': passlogfile}
+        else:
+            options = {}
+        encode = FFmpeg().option('y').input(source).output(
+            output, {**self.video_options, 'threads': threads,
+                     **options})
+        return await _execute(encode, self.log, desc, self.media_id)
+
+    async def _encode(self, pass_no: int):
+        """Run the pass, raising when ffmpeg fails (it leaves an empty or
+        truncated output that must not pass for an optimized video)"""
+        errors = []
+        ff = self._create_ffmpeg(pass_no)
+        ff.on('error', errors.append)
+        await ff.execute()
+        if errors:
+            raise RuntimeError(f'ffmpeg pass {pass_no} failed: {errors[0]}')
 
     def _create_ffmpeg(self, pass_no: int) -> FFmpeg:
+        """pass_no: 1 and 2 for the two-pass encode, 0 for a single pass"""
         ff = FFmpeg().option('y').input(self.filename)
         if pass_no == 1:
             desc = 'Pass#1'
             ff = ff.option('an')\
                 .output('/dev/null', {
-                    'c:v': 'libvpx-vp9',
-                    'b:v': '0',
-                    'crf': '30',
+                    **self.video_options,
                     'pass': '1',
+                    'passlogfile': self.passlogfile,
                     'f': 'null'})
-        else:
+        elif pass_no == 2:
             desc = 'Pass#2'
             ff = ff.output(self.output.name, {
-                '-c:v': 'libvpx-vp9',
-                '-b:v': '0',
-                '-crf': '30',
-                '-pass': '2',
-                '-c:a': 'libopus'})
+                **self.video_options,
+                'pass': '2',
+                'passlogfile': self.passlogfile,
+                **self.profile.audio_options})
+        else:
+            desc = self.profile.name
+            ff = ff.output(self.output.name, {
+                **self.video_options,
+                **self.profile.audio_options})
 
         ff.on('start', lambda args: self.log.info(
             'Started %s (%s) %s', desc, self.media_id, args))
@@ -108,6 +445,48 @@ class VideoOptimizer:
         return ff
 
 
+def video_properties(filename: str) -> Tuple[int, int, float]:
+    """Width, height and frame rate of the video (0 if unknown)"""
+    vidcap = cv2.VideoCapture(filename)
+    try:
+        return (int(vidcap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+                int(vidcap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+                max(vidcap.get(cv2.CAP_PROP_FPS), 0.0))
+    finally:
+        vidcap.release()
+
+
+def video_duration(filename: str) -> float:
+    """Duration (seconds) from the frame count and rate, 0 if unknown"""
+    vidcap = cv2.VideoCapture(filename)
+    try:
+        frames = vidcap.get(cv2.CAP_PROP_FRAME_COUNT)
+        fps = vidcap.get(cv2.CAP_PROP_FPS)
+    finally:
+        vidcap.release()
+    return frames / fps if frames > 0 and fps > 0 else 0.0
+
+
+def _arguments(options: Dict[str, str]) -> List[str]:
+    """ffmpeg command line arguments of output options (None for flags)"""
+    arguments = []
+    for key, value in options.items():
+        arguments.append('-' + key.lstrip('-'))
+        if value is not None:
+            arguments.append(str(value))
+    return arguments
+
+
+async def _execute(ff: FFmpeg, log: logging.Logger, desc: str,
+                   media_id: str) -> bool:
+    """Run ff, False when ffmpeg exits with an error"""
+    errors = []
+    _logging(ff, log, desc, media_id)
+    ff.on('error', errors.append)
+    await ff.execute()
+    return not errors
+
+
 def _logging(ff: FFmpeg, log: logging.Logger, desc: str, media_id: str):
     ff.on('start', lambda args: log.info(
         'Started %s (%s) %s', desc, media_id, args))
@@ -118,7 +497,8 @@ def _logging(ff: FFmpeg, log: logging.Logger, desc: str, media_id: str):
     ff.on('terminated', lambda: log.info('Terminated %s', desc))
 
 
-def _first_pass(filename: str, media_id: str, log: logging.Logger) -> FFmpeg:
+def _first_pass(filename: str, media_id: str, passlogfile: str,
+                log: logging.Logger) -> FFmpeg:
     ff = FFmpeg().option('y')\
         .input(filename)\
         .option('an')\
@@ -127,12 +507,14 @@ def _first_pass(filename: str, media_id: str, log: logging.Logger) -> FFmpeg:
             'b:v': '0',
             'crf': '30',
             'pass': '1',
+            'passlogfile': passlogfile,
             'f': 'null'})
     _logging(ff, log, 'first pass', media_id)
     return ff
 
 
-def _second_pass(filename: str, media_id: str, output: str, log: logging.Logger) -> FFmpeg:
+def _second_pass(filename: str, media_id: str, output: str,
+                 passlogfile: str, log: logging.Logger) -> FFmpeg:
     ff = FFmpeg().option('y')\
         .input(filename)\
         .output(output, {
@@ -140,6 +522,7 @@ def _second_pass(filename: str, media_id: str, output: str, log: logging.Logger)
             '-b:v': '0',
             '-crf': '30',
             '-pass': '2',
+            '-passlogfile': passlogfile,
             '-c:a': 'libopus'})
     _logging(ff, log, 'second pass', media_id)
     return ff
@@ -158,14 +541,16 @@ def optimize_video(filename: str, media_id: str, output_file=None) -> Tuple[str,
             output_file = root + '.webm'
     log = logging.getLogger(__name__)
 
-    fp = _first_pass(filename, media_id, log)
-    sp = _second_pass(filename, media_id, output_file, log)
+    with tempfile.TemporaryDirectory(prefix='wmr-optimizer-') as workdir:
+        passlogfile = os.path.join(workdir, 'ffmpeg2pass')
+        fp = _first_pass(filename, media_id, passlogfile, log)
+        sp = _second_pass(filename, media_id, output_file, passlogfile, log)
 
-    async def run():
-        await fp.execute()
-        await sp.execute()
+        async def run():
+            await fp.execute()
+            await sp.execute()
 
-    asyncio.run(run())
+        asyncio.run(run())
     return output_file, os.path.isfile(output_file)
 
 
@@ -0,0 +1,162 @@
+"""Pre-encode probe: stream properties from ffprobe and the prediction of
+whether re-encoding the video is worth the CPU"""
+import json
+import logging
+import os
+import struct
+import subprocess
+from typing import Dict
+
+from src.app.video_optimizer import MP4_EXTENSIONS, REMUX, REMUX_AUDIO
+from src.config.config import Config
+from src.domain.media_probe import MediaProbe
+
+# codecs that play without transcoding in each output container
+MP4_VIDEO_CODECS = ('h264', 'hevc', 'av1', 'vp9')
+MP4_AUDIO_CODECS = ('', 'aac', 'mp3')
+WEBM_AUDIO_CODECS = ('', 'opus', 'vorbis')
+
+
+def probe_video(media_id: str, filename: str,
+                timeout: int = 60) -> MediaProbe:
+    """Codec, resolution, frame rate, duration and video bitrate of the
+    first video stream (container headers only, nothing is decoded), None
+    when ffprobe fails"""
+    try:
+        result = subprocess.run(
+            ['ffprobe', '-v', 'error', '-of', 'json',
+             '-show_entries',
+             'format=duration,bit_rate:stream=codec_type,codec_name,width,'
+             'height,avg_frame_rate,duration,bit_rate',
+             filename],
+            capture_output=True, text=True, timeout=timeout, check=True)
+        return parse_ffprobe(media_id, json.loads(result.stdout),
+                             os.path.getsize(filename))
+    except (OSError, ValueError, subprocess.SubprocessError) as exc:
+        logging.getLogger(__name__).warning(
+            'Failed to probe %s: %s', filename, exc)
+        return None
+
+
+def parse_ffprobe(media_id: str, data: dict, size: int) -> MediaProbe:
+    """MediaProbe from the ffprobe json output (format and streams)"""
+    streams = data.get('streams', [])
+    video = next((stream for stream in streams
+                  if stream.get('codec_type') == 'video'), None)
+    if not video:
+        raise ValueError('No video stream')
+    audio = next((stream for stream in streams
+                  if stream.get('codec_type') == 'audio'), {})
+    media_format = data.get('format', {})
+    duration = _number(video.get('duration')) or \
+        _number(media_format.get('duration'))
+    bit_rate = int(_number(video.get('bit_rate')))
+    if not bit_rate:
+        # containers like webm and mkv only have the overall bitrate
+        total = _number(media_format.get('bit_rate')) or \
+            (size * 8 / duration if duration else 0)
+        audio_rate = sum(_number(stream.get('bit_rate'))
+                         for stream in streams
+                         if stream.get('codec_type') == 'audio')
+        bit_rate = int(max(total - audio_rate, 0))
+    return MediaProbe(media_id=media_id,
+                      codec=video.get('codec_name', ''),
+                      audio_codec=audio.get('codec_name', ''),
+                      width=int(video.get('width', 0)),
+                      height=int(video.get('height', 0)),
+                      fps=_rate(video.get('avg_frame_rate')),
+                      duration=duration,
+                      bit_rate=bit_rate)
+
+
+def encode_threshold(codec: str, min_bpp: float,
+                     codec_min_bpp: Dict[str, float]) -> float:
+    """Bits per pixel below which a source of the codec is not encoded"""
+    return codec_min_bpp.get(codec, min_bpp)
+
+
+def encode_decision(probe: MediaProbe, min_bpp: float,
+                    codec_min_bpp: Dict[str, float]) -> MediaProbe:
+    """Set probe.encode and probe.reason: skip the encode when the source
+    already uses fewer bits per pixel than its codec threshold (or
+    min_bpp), so the VP9 output is not expected to be smaller"""
+    threshold = encode_threshold(probe.codec, min_bpp, codec_min_bpp)
+    if not probe.bits_per_pixel:
+        probe.encode, probe.reason = True, 'unknown bitrate'
+    elif probe.bits_per_pixel < threshold:
+        probe.encode = False
+        probe.reason = (f'{probe.codec} at {probe.bits_per_pixel:.3f} bpp '
+                        f'< {threshold}')
+    else:
+        probe.encode = True
+        probe.reason = (f'{probe.codec} at {probe.bits_per_pixel:.3f} bpp '
+                        f'>= {threshold}')
+    return probe
+
+
+def remux_mode(probe: MediaProbe, filename: str, media_id: str) -> str:
+    """Container fix of a source that is not worth re-encoding: REMUX_AUDIO
+    when its audio codec does not play in the container, REMUX for an mp4
+    with the moov atom after the media data (no playback before the whole
+    file is downloaded), None when it needs nothing"""
+    ext = os.path.splitext(media_id)[1].lower()
+    if ext in MP4_EXTENSIONS:
+        if probe.codec not in MP4_VIDEO_CODECS:
+            return None
+        if probe.audio_codec not in MP4_AUDIO_CODECS:
+            return REMUX_AUDIO
+        return None if mp4_faststart(filename) else REMUX
+    if ext == '.webm' and probe.audio_codec not in WEBM_AUDIO_CODECS:
+        return REMUX_AUDIO
+    return None
+
+
+def mp4_faststart(filename: str) -> bool:
+    """True when the moov atom comes before the mdat atom, from the top
+    level box headers"""
+    try:
+        with open(filename, 'rb') as file:
+            while True:
+                header = file.read(8)
+                if len(header) < 8:
+                    return True
+                size, box = struct.unpack('>I4s', header)
+                if box == b'moov':
+                    return True
+                if box == b'mdat':
+                    return False
+                if size == 1:
+                    size = struct.unpack('>Q', file.read(8))[0] - 8
+                elif size == 0:
+                    return True
+                file.seek(size - 8, os.SEEK_CUR)
+    except (OSError, struct.error):
+        return True
+
+
+def probe_source(media_id: str, filename: str, config: Config,
+                 repository) -> MediaProbe:
+    """Probe and encode decision of the source, recorded in the
+    repository. None when disabled or the probe failed"""
+    if not config.probe_enabled:
+        return None
+    probe = probe_video(media_id, filename)
+    if probe:
+        encode_decision(probe, config.probe_min_bpp,
+                        config.probe_min_bpp_codecs)
+        repository.set_probe(probe)
+    return probe
+
+
+def _number(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _rate(value: str) -> float:
+    """Frame rate of an ffprobe rational, like 30000/1001"""
+    numerator, _, denominator = (value or '').partition('/')
+    denominator = _number(denominator or 1)
+    return _number(numerator) / denominator if denominator else 0.0
@@ -8,9 +8,8 @@ from typing import List
 
 import cv2
 import numpy as np
-import tensorflow as tf
-import tensorflow_hub as hub
 from src.abstractions.repository import RepositoryAbstraction
+from src.analysis.engine import get_analysis_engine
 from src.abstractions.stats_service import StatsServiceAbstraction
 from src.abstractions.video_processor import VideoProcessorAbstraction
 from src.api.models.get_video_response import GetVideoResponse
@@ -22,15 +21,12 @@ IMAGE_DIM = 224   # required/default image dimensionality
 
 class VideoProcessor(VideoProcessorAbstraction):
     """Video Processor Class"""
-    MODELS = {}
 
     def __init__(self,
                  stats_service: StatsServiceAbstraction,
                  repository: RepositoryAbstraction):
         self._stats = stats_service
         self._repository = repository
-        model_path = os.path.join(os.path.dirname(__file__), 'nsfw_model.h5')
-        self._model = self._load_model(model_path)
         self._log = logging.getLogger(self.__class__.__name__)
 
     def process(self, video_id: str):
@@ -105,21 +101,6 @@ class VideoProcessor(VideoProcessorAbstraction):
         image_preds = self._classify(files, IMAGE_DIM)
         return image_preds
 
-    def _load_model(self, model_path: str):
-        model = self.MODELS.get(model_path)
-        if model:
-            return model
-        if model_path is None or not os.path.isfile(model_path):
-            raise ValueError(
-                "saved_model_path must be the valid directory of a saved model to load.")
-
-        model = tf.keras.models.load_model(
-            model_path,
-            custom_objects={'KerasLayer': hub.KerasLayer},
-            compile=False)
-        self.MODELS[model_path] = model
-        return model
-
     def _classify(self, input_paths, image_dim=IMAGE_DIM):
         """ Classify given a model, input paths (could be single string),
         and image dimensionality...."""
@@ -162,7 +143,7 @@ class VideoProcessor(VideoProcessorAbstraction):
     def _classify_nd(self, nd_images):
         """ Classify given a model, image array (numpy)...."""
 
-        model_preds = self._model.predict(nd_images)
+        model_preds = get_analysis_engine().predict(nd_images)
 
         categories = ['drawings', 'hentai', 'neutral', 'porn', 'sexy']
 
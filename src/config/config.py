@@ -1,8 +1,13 @@
 import logging
 import os
 
+from src.analysis.prediction_aggregator import STATISTICS
 from src.config.dotenv import load_dotenv
 
+# Names of src.app.encoding_profiles.PROFILES: importing src.app here would
+# load the whole application
+ENCODING_PROFILES = ('two-pass', 'single-pass', 'quick')
+
 
 class Config:
 
@@ -45,9 +50,153 @@ class Config:
         self.local_db = self._getenv(
             'LOCAL_DB', './wee-media-receiver.db')
 
+        # Content hash keyed analysis and optimization cache
+        self.cache_enabled = self._getbool('CACHE_ENABLED', True)
+        self.cache_max_entries = int(
+            self._getenv('CACHE_MAX_ENTRIES', '10000'))
+        self.cache_max_age_days = int(
+            self._getenv('CACHE_MAX_AGE_DAYS', '90'))
+
         # HTTP Server
         self.http_port = int(self._getenv('HTTP_PORT', '8000'))
 
+        # Analysis frame sampling: seek, grab, keyframe, time or scene
+        self.sampling_mode = self._getenv('ANALYSIS_SAMPLING_MODE', 'seek')
+        # Per container overrides, ex: mp4:keyframe,webm:grab
+        self.sampling_modes = dict(
+            item.strip().lower().split(':', 1)
+            for item in self._getenv('ANALYSIS_SAMPLING_MODES', '').split(',')
+            if ':' in item)
+
+        # Analysis frame decoder: opencv, or ffmpeg to get frames already
+        # scaled down to the model input by an ffmpeg pipe
+        self.analysis_decoder = self._getenv('ANALYSIS_DECODER', 'opencv')
+        # Parallel captures over ranges of long videos (opencv decoder)
+        self.analysis_segments = int(self._getenv('ANALYSIS_SEGMENTS', '1'))
+
+        # Frames sampled per video (budget) and adaptive early exit
+        self.analysis_frames = int(self._getenv('ANALYSIS_FRAMES', '20'))
+        self.analysis_adaptive = self._getbool('ANALYSIS_ADAPTIVE', False)
+        self.analysis_first_wave = int(
+            self._getenv('ANALYSIS_FIRST_WAVE', '6'))
+        self.analysis_wave_size = int(self._getenv('ANALYSIS_WAVE_SIZE', '6'))
+        self.analysis_neutral_exit = float(
+            self._getenv('ANALYSIS_NEUTRAL_EXIT', '90'))
+        self.analysis_explicit_exit = float(
+            self._getenv('ANALYSIS_EXPLICIT_EXIT', '90'))
+
+        # Frame predictions aggregation: mean, max, top_k_mean or
+        # over_threshold
+        self.analysis_aggregate = self._getchoice(
+            'ANALYSIS_AGGREGATE', 'mean', STATISTICS)
+        self.analysis_top_k = int(self._getenv('ANALYSIS_TOP_K', '3'))
+        self.analysis_threshold = float(
+            self._getenv('ANALYSIS_THRESHOLD', '0.5'))
+
+        # Poster frame and preview sprite (jpg or webp) from the analysed
+        # frames, uploaded next to the optimized video
+        self.analysis_preview = self._getbool('ANALYSIS_PREVIEW', False)
+        self.preview_format = self._getenv('PREVIEW_FORMAT', 'jpg')
+        self.preview_tile_width = int(
+            self._getenv('PREVIEW_TILE_WIDTH', '160'))
+        self.preview_columns = int(self._getenv('PREVIEW_COLUMNS', '5'))
+
+        # Inference backend: keras, tflite-float16 or tflite-int8, and the
+        # TFLite interpreter threads (0 for the default)
+        self.analysis_backend = self._getenv('ANALYSIS_BACKEND', 'keras')
+        self.tflite_threads = int(self._getenv('TFLITE_THREADS', '0'))
+        # Fixed batch sizes of the compiled Keras inference function (batches
+        # are padded to the next one), empty to use model.predict
+        self.analysis_batch_buckets = sorted(
+            int(size)
+            for size in self._getenv('ANALYSIS_BATCH_BUCKETS', '8,16,32').split(',')
+            if size.strip())
+
+        # Shared micro-batching inference service: the ANALYSIS_WORKERS are
+        # then threads sharing the model, whose frames batch together
+        self.inference_batching = self._getbool('INFERENCE_BATCHING', False)
+        self.inference_max_batch_size = int(
+            self._getenv('INFERENCE_MAX_BATCH_SIZE', '64'))
+        self.inference_max_wait_ms = int(
+            self._getenv('INFERENCE_MAX_WAIT_MS', '50'))
+
+        # Analyse and optimize on a single decode: the first encode pass
+        # tees the sampled frames to the analysis (evenly spaced frames)
+        self.tee_pipeline = self._getbool('TEE_PIPELINE', False)
+
+        # Analysis worker processes, 0 to analyse on the scheduler thread
+        self.analysis_workers = int(self._getenv('ANALYSIS_WORKERS', '0'))
+        # Simultaneous encodes, 0 to encode on the scheduler thread
+        self.optimizer_workers = int(self._getenv('OPTIMIZER_WORKERS', '1'))
+        # Encoding profile: two-pass, single-pass or quick, and the profile
+        # used while ENCODING_BACKLOG_SIZE or more encodes are pending (0
+        # disables it)
+        self.encoding_profile = self._getchoice(
+            'ENCODING_PROFILE', 'two-pass', ENCODING_PROFILES)
+        self.encoding_backlog_profile = self._getchoice(
+            'ENCODING_BACKLOG_PROFILE', 'quick', ENCODING_PROFILES)
+        self.encoding_backlog_size = int(
+            self._getenv('ENCODING_BACKLOG_SIZE', '0'))
+        # Trial encode of a sample from the middle of the video (0 disables
+        # it), skipping the full encode when the projected size reduction
+        # (%) is below TRIAL_MIN_SAVING
+        self.trial_encode_seconds = float(
+            self._getenv('TRIAL_ENCODE_SECONDS', '4'))
+        self.trial_min_saving = float(self._getenv('TRIAL_MIN_SAVING', '5'))
+        # Only on the uncertain cases: sources probed below the bits per pixel
+        # threshold of their codec plus this margin (1 is twice the
+        # threshold, 0 for every source)
+        self.trial_bpp_margin = float(self._getenv('TRIAL_BPP_MARGIN', '1'))
+        # Chunked encode of videos of at least ENCODE_CHUNK_MIN_DURATION
+        # seconds: keyframe aligned chunks in ENCODE_CHUNK_WORKERS parallel
+        # ffmpeg processes (0 disables it)
+        self.encode_chunk_workers = int(
+            self._getenv('ENCODE_CHUNK_WORKERS', '0'))
+        self.encode_chunk_min_duration = float(
+            self._getenv('ENCODE_CHUNK_MIN_DURATION', '60'))
+        # Output caps (0 or empty for none): shorter side (the height of
+        # landscape videos), frame rate and video bitrate ceiling (ex: 2M)
+        self.output_max_height = int(self._getenv('OUTPUT_MAX_HEIGHT', '0'))
+        self.output_max_fps = float(self._getenv('OUTPUT_MAX_FPS', '0'))
+        self.output_max_bitrate = self._getenv('OUTPUT_MAX_BITRATE', '')
+        # Encode admission control: encodes get a thread count and start
+        # while their CPU and memory estimates fit in the budget, by default
+        # the cgroup CPU quota (or ENCODE_CPUS) and 3/4 of its memory limit
+        self.encode_scheduler = self._getbool('ENCODE_SCHEDULER', True)
+        self.encode_cpu_budget = float(
+            self._getenv('ENCODE_CPU_BUDGET', '0'))
+        self.encode_memory_budget_mb = int(
+            self._getenv('ENCODE_MEMORY_BUDGET_MB', '0'))
+        # ffprobe before encoding: skip sources already below the bits per
+        # pixel threshold of their codec, ex: vp9:0.1,h264:0.05
+        self.probe_enabled = self._getbool('PROBE_ENABLED', True)
+        self.probe_min_bpp = float(self._getenv('PROBE_MIN_BPP', '0.05'))
+        self.probe_min_bpp_codecs = {
+            codec.strip().lower(): float(bpp)
+            for codec, _, bpp in (
+                item.partition(':') for item in self._getenv(
+                    'PROBE_MIN_BPP_CODECS', 'vp9:0.1,av1:0.1,hevc:0.08'
+                ).split(','))
+            if bpp}
+
+        # Thread pools (0 lets TensorFlow choose, negative keeps the OpenCV
+        # default) and CPU sets (ex: 0-5,8) of analysis and encode workers
+        self.tf_intra_op_threads = int(
+            self._getenv('TF_INTRA_OP_THREADS', '0'))
+        self.tf_inter_op_threads = int(
+            self._getenv('TF_INTER_OP_THREADS', '0'))
+        self.opencv_threads = int(self._getenv('OPENCV_THREADS', '-1'))
+        self.analysis_cpus = self._getcpus('ANALYSIS_CPUS')
+        self.encode_cpus = self._getcpus('ENCODE_CPUS')
+
+        # Model warm-up at startup: a dummy batch of each size, by default
+        # the batch sizes of the analysis settings
+        self.analysis_warmup = self._getbool('ANALYSIS_WARMUP', True)
+        self.analysis_warmup_batch_sizes = [
+            int(size)
+            for size in self._getenv('ANALYSIS_WARMUP_BATCH_SIZES', '').split(',')
+            if size.strip()] or self._analysis_batch_sizes()
+
     def s3_to_dict(self) -> dict:
         return dict(
             aws_access_key_id=self.access_key,
@@ -55,12 +204,47 @@ class Config:
             endpoint_url=self.cluster_url,
         )
 
+    def _analysis_batch_sizes(self) -> list:
+        if self.analysis_backend == 'keras' and self.analysis_batch_buckets:
+            # every batch runs on one of the compiled bucket sizes
+            return self.analysis_batch_buckets
+        batch_sizes = {self.analysis_frames}
+        if self.analysis_adaptive:
+            batch_sizes.update((self.analysis_first_wave,
+                                self.analysis_wave_size))
+        if self.inference_batching:
+            batch_sizes.add(self.inference_max_batch_size)
+        return sorted(batch_sizes)
+
+    def get_sampling_mode(self, media_id: str) -> str:
+        _, ext = os.path.splitext(media_id)
+        return self.sampling_modes.get(ext[1:].lower(), self.sampling_mode)
+
     def _getenv(self, key: str, default: str = None) -> str:
         value = self._source.get(key, default)
         if value is None:
             raise ValueError(f'{key} is not set')
         return value
 
+    def _getchoice(self, key: str, default: str, choices) -> str:
+        value = self._getenv(key, default)
+        if value not in choices:
+            raise ValueError(f'Invalid {key}: {value} '
+                             f'(valid: {", ".join(choices)})')
+        return value
+
+    def _getcpus(self, key: str) -> set:
+        cpus = set()
+        for item in self._getenv(key, '').split(','):
+            first, _, last = item.strip().partition('-')
+            if first:
+                cpus.update(range(int(first), int(last or first) + 1))
+        return cpus
+
+    def _getbool(self, key: str, default: bool) -> bool:
+        value = self._getenv(key, str(default))
+        return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
 
 def get_config() -> Config:
     load_dotenv()
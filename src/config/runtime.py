@@ -0,0 +1,63 @@
+"""Thread pools and CPU affinity of the analysis and encode workers"""
+import logging
+import os
+from contextlib import contextmanager
+from typing import Set
+
+from src.config.config import Config
+
+_configured = False
+
+
+def configure_runtime(config: Config):
+    """Apply the TensorFlow and OpenCV thread counts, once per process and
+    before the model is loaded (TensorFlow can not change them later)"""
+    global _configured
+    if _configured:
+        return
+    _configured = True
+    log = logging.getLogger(__name__)
+
+    import cv2
+    import tensorflow as tf
+    if config.opencv_threads >= 0:
+        cv2.setNumThreads(config.opencv_threads)
+    try:
+        tf.config.threading.set_intra_op_parallelism_threads(
+            config.tf_intra_op_threads)
+        tf.config.threading.set_inter_op_parallelism_threads(
+            config.tf_inter_op_threads)
+    except RuntimeError as exc:
+        log.warning('TensorFlow threads not configured: %s', exc)
+    log.info('Runtime configured: %s', runtime_info(config))
+
+
+@contextmanager
+def cpu_affinity(cpus: Set[int]):
+    """Pin the calling thread, and the threads and processes it starts, to
+    cpus (on Linux the affinity of pid 0 is the calling thread's)"""
+    if not cpus or not hasattr(os, 'sched_setaffinity'):
+        yield
+        return
+    previous = os.sched_getaffinity(0)
+    os.sched_setaffinity(0, cpus)
+    try:
+        yield
+    finally:
+        os.sched_setaffinity(0, previous)
+
+
+def runtime_info(config: Config) -> dict:
+    """Configured and effective thread pools and CPU sets"""
+    import cv2
+    import tensorflow as tf
+    available = sorted(os.sched_getaffinity(0)) \
+        if hasattr(os, 'sched_getaffinity') else []
+    return dict(
+        cpu_count=os.cpu_count(),
+        available_cpus=available,
+        tf_intra_op_threads=tf.config.threading.get_intra_op_parallelism_threads(),
+        tf_inter_op_threads=tf.config.threading.get_inter_op_parallelism_threads(),
+        opencv_threads=cv2.getNumThreads(),
+        analysis_cpus=sorted(config.analysis_cpus),
+        encode_cpus=sorted(config.encode_cpus))
@@ -0,0 +1,94 @@
+import json
+from datetime import datetime
+from typing import List
+
+
+class MediaCache:
+    """Analysis and optimization results keyed by the SHA-256 of the source
+    content, to reuse them when the same video is uploaded again
+
+    new_media_id is None while unknown, '' when optimizing did not reduce
+    the video and the key of the optimized object otherwise"""
+
+    __slots__ = ['content_hash', 'category', 'new_media_id', 'source_size',
+                 'creation_date', 'last_access', 'hits']
+
+    CREATE_TABLE_SQL = '''
+CREATE TABLE IF NOT EXISTS media_cache (
+    content_hash TEXT NOT NULL,
+    category TEXT NULL,
+    new_media_id TEXT NULL,
+    source_size INTEGER DEFAULT 0,
+    creation_date DATETIME DEFAULT CURRENT_TIMESTAMP,
+    last_access DATETIME DEFAULT CURRENT_TIMESTAMP,
+    hits INTEGER DEFAULT 0,
+    CONSTRAINT media_cache_PK PRIMARY KEY (content_hash)
+);
+
+CREATE INDEX IF NOT EXISTS media_cache_last_access_IDX ON media_cache (last_access);
+            '''
+
+    def __init__(self, row: tuple = None, **fields):
+        """MediaCache fields
+        content_hash: str
+        category: dict
+        new_media_id: str
+        source_size: int
+        creation_date: datetime
+        last_access: datetime
+        hits: int
+        """
+        if not isinstance(row, tuple):
+            row = ('', None, None, 0, datetime.now(), datetime.now(), 0)
+        if len(row) != len(self.__slots__):
+            raise ValueError('Invalid row', row)
+        self.content_hash: str = fields.get('content_hash', row[0])
+        self.category = fields.get('category', row[1])
+        if isinstance(self.category, str) and self.category:
+            self.category = json.loads(self.category)
+        elif not isinstance(self.category, dict):
+            self.category = None
+        self.new_media_id: str = fields.get('new_media_id', row[2])
+        self.source_size: int = fields.get('source_size', row[3])
+        self.creation_date: datetime = _as_datetime(
+            fields.get('creation_date', row[4]))
+        self.last_access: datetime = _as_datetime(
+            fields.get('last_access', row[5]))
+        self.hits: int = fields.get('hits', row[6])
+
+    def as_row(self) -> tuple:
+        return (self.content_hash,
+                None if self.category is None else json.dumps(self.category),
+                self.new_media_id,
+                self.source_size,
+                self.creation_date,
+                self.last_access,
+                self.hits)
+
+    @classmethod
+    def field_names(cls) -> List[str]:
+        return cls.__slots__
+
+    @classmethod
+    def field_names_sql(cls) -> str:
+        return ','.join(cls.__slots__)
+
+    @classmethod
+    def field_values_placeholders(cls) -> str:
+        return ','.join(['?'] * len(cls.__slots__))
+
+    def __str__(self):
+        return (f'{self.content_hash[:12]} ({self.hits} hits)' +
+                ('' if self.new_media_id is None
+                 else f' -> {self.new_media_id or "not optimized"}') +
+                ('' if not self.category else f' : {self.category}'))
+
+
+def _as_datetime(value) -> datetime:
+    if isinstance(value, str):
+        for fmt in ('%Y-%m-%d %H:%M:%S.%f', '%Y-%m-%d %H:%M:%S'):
+            try:
+                return datetime.strptime(value, fmt)
+            except ValueError:
+                ...
+    return value
@@ -9,7 +9,8 @@ class MediaData:
 
     __slots__ = ['post_id', 'media_id', 'creation_date', 'media_path',
                  'new_media_path', 'category', 'notification_sent',
-                 'notification_accepted', 'status', 'new_media_id']
+                 'notification_accepted', 'status', 'new_media_id',
+                 'poster_id', 'sprite_id']
 
     CREATE_TABLE_SQL = '''
 CREATE TABLE IF NOT EXISTS media (
@@ -23,12 +24,20 @@ CREATE TABLE IF NOT EXISTS media (
     notification_accepted INTEGER DEFAULT 0,
     status TEXT NULL,
     new_media_id TEXT NOT NULL,
+    poster_id TEXT NULL,
+    sprite_id TEXT NULL,
     CONSTRAINT media_PK PRIMARY KEY (post_id)
 );
 
 CREATE UNIQUE INDEX IF NOT EXISTS media_media_path_IDX ON media (media_path);
             '''
 
+    # Columns added after the first release, for existing databases
+    ADDED_COLUMNS = {
+        'poster_id': 'TEXT NULL',
+        'sprite_id': 'TEXT NULL',
+    }
+
     def __init__(self, row: tuple = None, **fields):
         """MediaData fields
         post_id: int
@@ -41,9 +50,11 @@ CREATE UNIQUE INDEX IF NOT EXISTS media_media_path_IDX ON media (media_path);
         notification_accepted: int
         status: str
         new_media_id: str
+        poster_id: str
+        sprite_id: str
         """
         if not isinstance(row, tuple):
-            row = (0, '', datetime.now(), '', '', None, 0, 0, '', '')
+            row = (0, '', datetime.now(), '', '', None, 0, 0, '', '', '', '')
         if len(row) != len(self.__slots__):
             raise ValueError('Invalid row', row)
         self.post_id: int = fields.get('post_id', row[0])
@@ -66,6 +77,8 @@ CREATE UNIQUE INDEX IF NOT EXISTS media_media_path_IDX ON media (media_path);
         if isinstance(self.status, str) and self.status:
             self.status = MediaStatusEnum(self.status)
         self.new_media_id = fields.get('new_media_id', row[9])
+        self.poster_id = fields.get('poster_id', row[10]) or ''
+        self.sprite_id = fields.get('sprite_id', row[11]) or ''
 
     def as_row(self) -> tuple:
         return (self.post_id,
@@ -77,7 +90,9 @@ CREATE UNIQUE INDEX IF NOT EXISTS media_media_path_IDX ON media (media_path);
                 self.notification_sent,
                 self.notification_accepted,
                 self.status.value,
-                self.new_media_id)
+                self.new_media_id,
+                self.poster_id,
+                self.sprite_id)
 
     @classmethod
     def field_names(cls) -> List[str]:
@@ -0,0 +1,108 @@
+from datetime import datetime
+from typing import List
+
+from src.domain.media_cache import _as_datetime
+
+
+class MediaProbe:
+    """Video stream properties read by ffprobe before encoding, and the
+    decision taken from them
+
+    bits_per_pixel is the video bitrate spread over every pixel of every
+    frame: low values are already efficiently compressed sources"""
+
+    __slots__ = ['media_id', 'codec', 'audio_codec', 'width', 'height', 'fps',
+                 'duration', 'bit_rate', 'bits_per_pixel', 'encode', 'reason',
+                 'creation_date']
+
+    CREATE_TABLE_SQL = '''
+CREATE TABLE IF NOT EXISTS media_probe (
+    media_id TEXT NOT NULL,
+    codec TEXT NULL,
+    audio_codec TEXT NULL,
+    width INTEGER DEFAULT 0,
+    height INTEGER DEFAULT 0,
+    fps REAL DEFAULT 0,
+    duration REAL DEFAULT 0,
+    bit_rate INTEGER DEFAULT 0,
+    bits_per_pixel REAL DEFAULT 0,
+    encode INTEGER DEFAULT 1,
+    reason TEXT NULL,
+    creation_date DATETIME DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT media_probe_PK PRIMARY KEY (media_id)
+);
+            '''
+
+    ADDED_COLUMNS = {
+        'audio_codec': 'TEXT NULL',
+    }
+
+    def __init__(self, row: tuple = None, **fields):
+        """MediaProbe fields
+        media_id: str
+        codec: str
+        audio_codec: str ('' without audio)
+        width: int
+        height: int
+        fps: float
+        duration: float (seconds)
+        bit_rate: int (video bits per second)
+        bits_per_pixel: float
+        encode: bool
+        reason: str
+        creation_date: datetime
+        """
+        if not isinstance(row, tuple):
+            row = ('', '', '', 0, 0, 0.0, 0.0, 0, 0.0, True, '',
+                   datetime.now())
+        if len(row) != len(self.__slots__):
+            raise ValueError('Invalid row', row)
+        self.media_id: str = fields.get('media_id', row[0])
+        self.codec: str = fields.get('codec', row[1])
+        self.audio_codec: str = fields.get('audio_codec', row[2])
+        self.width: int = fields.get('width', row[3])
+        self.height: int = fields.get('height', row[4])
+        self.fps: float = fields.get('fps', row[5])
+        self.duration: float = fields.get('duration', row[6])
+        self.bit_rate: int = fields.get('bit_rate', row[7])
+        self.bits_per_pixel: float = fields.get('bits_per_pixel', row[8])
+        if not self.bits_per_pixel and self.bit_rate:
+            pixels = self.width * self.height * self.fps
+            self.bits_per_pixel = self.bit_rate / pixels if pixels else 0.0
+        self.encode: bool = bool(fields.get('encode', row[9]))
+        self.reason: str = fields.get('reason', row[10])
+        self.creation_date: datetime = _as_datetime(
+            fields.get('creation_date', row[11]))
+
+    def as_row(self) -> tuple:
+        return (self.media_id,
+                self.codec,
+                self.audio_codec,
+                self.width,
+                self.height,
+                self.fps,
+                self.duration,
+                self.bit_rate,
+                self.bits_per_pixel,
+                int(self.encode),
+                self.reason,
+                self.creation_date)
+
+    @classmethod
+    def field_names(cls) -> List[str]:
+        return cls.__slots__
+
+    @classmethod
+    def field_names_sql(cls) -> str:
+        return ','.join(cls.__slots__)
+
+    @classmethod
+    def field_values_placeholders(cls) -> str:
+        return ','.join(['?'] * len(cls.__slots__))
+
+    def __str__(self):
+        return (f'{self.media_id} {self.codec} {self.width}x{self.height} '
+                f'{self.fps:.2f}fps {self.duration:.1f}s '
+                f'{self.bit_rate // 1000}kbps {self.bits_per_pixel:.3f}bpp' +
+                ('' if not self.reason else
+                 f' : {"encode" if self.encode else "skip"} ({self.reason})'))
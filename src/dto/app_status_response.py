@@ -1,7 +1,7 @@
 import glob
 import os
 from datetime import datetime
-from typing import Dict, List
+from typing import Any, Dict, List
 
 from pydantic import BaseModel
 from src import __description__, __version__
@@ -43,3 +43,4 @@ class AppStatusResponse(BaseModel):
     started_time: datetime = started_time
     s3_url: str
     latest_media: List[MediaNotificationResponse] = []
+    runtime: Dict[str, Any] = {}
@@ -1,6 +1,6 @@
 """Video Data Response"""
 
-from typing import Optional
+from typing import Dict, List, Optional
 
 from pydantic import BaseModel
 from src.dto.video_categories import VideoCategory
@@ -13,6 +13,10 @@ class GetVideoResponse(BaseModel):
     categories: Optional[VideoCategory]
     message: Optional[str]
     processing_time: Optional[float]
+    statistics: Optional[Dict[str, VideoCategory]]
+    frames: Optional[List[VideoCategory]]
+    frames_used: Optional[int]
+    previews: Optional[Dict[str, str]]
 
     def __str__(self) -> str:
-        return f'{self.video_id} [{self.message}] ({self.processing_time}s): {self.categories}'
+        return f'{self.video_id} [{self.message}] ({self.processing_time}s, {self.frames_used} frames): {self.categories}'
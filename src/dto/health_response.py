@@ -0,0 +1,13 @@
+from typing import List, Optional
+
+from pydantic import BaseModel
+
+
+class HealthResponse(BaseModel):
+
+    ready: bool
+    status: str
+    backend: str
+    warm_up_batch_sizes: List[int] = []
+    warm_up_time: Optional[float] = None
+    message: Optional[str] = None
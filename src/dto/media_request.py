@@ -1,4 +1,5 @@
 import urllib.parse
+from typing import Optional
 
 import pydantic
 from src.config.config import Config
@@ -33,3 +34,5 @@ class MediaRequestValidator:
 class MediaProcessRequest(pydantic.BaseModel):
     url: str
     post_id: int
+    # encoding profile, the configured one when omitted
+    profile: Optional[str] = None
@@ -1,10 +1,13 @@
 import logging
 import sqlite3
 import threading
+from datetime import datetime, timedelta
 from typing import Dict, List
 
 from src.config.config import Config
+from src.domain.media_cache import MediaCache
 from src.domain.media_data import MediaData
+from src.domain.media_probe import MediaProbe
 
 singleton_repository = None
 
@@ -22,6 +25,10 @@ class MediaRepository:
             self.lock.acquire()
             self.conn = sqlite3.connect(local_db)
             self.conn.executescript(MediaData.CREATE_TABLE_SQL)
+            self._add_columns('media', MediaData.ADDED_COLUMNS)
+            self.conn.executescript(MediaCache.CREATE_TABLE_SQL)
+            self.conn.executescript(MediaProbe.CREATE_TABLE_SQL)
+            self._add_columns('media_probe', MediaProbe.ADDED_COLUMNS)
             self.log.info('MediaRepository initialized: %s', local_db)
         except Exception as exc:
             self.log.error('Failed to initialize MediaRepository: %s', exc)
@@ -29,6 +36,17 @@ class MediaRepository:
         finally:
             self.lock.release()
 
+    def _add_columns(self, table: str, columns: Dict[str, str]):
+        """Migrate databases created before the columns existed"""
+        existing = {row[1] for row in
+                    self.conn.execute(f'PRAGMA table_info({table})')}
+        for column, definition in columns.items():
+            if column not in existing:
+                self.conn.execute(
+                    f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+                self.log.info('Added column %s.%s', table, column)
+        self.conn.commit()
+
     def get_media(self, media_id: int) -> MediaData:
         result: MediaData = None
         try:
@@ -134,6 +152,102 @@ class MediaRepository:
             self.lock.release()
         return result
 
+    def get_cache(self, content_hash: str) -> MediaCache:
+        result: MediaCache = None
+        try:
+            self.lock.acquire()
+            sql = f'SELECT {MediaCache.field_names_sql()} FROM media_cache WHERE content_hash = ?'
+            row = self.conn.execute(sql, (content_hash,)).fetchone()
+            if row:
+                result = MediaCache(row)
+                self.conn.execute(
+                    'UPDATE media_cache SET hits = hits + 1, last_access = ? '
+                    'WHERE content_hash = ?', (datetime.now(), content_hash))
+                self.conn.commit()
+
+        except Exception as exc:
+            self.log.error('Failed to get cache %s: %s', content_hash, exc)
+        finally:
+            self.lock.release()
+        return result
+
+    def set_cache(self, media_cache: MediaCache) -> bool:
+        """Insert or update the cache entry, keeping the known category and
+        new_media_id when the new ones are None"""
+        result: bool = False
+        try:
+            self.lock.acquire()
+            sql = (f'INSERT INTO media_cache ({MediaCache.field_names_sql()}) '
+                   f'VALUES ({MediaCache.field_values_placeholders()}) '
+                   'ON CONFLICT(content_hash) DO UPDATE SET '
+                   'category = COALESCE(excluded.category, category), '
+                   'new_media_id = COALESCE(excluded.new_media_id, new_media_id), '
+                   'source_size = MAX(excluded.source_size, source_size), '
+                   'last_access = excluded.last_access')
+            self.conn.execute(sql, media_cache.as_row())
+            self.conn.commit()
+            result = True
+        except Exception as exc:
+            self.log.error('Failed to set cache %s: %s',
+                           media_cache.content_hash, exc)
+        finally:
+            self.lock.release()
+        return result
+
+    def evict_cache(self, max_entries: int, max_age_days: int) -> int:
+        """Remove cache entries not accessed in max_age_days and the least
+        recently used ones above max_entries. Returns removed entries"""
+        result = 0
+        try:
+            self.lock.acquire()
+            cursor = self.conn.execute(
+                'DELETE FROM media_cache WHERE last_access < ?',
+                (datetime.now() - timedelta(days=max_age_days),))
+            result += cursor.rowcount
+            cursor = self.conn.execute(
+                'DELETE FROM media_cache WHERE content_hash NOT IN ('
+                'SELECT content_hash FROM media_cache '
+                'ORDER BY last_access DESC LIMIT ?)', (max_entries,))
+            result += cursor.rowcount
+            self.conn.commit()
+            if result:
+                self.log.info('Evicted %s cache entries', result)
+        except Exception as exc:
+            self.log.error('Failed to evict cache: %s', exc)
+        finally:
+            self.lock.release()
+        return result
+
+    def get_probe(self, media_id: str) -> MediaProbe:
+        result: MediaProbe = None
+        try:
+            self.lock.acquire()
+            sql = f'SELECT {MediaProbe.field_names_sql()} FROM media_probe WHERE media_id = ?'
+            row = self.conn.execute(sql, (media_id,)).fetchone()
+            if row:
+                result = MediaProbe(row)
+
+        except Exception as exc:
+            self.log.error('Failed to get probe %s: %s', media_id, exc)
+        finally:
+            self.lock.release()
+        return result
+
+    def set_probe(self, media_probe: MediaProbe) -> bool:
+        result: bool = False
+        try:
+            self.lock.acquire()
+            sql = f'INSERT OR REPLACE INTO media_probe ({MediaProbe.field_names_sql()}) VALUES ({MediaProbe.field_values_placeholders()})'
+            self.conn.execute(sql, media_probe.as_row())
+            self.conn.commit()
+            result = True
+        except Exception as exc:
+            self.log.error('Failed to set probe %s: %s',
+                           media_probe.media_id, exc)
+        finally:
+            self.lock.release()
+        return result
+
 
 def get_repository(config: Config) -> MediaRepository:
     global singleton_repository
@@ -0,0 +1,100 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from src.analysis.analysis_executor import AnalysisExecutor
+from src.analysis.engine import AnalysisEngine
+from src.config.config import Config
+from tests.analysis.test_model_processor import FakeModel
+from tests.analysis.test_video_capture import create_video
+
+
+class TestAnalysisExecutor(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.video = os.path.join(cls.tmp.name, 'video.avi')
+        create_video(cls.video)
+        cls.config = Config(source=dict(S3_ACCESS_KEY='ABCD',
+                                        S3_SECRET_KEY='ABCD',
+                                        S3_BUCKET_NAME='test',
+                                        S3_ENDPOINT_URL='https://test.com/',
+                                        S3_CLUSTER_URL='https://test.com/'))
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.tmp.cleanup()
+
+    def test_inline(self):
+        executor = AnalysisExecutor(self.config, workers=0,
+                                    engine=AnalysisEngine(
+                                        self.config, FakeModel(0.99)))
+        future = executor.submit('video.avi', self.video)
+
+        self.assertTrue(future.done())
+        response = future.result()
+        self.assertEqual('OK', response.message)
+        self.assertAlmostEqual(99.0, response.categories.neutral)
+
+    def test_warm_up(self):
+        config = Config(source=dict(self.config._source,
+                                    ANALYSIS_BACKEND='tflite-float16',
+                                    ANALYSIS_ADAPTIVE='1',
+                                    ANALYSIS_FIRST_WAVE='4'))
+        self.assertEqual([4, 6, 20], config.analysis_warmup_batch_sizes)
+        executor = AnalysisExecutor(config, workers=0,
+                                    engine=AnalysisEngine(config))
+        model = mock.Mock()
+        with mock.patch('src.analysis.engine.ModelCollection') as mc:
+            mc.return_value.get_model.return_value = model
+            executor.warm_up()
+
+        self.assertTrue(executor.ready.is_set())
+        self.assertEqual([4, 6, 20], [call.args[0].shape[0]
+                                      for call in model.predict.call_args_list])
+
+    def test_warm_up_failure(self):
+        executor = AnalysisExecutor(self.config, workers=0,
+                                    engine=AnalysisEngine(self.config))
+        with mock.patch('src.analysis.engine.ModelCollection') as mc:
+            mc.return_value.get_model.side_effect = FileNotFoundError('model')
+            executor.warm_up()
+
+        self.assertFalse(executor.ready.is_set())
+        self.assertIsInstance(executor.warm_up_error, FileNotFoundError)
+
+    def test_inline_failure(self):
+        executor = AnalysisExecutor(self.config, workers=0,
+                                    engine=AnalysisEngine(
+                                        self.config, FakeModel(0.99)))
+        future = executor.submit('missing.avi', '/tmp/missing.avi')
+        self.assertRaises(FileNotFoundError, future.result)
+
+    def test_threads_share_the_inference_service(self):
+        config = Config(source=dict(self.config._source,
+                                    INFERENCE_BATCHING='true'))
+        engine = AnalysisEngine(config, FakeModel(0.99))
+        executor = AnalysisExecutor(config, workers=2, engine=engine)
+        futures = [executor.submit('video.avi', self.video)
+                   for _ in range(2)]
+        try:
+            for future in futures:
+                self.assertAlmostEqual(
+                    99.0, future.result(30).categories.neutral)
+            self.assertIsNotNone(engine._inference_service)
+        finally:
+            executor.shutdown()
+        self.assertIsNone(engine._inference_service)
+
+    def test_warm_up_workers_failure(self):
+        # the worker initializer cannot load the model: no worker is ready
+        executor = AnalysisExecutor(Config(source=dict(
+            self.config._source, ANALYSIS_BACKEND='missing')), workers=2)
+        self.addCleanup(executor.shutdown)
+        executor.warm_up()
+
+        self.assertFalse(executor.ready.is_set())
+        self.assertIsNotNone(executor.warm_up_error)
+        self.assertEqual(0, executor._ready_workers.value)
@@ -0,0 +1,75 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import tensorflow as tf
+
+from src.analysis.backends import (TFLITE_FLOAT16, TFLITE_INT8,
+                                   BucketedPredictor, TFLiteBackend,
+                                   convert_to_tflite)
+
+
+class TestTFLiteBackend(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        tf.keras.utils.set_random_seed(1)
+        cls.model = tf.keras.Sequential([
+            tf.keras.layers.Input((8, 8, 3)),
+            tf.keras.layers.Conv2D(4, 3),
+            tf.keras.layers.GlobalAveragePooling2D(),
+            tf.keras.layers.Dense(5, activation='softmax')])
+        cls.images = np.random.default_rng(1).random(
+            (6, 8, 8, 3), dtype=np.float32)
+        cls.tmp = tempfile.TemporaryDirectory()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.tmp.cleanup()
+
+    def backend(self, backend: str, **kwargs) -> TFLiteBackend:
+        model_file = os.path.join(self.tmp.name, f'{backend}.tflite')
+        with open(model_file, 'wb') as file:
+            file.write(convert_to_tflite(self.model, backend, **kwargs))
+        return TFLiteBackend(model_file, threads=1)
+
+    def test_float16(self):
+        backend = self.backend(TFLITE_FLOAT16)
+        expected = self.model.predict(self.images, verbose=0)
+        np.testing.assert_allclose(expected, backend.predict(self.images),
+                                   atol=0.01)
+        # batch size change
+        self.assertEqual((2, 5), backend.predict(self.images[:2]).shape)
+
+    def test_int8(self):
+        backend = self.backend(TFLITE_INT8, representative_images=[
+            image[np.newaxis] for image in self.images])
+        expected = self.model.predict(self.images, verbose=0)
+        np.testing.assert_allclose(expected, backend.predict(self.images),
+                                   atol=0.05)
+
+    def test_int8_without_images(self):
+        self.assertRaises(ValueError, convert_to_tflite,
+                          self.model, TFLITE_INT8)
+
+
+class TestBucketedPredictor(unittest.TestCase):
+
+    def test_predict(self):
+        tf.keras.utils.set_random_seed(1)
+        model = tf.keras.Sequential([
+            tf.keras.layers.Input((8, 8, 3)),
+            tf.keras.layers.Flatten(),
+            tf.keras.layers.Dense(5, activation='softmax')])
+        predictor = BucketedPredictor(model, buckets=[4, 8])
+        images = np.random.default_rng(1).random((19, 8, 8, 3),
+                                                 dtype=np.float32)
+
+        for size in (0, 3, 8, 19):
+            np.testing.assert_allclose(
+                model.predict(images[:size], verbose=0) if size
+                else np.empty((0, 5)),
+                predictor(images[:size]), atol=1e-5)
+        # 3 -> 4, 8 -> 8, 19 -> 8 + 8 + 4: only the two buckets were traced
+        self.assertEqual(2, len(predictor._concrete_functions))
@@ -0,0 +1,104 @@
+import asyncio
+import os
+import tempfile
+import threading
+import unittest
+
+import numpy as np
+
+from src.analysis import engine as engine_module
+from src.analysis.engine import AnalysisEngine, get_analysis_engine
+from src.config.config import Config
+from tests.analysis.test_model_processor import FakeModel
+from tests.analysis.test_video_capture import create_video
+
+
+class CountingModel(FakeModel):
+
+    def __init__(self):
+        super().__init__(0.99)
+        self.running = 0
+        self.max_running = 0
+        self.lock = threading.Lock()
+
+    def predict(self, images):
+        with self.lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        try:
+            return super().predict(images)
+        finally:
+            with self.lock:
+                self.running -= 1
+
+
+class TestAnalysisEngine(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.video = os.path.join(cls.tmp.name, 'video.avi')
+        create_video(cls.video)
+        cls.config = Config(source=dict(S3_ACCESS_KEY='ABCD',
+                                        S3_SECRET_KEY='ABCD',
+                                        S3_BUCKET_NAME='test',
+                                        S3_ENDPOINT_URL='https://test.com/',
+                                        S3_CLUSTER_URL='https://test.com/',
+                                        ANALYSIS_FRAMES='10'))
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.tmp.cleanup()
+
+    def test_predict_is_serialized(self):
+        model = CountingModel()
+        engine = AnalysisEngine(model=model)
+        images = np.zeros((4, 8, 8, 3), dtype=np.float32)
+        threads = [threading.Thread(target=engine.predict, args=(images,))
+                   for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(1, model.max_running)
+
+    def test_analyse(self):
+        engine = AnalysisEngine(self.config, FakeModel(0.99))
+        response = engine.analyse('video.avi', self.video)
+        self.assertEqual(10, response.frames_used)
+        self.assertAlmostEqual(99.0, response.categories.neutral)
+
+    def test_analyse_async(self):
+        engine = AnalysisEngine(self.config, FakeModel(0.99))
+        response = asyncio.run(engine.analyse_async('video.avi', self.video))
+        self.assertEqual('OK', response.message)
+
+    def test_analyse_frames(self):
+        engine = AnalysisEngine(self.config, FakeModel(0.99))
+        frames = np.zeros((5, 224, 224, 3), dtype=np.uint8)
+        response = engine.analyse_frames('video.avi', self.video, frames)
+        self.assertEqual(5, response.frames_used)
+        self.assertAlmostEqual(99.0, response.categories.neutral)
+
+    def test_inference_batching(self):
+        config = Config(source=dict(self.config._source,
+                                    INFERENCE_BATCHING='1'))
+        engine = AnalysisEngine(config, FakeModel(0.99))
+        predictions = engine.predict(np.zeros((3, 8, 8, 3), np.float32))
+        self.assertEqual((3, 5), predictions.shape)
+        self.assertEqual(1, engine._inference_service.batches)
+        engine._inference_service.stop()
+
+    def test_get_analysis_engine(self):
+        previous = engine_module.singleton_engine
+        engine_module.singleton_engine = None
+        try:
+            # a config-less caller first must not pin the defaults
+            defaults = get_analysis_engine()
+            self.assertIsNone(defaults.config)
+            configured = get_analysis_engine(self.config)
+            self.assertIs(self.config, configured.config)
+            self.assertIs(configured, get_analysis_engine())
+            self.assertIs(configured, get_analysis_engine(self.config))
+        finally:
+            engine_module.singleton_engine = previous
@@ -0,0 +1,72 @@
+import os
+import tempfile
+import unittest
+
+import cv2
+import numpy as np
+
+from src.analysis.frame_sampler import (SamplingMode, frame_positions,
+                                        read_frames, scene_positions)
+from tests.analysis.test_video_capture import create_video
+
+
+class TestFrameSampler(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.video = os.path.join(cls.tmp.name, 'video.avi')
+        create_video(cls.video)
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.tmp.cleanup()
+
+    def test_frame_positions(self):
+        self.assertEqual([0, 5, 10, 15], frame_positions(20, 4))
+        self.assertEqual([0, 1, 2], frame_positions(3, 20))
+        # unknown frame count: a forward read of the first frames
+        self.assertEqual([0, 1, 2, 3], frame_positions(0, 4))
+        self.assertEqual([0, 1], frame_positions(-1, 2))
+        self.assertEqual([], frame_positions(20, 0))
+
+    def test_modes(self):
+        positions = frame_positions(50, 10)
+        for mode in (SamplingMode.Seek, SamplingMode.Grab,
+                     SamplingMode.Time):
+            vidcap = cv2.VideoCapture(self.video)
+            frames = list(read_frames(vidcap, self.video, positions, mode))
+            vidcap.release()
+            self.assertEqual(positions, [p for p, _ in frames], mode)
+
+    def test_keyframe_mode(self):
+        vidcap = cv2.VideoCapture(self.video)
+        frames = list(read_frames(vidcap, self.video, frame_positions(50, 10),
+                                  SamplingMode.Keyframe))
+        vidcap.release()
+        self.assertTrue(frames)
+
+    def test_scene_mode(self):
+        # scenes of 10, 60 and 30 frames
+        video = os.path.join(self.tmp.name, 'scenes.avi')
+        writer = cv2.VideoWriter(video, cv2.VideoWriter_fourcc(*'MJPG'),
+                                 25, (64, 48))
+        for color, frames in (((0, 0, 255), 10), ((0, 255, 0), 60),
+                              ((255, 0, 0), 30)):
+            image = np.zeros((48, 64, 3), dtype=np.uint8)
+            image[:] = color
+            for _ in range(frames):
+                writer.write(image)
+        writer.release()
+
+        vidcap = cv2.VideoCapture(video)
+        frames = list(read_frames(vidcap, video, frame_positions(100, 10),
+                                  SamplingMode.Scene))
+        self.assertEqual(3, len(frames))
+        self.assertEqual([2, 1, 0], [int(image.mean(axis=(0, 1)).argmax())
+                                     for _, image in frames])
+
+        # budget smaller than the scenes: the strongest boundaries
+        vidcap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+        self.assertEqual(2, len(scene_positions(vidcap, [0, 50])))
+        vidcap.release()
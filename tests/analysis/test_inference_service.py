@@ -0,0 +1,105 @@
+import threading
+import unittest
+
+import numpy as np
+
+from src.analysis.inference_service import InferenceService
+
+
+class FakeModel:
+
+    def __init__(self):
+        self.calls = []
+
+    def predict(self, images):
+        self.calls.append(len(images))
+        # one "probability" per frame, identifying the frame
+        return images[:, 0, 0, :1]
+
+
+class TestInferenceService(unittest.TestCase):
+
+    def test_batches_concurrent_requests(self):
+        model = FakeModel()
+        service = InferenceService(model, max_batch_size=64, max_wait=0.2)
+        results = {}
+
+        def request(n):
+            images = np.full((4, 2, 2, 3), n, dtype=np.float32)
+            results[n] = service.predict(images, timeout=5)
+
+        threads = [threading.Thread(target=request, args=(n,))
+                   for n in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        service.stop()
+
+        self.assertEqual(32, sum(model.calls))
+        self.assertLess(len(model.calls), 8)
+        for n, result in results.items():
+            self.assertEqual((4, 1), result.shape)
+            self.assertTrue((result == n).all())
+
+    def test_max_batch_size(self):
+        model = FakeModel()
+        service = InferenceService(model, max_batch_size=8, max_wait=0.2)
+        threads = [threading.Thread(
+            target=service.predict,
+            args=(np.zeros((4, 2, 2, 3), dtype=np.float32),))
+            for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        service.stop()
+
+        self.assertEqual(24, sum(model.calls))
+        self.assertLessEqual(max(model.calls), 8)
+
+    def test_error_is_sent_to_caller(self):
+        class BrokenModel:
+            def predict(self, images):
+                raise RuntimeError('broken')
+
+        service = InferenceService(BrokenModel(), max_wait=0)
+        with self.assertRaises(RuntimeError):
+            service.predict(np.zeros((1, 2, 2, 3)), timeout=5)
+        service.stop()
+
+    def test_stop_fails_pending_requests(self):
+        release = threading.Event()
+
+        class SlowModel(FakeModel):
+            def predict(self, images):
+                release.wait(5)
+                return super().predict(images)
+
+        service = InferenceService(SlowModel(), max_batch_size=4,
+                                   max_wait=0)
+        results = []
+
+        def request():
+            try:
+                results.append(service.predict(
+                    np.zeros((4, 2, 2, 3), dtype=np.float32)))
+            except RuntimeError as exc:
+                results.append(exc)
+
+        threads = [threading.Thread(target=request) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        while service._queue.qsize() < 2 and not service._pending:
+            threading.Event().wait(0.01)
+        stopping = threading.Thread(target=service.stop)
+        stopping.start()
+        release.set()
+        stopping.join(10)
+        for thread in threads:
+            thread.join(10)
+
+        self.assertFalse(any(thread.is_alive() for thread in threads))
+        self.assertEqual(3, len(results))
+        self.assertTrue(any(isinstance(result, RuntimeError)
+                            for result in results))
@@ -0,0 +1,73 @@
+import os
+import tempfile
+import unittest
+
+import cv2
+import numpy as np
+
+from src.analysis.engine import AnalysisEngine
+from src.analysis.model_processor import AdaptiveSampling, VideoAnalyzer
+from src.analysis.preview import PreviewSettings
+from tests.analysis.test_video_capture import create_video
+
+
+class FakeModel:
+
+    def __init__(self, neutral: float):
+        self.neutral = neutral
+
+    def predict(self, images):
+        preds = np.zeros((len(images), 5), dtype=np.float32)
+        preds[:, 2] = self.neutral
+        preds[:, 4] = 1 - self.neutral
+        return preds
+
+
+class TestVideoAnalyzer(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.video = os.path.join(cls.tmp.name, 'video.avi')
+        create_video(cls.video)
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.tmp.cleanup()
+
+    def analyse(self, neutral: float, **kwargs):
+        engine = AnalysisEngine(model=FakeModel(neutral))
+        return VideoAnalyzer('video', self.video, engine=engine, **kwargs)()
+
+    def test_process(self):
+        response = self.analyse(0.99)
+        self.assertEqual('OK', response.message)
+        self.assertEqual(20, response.frames_used)
+        self.assertAlmostEqual(99.0, response.categories.neutral)
+
+    def test_adaptive_early_exit(self):
+        response = self.analyse(0.99, adaptive=AdaptiveSampling(first_wave=4))
+        self.assertEqual(4, response.frames_used)
+
+    def test_adaptive_borderline(self):
+        response = self.analyse(0.5, adaptive=AdaptiveSampling(
+            first_wave=4, wave_size=4))
+        self.assertEqual(20, response.frames_used)
+
+    def test_previews(self):
+        response = self.analyse(0.99, preview=PreviewSettings(tile_width=40))
+        poster = cv2.imread(response.previews['poster'])
+        sprite = cv2.imread(response.previews['sprite'])
+        self.assertEqual((168, 224, 3), poster.shape)
+        self.assertEqual((4 * 30, 5 * 40, 3), sprite.shape)
+
+    def test_previews_adaptive_order(self):
+        response = self.analyse(0.5, preview=PreviewSettings(
+            image_format='webp', tile_width=40),
+            adaptive=AdaptiveSampling(first_wave=4, wave_size=4))
+        self.assertTrue(response.previews['sprite'].endswith('.webp'))
+        sprite = cv2.imread(response.previews['sprite']).astype(int)
+        first, last = sprite[15, 20], sprite[105, 180]
+        # frames go from red to blue (BGR)
+        self.assertGreater(first[2], first[0])
+        self.assertGreater(last[0], last[2])
@@ -0,0 +1,36 @@
+import unittest
+
+import numpy as np
+
+from src.analysis.prediction_aggregator import aggregate_predictions
+
+
+class TestPredictionAggregator(unittest.TestCase):
+
+    preds = np.array([[0.0, 0.0, 1.0, 0.0, 0.0],
+                      [0.0, 0.0, 0.8, 0.2, 0.0],
+                      [0.0, 0.0, 0.1, 0.9, 0.0],
+                      [0.0, 0.0, 0.9, 0.0, 0.1]])
+
+    def test_statistics(self):
+        aggregate = aggregate_predictions(self.preds, top_k=2, threshold=0.5)
+        self.assertEqual(4, len(aggregate))
+        self.assertAlmostEqual(70.0, aggregate.category('mean').neutral)
+        self.assertAlmostEqual(90.0, aggregate.category('max').porn)
+        self.assertAlmostEqual(55.0, aggregate.category('top_k_mean').porn)
+        self.assertAlmostEqual(
+            75.0, aggregate.category('over_threshold').neutral)
+        self.assertAlmostEqual(
+            25.0, aggregate.category('over_threshold').porn)
+
+    def test_frame_categories(self):
+        frames = aggregate_predictions(self.preds).frame_categories()
+        self.assertEqual(4, len(frames))
+        self.assertAlmostEqual(90.0, frames[2].porn)
+
+    def test_invalid(self):
+        aggregate = aggregate_predictions(self.preds)
+        with self.assertRaises(ValueError):
+            aggregate.category('median')
+        with self.assertRaises(ValueError):
+            aggregate_predictions(np.zeros((2, 3)))
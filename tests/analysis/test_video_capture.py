@@ -0,0 +1,87 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import cv2
+import numpy as np
+
+from src.analysis.frame_sampler import SamplingMode
+from src.analysis.video_capture import (Decoder, VideoFrames,
+                                        extract_video_frames,
+                                        extract_video_frames_array,
+                                        segment_count)
+
+
+def create_video(filename: str, frames: int = 50):
+    writer = cv2.VideoWriter(filename, cv2.VideoWriter_fourcc(*'MJPG'),
+                             25, (64, 48))
+    for n in range(frames):
+        image = np.zeros((48, 64, 3), dtype=np.uint8)
+        # wraps every 51 frames, within uint8
+        colour = (n % 51) * 5
+        image[:] = (colour, 0, 255 - colour)  # BGR
+        writer.write(image)
+    writer.release()
+
+
+class TestVideoCapture(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.video = os.path.join(cls.tmp.name, 'video.avi')
+        create_video(cls.video)
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.tmp.cleanup()
+
+    def test_extract_video_frames(self):
+        with tempfile.TemporaryDirectory() as folder:
+            files = extract_video_frames(self.video, 10, folder)
+            self.assertEqual(10, len(files))
+
+    def test_extract_video_frames_array(self):
+        images = extract_video_frames_array(self.video, 10, 224)
+        self.assertEqual((10, 224, 224, 3), images.shape)
+        self.assertEqual(np.float32, images.dtype)
+        self.assertLessEqual(images.max(), 1.0)
+        # first frame is pure red in BGR order, so RGB channel 0 is set
+        self.assertAlmostEqual(1.0, float(images[0, 0, 0, 0]), places=1)
+        self.assertLess(float(images[0, 0, 0, 2]), 0.1)
+
+    @unittest.skipUnless(shutil.which('ffmpeg'), 'ffmpeg not found')
+    def test_ffmpeg_decoder(self):
+        expected = extract_video_frames_array(self.video, 10, 224)
+        images = extract_video_frames_array(self.video, 10, 224,
+                                            decoder=Decoder.FFmpeg)
+        self.assertEqual(expected.shape, images.shape)
+        self.assertLess(float(np.abs(expected - images).mean()), 0.1)
+
+        # static video: a single scene
+        images = extract_video_frames_array(self.video, 10, 224,
+                                            SamplingMode.Scene,
+                                            Decoder.FFmpeg)
+        self.assertLess(len(images), 10)
+
+        with tempfile.TemporaryDirectory() as folder:
+            files = extract_video_frames(self.video, 10, folder,
+                                         decoder=Decoder.FFmpeg)
+            self.assertEqual(10, len(files))
+
+    def test_segments(self):
+        self.assertEqual(1, segment_count(50, 4))
+        self.assertEqual(4, segment_count(5000, 4))
+        self.assertEqual(2, segment_count(500, 4))
+        for mode in (SamplingMode.Seek, SamplingMode.Grab):
+            expected = extract_video_frames_array(self.video, 10, 224, mode)
+            with VideoFrames(self.video, 224, mode, segments=3,
+                             segment_min_frames=10) as video_frames:
+                self.assertEqual(3, video_frames.segments)
+                images = video_frames.read(list(range(0, 50, 5)))
+            np.testing.assert_array_equal(expected, images)
+
+    def test_missing_file(self):
+        with self.assertRaises(FileNotFoundError):
+            extract_video_frames_array('missing.mp4', 10, 224)
@@ -0,0 +1,97 @@
+import os
+import tempfile
+import threading
+import unittest
+
+from src.app.encoder_scheduler import (EncodeCost, EncoderScheduler,
+                                       cgroup_limits, encode_cost,
+                                       encoder_scheduler, estimate_cost)
+from src.config.config import Config
+from tests.analysis.test_video_capture import create_video
+
+
+class TestEncoderScheduler(unittest.TestCase):
+
+    def test_cgroup_limits(self):
+        cpus, memory = cgroup_limits()
+        self.assertGreater(cpus, 0)
+        self.assertGreater(memory, 0)
+
+    def test_encode_cost(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            video = os.path.join(tmp, 'video.avi')
+            create_video(video, frames=50)
+            cost = encode_cost(video)
+        self.assertEqual(1, cost.threads)
+        self.assertEqual(64 * 48 * 50, cost.work)
+        self.assertGreater(cost.memory, 64 * 48 * 1.5)
+
+    def test_threads_from_work(self):
+        # a short 1080p clip reserves one thread, a long one the tiles
+        self.assertEqual(1, estimate_cost(1920, 1080, 125).threads)
+        self.assertEqual(4, estimate_cost(1920, 1080, 1000).threads)
+        self.assertEqual(7, estimate_cost(1920, 1080, 15000).threads)
+        self.assertEqual(
+            estimate_cost(1920, 1080, 125).memory,
+            estimate_cost(1920, 1080, 15000).memory)
+        # unknown duration
+        self.assertEqual(7, estimate_cost(1920, 1080, 0).threads)
+
+    def test_admission(self):
+        scheduler = EncoderScheduler(cpus=2, memory=100)
+        started = []
+        with scheduler.admit(EncodeCost(2, 10, 0)) as threads:
+            self.assertEqual(2, threads)
+
+            def encode():
+                with scheduler.admit(EncodeCost(1, 10, 0)):
+                    started.append(scheduler.running)
+            thread = threading.Thread(target=encode)
+            thread.start()
+            thread.join(0.2)
+            self.assertEqual([], started)
+        thread.join(5)
+        self.assertEqual([1], started)
+        self.assertEqual(0, scheduler.used_cpus)
+        self.assertEqual(0, scheduler.used_memory)
+
+    def test_smaller_encodes_start_ahead(self):
+        scheduler = EncoderScheduler(cpus=4, memory=100)
+        started = []
+
+        def encode(name: str, cost: EncodeCost):
+            with scheduler.admit(cost):
+                started.append(name)
+
+        with scheduler.admit(EncodeCost(2, 10, 0)):
+            large = threading.Thread(
+                target=encode, args=('large', EncodeCost(4, 10, 0)))
+            large.start()
+            large.join(0.2)
+            small = threading.Thread(
+                target=encode, args=('small', EncodeCost(2, 10, 0)))
+            small.start()
+            small.join(5)
+            self.assertEqual(['small'], started)
+        large.join(5)
+        self.assertEqual(['small', 'large'], started)
+
+    def test_encode_larger_than_budget(self):
+        scheduler = EncoderScheduler(cpus=2, memory=100)
+        with scheduler.admit(EncodeCost(8, 1000, 0)) as threads:
+            self.assertEqual(2, threads)
+            self.assertEqual(100, scheduler.used_memory)
+
+    def test_encoder_scheduler(self):
+        source = dict(S3_ACCESS_KEY='ABCD',
+                      S3_SECRET_KEY='ABCD',
+                      S3_BUCKET_NAME='test',
+                      S3_ENDPOINT_URL='https://test.com/',
+                      S3_CLUSTER_URL='https://test.com/',
+                      ENCODE_CPU_BUDGET='3',
+                      ENCODE_MEMORY_BUDGET_MB='512')
+        scheduler = encoder_scheduler(Config(source=source))
+        self.assertEqual(3, scheduler.cpus)
+        self.assertEqual(512 * 2**20, scheduler.memory)
+        self.assertIsNone(encoder_scheduler(Config(source=dict(
+            source, ENCODE_SCHEDULER='false'))))
@@ -0,0 +1,49 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from src.app.jobs.notify_job import NotifyJob
+from src.app.schedule.schedule_worker import ScheduleContext
+from src.config.config import Config
+from src.domain.media_data import MediaData
+from src.dto.media_status_enum import MediaStatusEnum
+from src.repositories.media_repository import MediaRepository
+
+
+class TestNotifyJob(unittest.TestCase):
+
+    def setUp(self) -> None:
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.config = Config(source=dict(
+            S3_ACCESS_KEY='ABCD',
+            S3_SECRET_KEY='ABCD',
+            S3_BUCKET_NAME='test',
+            S3_ENDPOINT_URL='https://test.com/',
+            S3_CLUSTER_URL='https://test.com/',
+            LOCAL_DB=os.path.join(tmp.name, 'testing.db')))
+        self.repository = MediaRepository(self.config)
+        self.addCleanup(self.repository.conn.close)
+
+    def test_keeps_preview_keys(self):
+        # written by the UploadJob
+        self.repository.set_media(MediaData(
+            post_id=1, media_id='v.mp4', media_path='/tmp/v.mp4',
+            category={'neutral': 90.0}, status=MediaStatusEnum.Uploaded,
+            new_media_id='v.webm', poster_id='v.poster.jpg',
+            sprite_id='v.sprite.jpg'))
+        context = ScheduleContext(self.config, mock.Mock(), self.repository)
+        with mock.patch('src.app.jobs.notify_job.BackendAPI') as api:
+            api.return_value.is_available.return_value = True
+            api.return_value.notify_backend.return_value = True
+            self.assertTrue(NotifyJob().do_process(dict(
+                media_id='v.mp4', post_id=1, metadata={},
+                new_media_id='v.webm',
+                content_metadata={'neutral': 90.0}), context))
+
+        media = self.repository.get_media_by_postid(1)
+        self.assertEqual(MediaStatusEnum.Notified, media.status)
+        self.assertEqual('v.poster.jpg', media.poster_id)
+        self.assertEqual('v.sprite.jpg', media.sprite_id)
+        self.assertEqual('/tmp/v.mp4', media.media_path)
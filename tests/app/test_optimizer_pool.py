@@ -0,0 +1,126 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from src.app.encoding_profiles import QUICK, SINGLE_PASS, TWO_PASS, PROFILES
+from src.app.optimizer_pool import OptimizerPool
+from src.config.config import Config
+from src.domain.media_probe import MediaProbe
+from tests.analysis.test_video_capture import create_video
+
+
+class TestOptimizerPool(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.videos = []
+        for n in range(2):
+            video = os.path.join(cls.tmp.name, f'video{n}.avi')
+            create_video(video)
+            cls.videos.append(video)
+        cls.config = Config(source=dict(S3_ACCESS_KEY='ABCD',
+                                        S3_SECRET_KEY='ABCD',
+                                        S3_BUCKET_NAME='test',
+                                        S3_ENDPOINT_URL='https://test.com/',
+                                        S3_CLUSTER_URL='https://test.com/'))
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.tmp.cleanup()
+
+    @unittest.skipUnless(shutil.which('ffmpeg'), 'ffmpeg not found')
+    def test_concurrent_encodes(self):
+        pool = OptimizerPool(self.config, workers=2)
+        self.addCleanup(pool.shutdown)
+        futures = [pool.submit(f'uploads/video{n}.avi', video)
+                   for n, video in enumerate(self.videos)]
+        for n, future in enumerate(futures):
+            optimizer = future.result(timeout=120)
+            self.addCleanup(os.remove, optimizer.output.name)
+            self.assertTrue(optimizer.new_file, optimizer.message)
+            self.assertEqual(f'uploads/video{n}.avi.webm',
+                             optimizer.new_media_id())
+            self.assertFalse(os.path.exists(optimizer.workdir))
+        self.assertFalse(os.path.exists('ffmpeg2pass-0.log'))
+
+    @unittest.skipUnless(shutil.which('ffmpeg'), 'ffmpeg not found')
+    def test_shutdown_cancels_queued_encodes(self):
+        pool = OptimizerPool(self.config, workers=1)
+        futures = [pool.submit(f'video{n}.avi', self.videos[0],
+                               PROFILES[QUICK]) for n in range(3)]
+        stopping = threading.Thread(target=pool.shutdown,
+                                    kwargs=dict(wait=False))
+        stopping.start()
+        stopping.join(10)
+        self.assertFalse(stopping.is_alive())
+        self.assertTrue(futures[-1].cancelled())
+        optimizer = futures[0].result(timeout=120)
+        self.addCleanup(os.remove, optimizer.output.name)
+        self.assertEqual(0, pool.pending)
+
+    @unittest.skipUnless(shutil.which('ffmpeg'), 'ffmpeg not found')
+    def test_single_pass_profiles(self):
+        pool = OptimizerPool(self.config, workers=0)
+        for name in (SINGLE_PASS, QUICK):
+            optimizer = pool.submit('video.avi', self.videos[0],
+                                    PROFILES[name]).result()
+            self.addCleanup(os.remove, optimizer.output.name)
+            self.assertTrue(optimizer.new_file, optimizer.message)
+            self.assertEqual(name, optimizer.profile.name)
+
+    def test_select_profile(self):
+        pool = OptimizerPool(Config(source=dict(
+            self.config._source, ENCODING_PROFILE=SINGLE_PASS,
+            ENCODING_BACKLOG_SIZE='2')))
+        self.assertEqual(SINGLE_PASS, pool.select_profile().name)
+        self.assertEqual(TWO_PASS, pool.select_profile(TWO_PASS).name)
+        pool.pending = 2
+        self.assertEqual(QUICK, pool.select_profile().name)
+        with self.assertRaises(ValueError):
+            pool.select_profile('slow')
+
+    @unittest.skipUnless(shutil.which('ffmpeg'), 'ffmpeg not found')
+    def test_trial_encode(self):
+        video = os.path.join(self.tmp.name, 'long.avi')
+        create_video(video, frames=250)
+        for min_saving, encoded in ((200, False), (-1000, True)):
+            optimizer = OptimizerPool(Config(source=dict(
+                self.config._source, TRIAL_ENCODE_SECONDS='1',
+                TRIAL_MIN_SAVING=str(min_saving))), workers=0).submit(
+                    'long.avi', video, PROFILES[QUICK]).result()
+            self.addCleanup(os.remove, optimizer.output.name)
+            self.assertIsNotNone(optimizer.trial_saving)
+            self.assertEqual(encoded, bool(optimizer.new_file),
+                             optimizer.message)
+
+    @unittest.skipUnless(shutil.which('ffmpeg'), 'ffmpeg not found')
+    def test_trial_on_uncertain_sources(self):
+        video = os.path.join(self.tmp.name, 'long.avi')
+        create_video(video, frames=250)
+        pool = OptimizerPool(Config(source=dict(
+            self.config._source, TRIAL_ENCODE_SECONDS='1',
+            TRIAL_MIN_SAVING='200', PROBE_MIN_BPP='0.05',
+            TRIAL_BPP_MARGIN='1')), workers=0)
+        for bits_per_pixel, trial in ((1.0, False), (0.07, True)):
+            probe = MediaProbe(media_id='long.avi', codec='mjpeg',
+                               bits_per_pixel=bits_per_pixel)
+            optimizer = pool.submit('long.avi', video, PROFILES[QUICK],
+                                    probe=probe).result()
+            self.addCleanup(os.remove, optimizer.output.name)
+            self.assertEqual(trial, optimizer.trial_saving is not None)
+            self.assertEqual(not trial, bool(optimizer.new_file),
+                             optimizer.message)
+
+    @unittest.skipUnless(shutil.which('ffmpeg'), 'ffmpeg not found')
+    def test_encoder_threads(self):
+        pool = OptimizerPool(Config(source=dict(
+            self.config._source, ENCODE_CPU_BUDGET='1')), workers=0)
+        optimizer = pool.submit('video.avi', self.videos[0],
+                                PROFILES[QUICK]).result()
+        self.addCleanup(os.remove, optimizer.output.name)
+        self.assertTrue(optimizer.new_file, optimizer.message)
+        self.assertEqual('1', optimizer.video_options['threads'])
+        self.assertEqual(0, pool.scheduler.running)
@@ -0,0 +1,57 @@
+import unittest
+
+from src.app.encoding_profiles import PROFILES, SINGLE_PASS, TWO_PASS
+from src.app.output_policy import (OutputPolicy, format_bitrate,
+                                   output_policy, parse_bitrate)
+from src.config.config import Config
+
+
+class TestOutputPolicy(unittest.TestCase):
+
+    def test_bitrate(self):
+        self.assertEqual(2000000, parse_bitrate('2M'))
+        self.assertEqual(1500000, parse_bitrate('1500k'))
+        self.assertEqual(800000, parse_bitrate('800000'))
+        self.assertEqual(0, parse_bitrate(''))
+        self.assertEqual('2M', format_bitrate(2000000))
+        self.assertEqual('1500k', format_bitrate(1500000))
+
+    def test_caps(self):
+        policy = OutputPolicy(max_height=1080, max_fps=30, max_bitrate='2M')
+        options = policy.video_options(
+            3840, 2160, 60, PROFILES[TWO_PASS].video_options)
+        self.assertEqual('fps=30,scale=1920:1080', options['vf'])
+        self.assertEqual('2000000', options['b:v'])
+        self.assertEqual('0', PROFILES[TWO_PASS].video_options['b:v'])
+        self.assertEqual('height=1080,fps=30,bitrate=2M', policy.applied(
+            3840, 2160, 60, PROFILES[TWO_PASS].video_options))
+        self.assertTrue(policy.exceeded(3840, 2160, 60))
+
+    def test_portrait(self):
+        policy = OutputPolicy(max_height=720)
+        options = policy.video_options(
+            1080, 1920, 30, PROFILES[SINGLE_PASS].video_options)
+        self.assertEqual('scale=720:1280', options['vf'])
+        self.assertEqual('2M', options['b:v'])
+
+    def test_within_policy(self):
+        policy = OutputPolicy(max_height=1080, max_fps=30, max_bitrate='4M')
+        options = policy.video_options(
+            1280, 720, 29.97, PROFILES[SINGLE_PASS].video_options)
+        self.assertEqual(PROFILES[SINGLE_PASS].video_options, options)
+        self.assertEqual('', policy.applied(
+            1280, 720, 29.97, PROFILES[SINGLE_PASS].video_options))
+        self.assertFalse(policy.exceeded(1280, 720, 29.97, 3000000))
+        self.assertTrue(policy.exceeded(1280, 720, 29.97, 5000000))
+
+    def test_output_policy(self):
+        source = dict(S3_ACCESS_KEY='ABCD',
+                      S3_SECRET_KEY='ABCD',
+                      S3_BUCKET_NAME='test',
+                      S3_ENDPOINT_URL='https://test.com/',
+                      S3_CLUSTER_URL='https://test.com/')
+        self.assertIsNone(output_policy(Config(source=source)))
+        policy = output_policy(Config(source=dict(
+            source, OUTPUT_MAX_HEIGHT='1080', OUTPUT_MAX_FPS='30')))
+        self.assertEqual((1080, 30, 0), (policy.max_height, policy.max_fps,
+                                          policy.max_bitrate))
@@ -1,6 +1,19 @@
 import logging
+import os
+import shutil
+import subprocess
+import tempfile
 import unittest
-from src.app.video_optimizer import VideoOptimizer
+
+import cv2
+import numpy as np
+from src.analysis.ffmpeg_decoder import ffmpeg_frames
+from src.app.encoding_profiles import PROFILES, SINGLE_PASS, TWO_PASS
+from src.app.output_policy import OutputPolicy
+from src.app.video_optimizer import (REMUX, REMUX_AUDIO, VideoOptimizer,
+                                     video_properties)
+from src.app.video_probe import mp4_faststart
+from tests.analysis.test_video_capture import create_video
 
 
 class TestVideoOptimizer(unittest.TestCase):
@@ -14,3 +27,118 @@ class TestVideoOptimizer(unittest.TestCase):
         with VideoOptimizer('uploads/2022/06/test_1', 'olha.mp4') as vo:
             vo.run()
             self.assertEqual('uploads/2022/06/test_1.webm', vo.new_media_id())
+
+    @unittest.skipUnless(shutil.which('ffmpeg'), 'ffmpeg not found')
+    def test_outcome(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            video = os.path.join(tmp, 'video.avi')
+            create_video(video)
+            with VideoOptimizer('video.avi', video,
+                                profile=PROFILES[SINGLE_PASS]) as vo:
+                vo.run()
+                self.assertTrue(vo.new_file, vo.message)
+                self.assertTrue(vo.optimized)
+            # a failed encode is not "not optimized", it is retried later
+            with open(video, 'wb') as file:
+                file.write(os.urandom(5000))
+            with VideoOptimizer('video.avi', video,
+                                profile=PROFILES[SINGLE_PASS]) as vo:
+                vo.run()
+                self.assertEqual('', vo.new_file)
+                self.assertIsNone(vo.optimized)
+                self.assertIn('Failed to optimize', vo.message)
+            # nor does a failed sampling of the tee pipeline raise
+            with VideoOptimizer('video.avi', video,
+                                profile=PROFILES[SINGLE_PASS],
+                                sample_positions=[0, 10]) as vo:
+                vo.run()
+                self.assertIsNone(vo.frames)
+
+    @unittest.skipUnless(shutil.which('ffmpeg'), 'ffmpeg not found')
+    def test_chunked(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            video = os.path.join(tmp, 'video.avi')
+            create_video(video, frames=250)
+            with VideoOptimizer('video.avi', video,
+                                profile=PROFILES[SINGLE_PASS],
+                                chunk_workers=3,
+                                chunk_min_duration=5) as vo:
+                vo.run()
+                self.assertTrue(vo.new_file, vo.message)
+                self.assertEqual(3, len([name for name in os.listdir(
+                    vo.workdir) if name.startswith('chunk') and
+                    name.endswith('.webm')]))
+                vidcap = cv2.VideoCapture(vo.new_file)
+                frames = 0
+                while vidcap.grab():
+                    frames += 1
+                vidcap.release()
+                self.assertEqual(250, frames)
+
+    @unittest.skipUnless(shutil.which('ffmpeg'), 'ffmpeg not found')
+    def test_tee(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            video = os.path.join(tmp, 'video.avi')
+            create_video(video, frames=50)
+            positions = [0, 10, 20, 30, 40]
+            expected = ffmpeg_frames(video, positions, 224, 224)
+            for name in (SINGLE_PASS, TWO_PASS):
+                with VideoOptimizer('video.avi', video,
+                                    profile=PROFILES[name],
+                                    sample_positions=positions) as vo:
+                    vo.run()
+                    self.assertTrue(vo.new_file, vo.message)
+                    np.testing.assert_array_equal(expected, vo.frames)
+
+    @unittest.skipUnless(shutil.which('ffmpeg'), 'ffmpeg not found')
+    def test_remux(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            video = os.path.join(tmp, 'video.mp4')
+            for source_audio, remux in (('aac', REMUX), ('mp2', REMUX_AUDIO)):
+                subprocess.run(
+                    ['ffmpeg', '-v', 'error', '-y',
+                     '-f', 'lavfi', '-i', 'testsrc=duration=2:size=64x48',
+                     '-f', 'lavfi', '-i', 'sine=duration=2',
+                     '-c:v', 'libx264', '-c:a', source_audio, video],
+                    check=True)
+                self.assertFalse(mp4_faststart(video))
+                # the tee pipeline samples the frames after the remux
+                with VideoOptimizer('uploads/video.mp4', video,
+                                    remux=remux,
+                                    sample_positions=[0, 10]) as vo:
+                    vo.run()
+                    self.assertEqual((2, 224, 224, 3), vo.frames.shape)
+                    self.assertTrue(vo.new_file, vo.message)
+                    self.assertIn('Video remuxed', vo.message)
+                    self.assertEqual('uploads/video.optimized.mp4',
+                                     vo.new_media_id())
+                    self.assertTrue(mp4_faststart(vo.new_file))
+                    info = subprocess.run(
+                        ['ffmpeg', '-hide_banner', '-i', vo.new_file],
+                        capture_output=True, text=True).stderr
+                    self.assertIn('Video: h264', info)
+                    self.assertIn('Audio: aac', info)
+
+    @unittest.skipUnless(shutil.which('ffmpeg'), 'ffmpeg not found')
+    def test_policy(self):
+        policy = OutputPolicy(max_height=24, max_fps=10, max_bitrate='100k')
+        with tempfile.TemporaryDirectory() as tmp:
+            video = os.path.join(tmp, 'video.avi')
+            create_video(video, frames=50)
+            for positions in (None, [0, 10, 20]):
+                with VideoOptimizer('video.avi', video,
+                                    profile=PROFILES[SINGLE_PASS],
+                                    sample_positions=positions,
+                                    policy=policy) as vo:
+                    vo.run()
+                    self.assertTrue(vo.new_file, vo.message)
+                    self.assertEqual('height=24,fps=10,bitrate=100k',
+                                     vo.applied_policy)
+                    width, height, fps = video_properties(vo.new_file)
+                    self.assertEqual((32, 24, 10), (width, height, fps))
+                    vidcap = cv2.VideoCapture(vo.new_file)
+                    frames = 0
+                    while vidcap.grab():
+                        frames += 1
+                    vidcap.release()
+                    self.assertEqual(20, frames)
@@ -0,0 +1,88 @@
+import os
+import struct
+import tempfile
+import unittest
+
+from src.app.video_optimizer import REMUX, REMUX_AUDIO
+from src.app.video_probe import (encode_decision, mp4_faststart,
+                                 parse_ffprobe, remux_mode)
+
+H264_720P = {
+    'streams': [
+        {'codec_type': 'video', 'codec_name': 'h264', 'width': 1280,
+         'height': 720, 'avg_frame_rate': '30000/1001', 'duration': '10.0',
+         'bit_rate': '1000000'},
+        {'codec_type': 'audio', 'codec_name': 'aac', 'bit_rate': '128000'}],
+    'format': {'duration': '10.0', 'bit_rate': '1130000'}}
+
+VP9_WEBM = {
+    'streams': [
+        {'codec_type': 'video', 'codec_name': 'vp9', 'width': 640,
+         'height': 360, 'avg_frame_rate': '25/1'},
+        {'codec_type': 'audio', 'codec_name': 'opus'}],
+    'format': {'duration': '8.0'}}
+
+
+class TestVideoProbe(unittest.TestCase):
+
+    def test_parse_stream_bitrate(self):
+        probe = parse_ffprobe('video.mp4', H264_720P, 1412500)
+        self.assertEqual('h264', probe.codec)
+        self.assertEqual('aac', probe.audio_codec)
+        self.assertEqual((1280, 720), (probe.width, probe.height))
+        self.assertAlmostEqual(29.97, probe.fps, places=2)
+        self.assertEqual(1000000, probe.bit_rate)
+        self.assertAlmostEqual(0.0362, probe.bits_per_pixel, places=4)
+
+    def test_parse_container_bitrate(self):
+        # webm: no stream bitrate, estimated from the file size
+        probe = parse_ffprobe('video.webm', VP9_WEBM, 720000)
+        self.assertEqual(8.0, probe.duration)
+        self.assertEqual(720000, probe.bit_rate)
+        self.assertAlmostEqual(0.125, probe.bits_per_pixel)
+
+    def test_no_video_stream(self):
+        with self.assertRaises(ValueError):
+            parse_ffprobe('audio.ogg', {'streams': [
+                {'codec_type': 'audio'}]}, 1000)
+
+    def test_encode_decision(self):
+        codec_min_bpp = {'vp9': 0.1}
+        probe = encode_decision(
+            parse_ffprobe('video.mp4', H264_720P, 1412500), 0.05,
+            codec_min_bpp)
+        self.assertFalse(probe.encode)
+        self.assertIn('< 0.05', probe.reason)
+        probe = encode_decision(
+            parse_ffprobe('video.webm', VP9_WEBM, 720000), 0.05,
+            codec_min_bpp)
+        self.assertTrue(probe.encode)
+        probe = encode_decision(
+            parse_ffprobe('video.webm', VP9_WEBM, 720000), 0.05,
+            {'vp9': 0.2})
+        self.assertFalse(probe.encode)
+
+    def test_remux_mode(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            moov_last = os.path.join(tmp, 'moov_last.mp4')
+            moov_first = os.path.join(tmp, 'moov_first.mp4')
+            _write_boxes(moov_last, b'ftyp', b'mdat', b'moov')
+            _write_boxes(moov_first, b'ftyp', b'moov', b'mdat')
+            self.assertFalse(mp4_faststart(moov_last))
+            self.assertTrue(mp4_faststart(moov_first))
+
+            probe = parse_ffprobe('video.mp4', H264_720P, 1412500)
+            self.assertEqual(REMUX, remux_mode(probe, moov_last, 'a.mp4'))
+            self.assertIsNone(remux_mode(probe, moov_first, 'a.mp4'))
+            probe.audio_codec = 'pcm_s16le'
+            self.assertEqual(REMUX_AUDIO,
+                             remux_mode(probe, moov_first, 'a.mov'))
+            self.assertIsNone(remux_mode(probe, moov_first, 'a.avi'))
+            probe = parse_ffprobe('video.webm', VP9_WEBM, 720000)
+            self.assertIsNone(remux_mode(probe, moov_first, 'a.webm'))
+
+
+def _write_boxes(filename: str, *boxes: bytes):
+    with open(filename, 'wb') as file:
+        for box in boxes:
+            file.write(struct.pack('>I4s', 16, box) + bytes(8))
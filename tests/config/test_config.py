@@ -0,0 +1,29 @@
+import unittest
+
+from src.app.encoding_profiles import PROFILES, QUICK
+from src.config.config import ENCODING_PROFILES, Config
+
+
+class TestConfig(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.source = dict(S3_ACCESS_KEY='ABCD',
+                          S3_SECRET_KEY='ABCD',
+                          S3_BUCKET_NAME='test',
+                          S3_ENDPOINT_URL='https://test.com/',
+                          S3_CLUSTER_URL='https://test.com/')
+
+    def test_encoding_profiles(self):
+        self.assertEqual(set(PROFILES), set(ENCODING_PROFILES))
+        config = Config(source=dict(self.source, ENCODING_PROFILE=QUICK))
+        self.assertEqual(QUICK, config.encoding_profile)
+        for key in ('ENCODING_PROFILE', 'ENCODING_BACKLOG_PROFILE'):
+            with self.assertRaises(ValueError):
+                Config(source=dict(self.source, **{key: 'slow'}))
+
+    def test_analysis_aggregate(self):
+        config = Config(source=dict(self.source, ANALYSIS_AGGREGATE='max'))
+        self.assertEqual('max', config.analysis_aggregate)
+        with self.assertRaises(ValueError):
+            Config(source=dict(self.source, ANALYSIS_AGGREGATE='median'))
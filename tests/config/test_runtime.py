@@ -0,0 +1,34 @@
+import os
+import unittest
+
+from src.config.config import Config
+from src.config.runtime import cpu_affinity, runtime_info
+
+
+class TestRuntime(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.config = Config(source=dict(S3_ACCESS_KEY='ABCD',
+                                        S3_SECRET_KEY='ABCD',
+                                        S3_BUCKET_NAME='test',
+                                        S3_ENDPOINT_URL='https://test.com/',
+                                        S3_CLUSTER_URL='https://test.com/',
+                                        ANALYSIS_CPUS='0-2, 5',
+                                        ENCODE_CPUS='0'))
+
+    def test_cpus(self):
+        self.assertEqual({0, 1, 2, 5}, self.config.analysis_cpus)
+        self.assertEqual({0}, self.config.encode_cpus)
+
+    @unittest.skipUnless(hasattr(os, 'sched_setaffinity'), 'Linux only')
+    def test_cpu_affinity(self):
+        previous = os.sched_getaffinity(0)
+        with cpu_affinity({0}):
+            self.assertEqual({0}, os.sched_getaffinity(0))
+        self.assertEqual(previous, os.sched_getaffinity(0))
+
+    def test_runtime_info(self):
+        info = runtime_info(self.config)
+        self.assertEqual([0, 1, 2, 5], info['analysis_cpus'])
+        self.assertIn('tf_intra_op_threads', info)
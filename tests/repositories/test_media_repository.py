@@ -1,8 +1,12 @@
 import logging
 import os
+import sqlite3
 import sys
 import unittest
+from src.domain.media_cache import MediaCache
 from src.domain.media_data import MediaData
+from src.domain.media_probe import MediaProbe
+from src.dto.media_status_enum import MediaStatusEnum
 from src.repositories.media_repository import MediaRepository
 from src.config.config import Config
 
@@ -20,6 +24,7 @@ class TestMediaRepository(unittest.TestCase):
                                         S3_SECRET_KEY='ABCD',
                                         S3_BUCKET_NAME='test',
                                         S3_ENDPOINT_URL='https://test.com/',
+                                        S3_CLUSTER_URL='https://test.com/',
                                         LOCAL_DB='./testing.db'))
 
     @classmethod
@@ -53,3 +58,62 @@ class TestMediaRepository(unittest.TestCase):
 
         unnotified = repo.get_unnotified_media()
         self.assertEqual(len(unnotified), 2)
+
+    def test_cache(self):
+        repo = MediaRepository(self.config)
+
+        self.assertIsNone(repo.get_cache('abcd'))
+        self.assertTrue(repo.set_cache(MediaCache(
+            content_hash='abcd', category={'neutral': 90.0},
+            source_size=1000)))
+        self.assertTrue(repo.set_cache(MediaCache(
+            content_hash='abcd', new_media_id='video.optimized.webm')))
+
+        cached = repo.get_cache('abcd')
+        self.assertEqual(cached.category, {'neutral': 90.0})
+        self.assertEqual(cached.new_media_id, 'video.optimized.webm')
+        self.assertEqual(cached.source_size, 1000)
+        self.assertEqual(repo.get_cache('abcd').hits, 1)
+
+        for content_hash in ('efgh', 'ijkl'):
+            repo.set_cache(MediaCache(content_hash=content_hash))
+        self.assertEqual(repo.evict_cache(max_entries=2, max_age_days=1), 1)
+        self.assertIsNone(repo.get_cache('abcd'))
+
+    def test_probe(self):
+        repo = MediaRepository(self.config)
+        self.assertTrue(repo.set_probe(MediaProbe(
+            media_id='video.mp4', codec='h264', audio_codec='aac',
+            width=1280, height=720,
+            fps=30.0, duration=10.0, bit_rate=1000000, encode=False,
+            reason='h264 at 0.036 bpp < 0.05')))
+        probe = repo.get_probe('video.mp4')
+        self.assertEqual(probe.codec, 'h264')
+        self.assertEqual(probe.audio_codec, 'aac')
+        self.assertFalse(probe.encode)
+        self.assertAlmostEqual(probe.bits_per_pixel, 0.0362, places=4)
+        self.assertIsNone(repo.get_probe('other.mp4'))
+
+    def test_add_columns(self):
+        local_db = './testing_migration.db'
+        self.addCleanup(os.remove, local_db)
+        conn = sqlite3.connect(local_db)
+        conn.executescript(
+            'CREATE TABLE media (post_id INTEGER NOT NULL, '
+            'media_id TEXT NOT NULL, creation_date DATETIME, '
+            'media_path TEXT NOT NULL, new_media_path TEXT NOT NULL, '
+            'category TEXT NULL, notification_sent INTEGER DEFAULT 0, '
+            'notification_accepted INTEGER DEFAULT 0, status TEXT NULL, '
+            'new_media_id TEXT NOT NULL, '
+            'CONSTRAINT media_PK PRIMARY KEY (post_id));')
+        conn.close()
+
+        repo = MediaRepository(Config(source=dict(
+            self.config._source, LOCAL_DB=local_db)))
+        self.assertTrue(repo.set_media(MediaData(
+            post_id=1, media_id='video.mp4', status=MediaStatusEnum.Uploaded,
+            poster_id='video.poster.jpg', sprite_id='video.sprite.jpg')))
+        media = repo.get_media('video.mp4')
+        self.assertEqual(media.poster_id, 'video.poster.jpg')
+        self.assertEqual(media.sprite_id, 'video.sprite.jpg')
+        repo.conn.close()